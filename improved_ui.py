@@ -5,19 +5,32 @@ import serial
 import serial.tools.list_ports   # ← بعد import serial مباشرة
 import csv
 import configparser
-from threading import Thread
+from threading import Thread, Lock, Condition, current_thread
+from collections import deque, OrderedDict
+from concurrent.futures import Future
 import os
 import random
 import math
 import re
+import io
+import contextlib
+import queue
+import atexit
+import struct
+import zlib
+from array import array
 import requests
-from PyQt5 import QtWidgets, QtGui, QtCore, QtWebEngineWidgets
+import numpy as np
+from PyQt5 import QtWidgets, QtGui, QtCore, QtWebEngineWidgets, QtWebChannel
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
 from matplotlib.figure import Figure
 from matplotlib.offsetbox import OffsetImage, AnnotationBbox   # ← أضف الاستيراد
 import matplotlib.pyplot as plt
 from matplotlib.ticker import MaxNLocator
 from matplotlib import patheffects
+from matplotlib.patches import Rectangle
+from matplotlib.transforms import Bbox, blended_transform_factory
+from matplotlib.colors import to_rgba
 from datetime import datetime
 from functools import partial
 from PyQt5.QtCore import QThread
@@ -88,6 +101,88 @@ def sendCommand(ser, command_str):
     if ser:
         ser.write((command_str + "\r\n").encode("ascii"))  # CR+LF
 
+# ---------------- اكتشاف السرعة (AUTO) ---------------- #
+AUTO_BAUD = "AUTO"
+COMMON_BAUDS = (115200, 9600, 38400, 57600, 19200, 230400, 460800, 921600, 4800)
+
+
+def baud_candidates(last=None):
+    """ترتيب التجربة: آخر سرعة ناجحة (من config.ini) أولاً ثم الأكثر شيوعاً."""
+    order = [last] if last else []
+    return order + [b for b in COMMON_BAUDS if b != last]
+
+
+def probe_baud(ser, window=1.2, min_valid=3, reject_bytes=256, idle_gap=0.15):
+    """
+    يقرأ من منفذ مفتوح بسرعته الحالية حتى يحسم؛ يُعيد (صالحة، تالفة، بايتات).
+    ما قبل أول LF بقيّة سطر بدأ قبل الفحص فيُرمى. يتوقف مبكراً عند min_valid
+    جملة صالحة؛ وبعد أول سطر كامل بلا أى جملة صالحة يتوقف أيضاً عند
+    reject_bytes بايت أو عند انتهاء الدفعة (هدوء idle_gap).
+    """
+    framer = NmeaFramer()
+    start = last_rx = time.perf_counter()
+    nbytes = 0
+    synced = False
+    while time.perf_counter() - start < window:
+        data = ser.read(max(1, ser.in_waiting))
+        now = time.perf_counter()
+        if data:
+            nbytes += len(data)
+            last_rx = now
+            if not synced:
+                nl = data.find(b'\n')
+                synced = nl >= 0
+                data = data[nl + 1:] if synced else b''
+            framer.feed(data)
+        if framer.sentences >= min_valid:
+            break
+        if not framer.sentences and framer.counts and (nbytes >= reject_bytes
+                                                       or now - last_rx >= idle_gap):
+            break
+    bad = sum(c[1] + c[2] for c in framer.counts.values())
+    return framer.sentences, bad, nbytes
+
+
+def baud_score(valid, bad):
+    """نسبة الجمل الصالحة من كل ما بدا كجملة."""
+    return valid / (valid + bad) if valid else 0.0
+
+
+def detect_baud(port, last=None, candidates=None, window=1.2, min_valid=3):
+    """
+    يجرّب السرعات على منفذ واحد مفتوح (تغيير baudrate بدل إعادة الفتح).
+    يُعيد (المنفذ مفتوحاً بالسرعة المكتشفة أو None، السرعة، [(baud, score,
+    valid, bytes)]). يتوقف عند أول سرعة بـ min_valid جمل ونسبة ≥ 0.9؛ وإذا
+    لم يصل أى بايت بالسرعة الأولى فالجهاز صامت ولا فائدة من البقية.
+    """
+    try:
+        ser = serial.Serial(port, (candidates or baud_candidates(last))[0], timeout=0.05)
+    except (serial.SerialException, OSError) as e:
+        print("Ошибка открытия соединения:", e)
+        return None, None, []
+    tried = []
+    best_score, best_baud = 0.0, None
+    try:
+        for baud in candidates or baud_candidates(last):
+            ser.baudrate = baud
+            ser.reset_input_buffer()         # بقايا بالسرعة السابقة
+            valid, bad, nbytes = probe_baud(ser, window, min_valid)
+            score = baud_score(valid, bad)
+            tried.append((baud, score, valid, nbytes))
+            if valid >= min_valid and score >= 0.9:
+                return ser, baud, tried
+            if score > best_score:
+                best_score, best_baud = score, baud
+            if not nbytes and len(tried) == 1:
+                break
+        if best_score >= 0.5:
+            ser.baudrate = best_baud
+            return ser, best_baud, tried
+    except (serial.SerialException, OSError) as e:
+        print("Ошибка определения скорости:", e)
+    ser.close()
+    return None, None, tried
+
 
 ##############################################
 # PARSING MODULE
@@ -194,43 +289,2737 @@ def parseGSV(raw_line):
     finished = msg_num == total_msgs
     return talker, finished, sats
 
-RMC_RE = re.compile(r'^\$(..)(RMC),')
+RMC_RE = re.compile(r'^\$(..)(RMC),')
+
+def parseRMC(raw):
+        """
+        يُستخرج منها فقط الحقول الأساسية:
+        parts[2] = status ('A' = active)
+        parts[3],parts[4] = latitude, N/S
+        parts[5],parts[6] = longitude, E/W
+        """
+        parts = raw.split(',')
+        if len(parts) < 7 or parts[2] != 'A':
+            return None
+        return {
+            'latitude':     parts[3],
+            'lat_direction':parts[4],
+            'longitude':    parts[5],
+            'lon_direction':parts[6],
+        }
+
+# ----------------------------------------------------------
+# سجلّ المحلّلات: نوع الجملة (3 أحرف) → دالة تحليل
+# كل جملة تُقطَّع مرّة واحدة ويُبنى منها سجلّ خفيف بـ __slots__.
+# لإضافة نوع جديد يكفى تسجيل دالة واحدة بـ @register_parser("XXX").
+# ----------------------------------------------------------
+NMEA_TALKERS = frozenset(("GP", "GN", "GL", "GA", "BD", "GB", "QZ", "GI", "SB"))
+NMEA_PARSERS = {}
+
+
+def register_parser(kind):
+    def deco(fn):
+        NMEA_PARSERS[kind] = fn
+        return fn
+    return deco
+
+
+def _to_float(s):
+    if not s:                      # الحقول الفارغة شائعة؛ نتجنّب كلفة الاستثناء
+        return None
+    try:
+        return float(s)
+    except ValueError:
+        return None
+
+
+def _to_int(s):
+    if not s:
+        return None
+    try:
+        return int(s)
+    except ValueError:
+        return None
+
+
+def nmea_to_decimal(coord, direction):
+    """تحويل إحداثى NMEA (ddmm.mmmm / dddmm.mmmm) إلى درجة عشرية."""
+    if not coord:
+        return None
+    deg_len = 2 if direction in ("N", "S") else 3
+    try:
+        decimal = int(coord[:deg_len]) + float(coord[deg_len:]) / 60
+    except ValueError:
+        return None
+    return -decimal if direction in ("S", "W") else decimal
+
+
+def parse_sentence(line):
+    """
+    يحلّل سطراً واحداً عبر السجلّ.
+    يُعيد السجلّ المناسب، أو None للجمل غير المعروفة/التالفة.
+    """
+    if len(line) < 7 or line[0] != '$' or line[6] != ',':
+        return None
+    parser = NMEA_PARSERS.get(line[3:6])
+    if parser is None or line[1:3] not in NMEA_TALKERS:
+        return None
+    star = line.find('*', 7)
+    fields = (line[7:star] if star > 0 else line[7:]).split(',')
+    return parser(line[1:3], fields)
+
+
+class NmeaRecord:
+    """
+    سجلّ خفيف يحتفظ بالحقول المقطّعة فقط؛ التحويل إلى أرقام يتم عند
+    قراءة الحقل، فلا يدفع المستهلك إلا ثمن ما يستعمله.
+    """
+    __slots__ = ('talker', 'f')
+
+    def __init__(self, talker, f):
+        self.talker = talker
+        self.f      = f
+
+
+class GgaRecord(NmeaRecord):
+    __slots__ = ()
+    time        = property(lambda self: self.f[0])
+    lat         = property(lambda self: nmea_to_decimal(self.f[1], self.f[2]))
+    lon         = property(lambda self: nmea_to_decimal(self.f[3], self.f[4]))
+    fix_quality = property(lambda self: self.f[5])     # نص ('0','1','4',...)
+    num_sat     = property(lambda self: _to_int(self.f[6]))
+    hdop        = property(lambda self: _to_float(self.f[7]))
+    alt         = property(lambda self: _to_float(self.f[8]))
+
+
+class GsaRecord(NmeaRecord):
+    # mode, fix, 12×PRN, PDOP, HDOP, VDOP [, system id فى NMEA 4.10]
+    __slots__ = ()
+    mode1    = property(lambda self: self.f[0])
+    fix_type = property(lambda self: self.f[1])
+    pdop     = property(lambda self: _to_float(self.f[14]))
+    hdop     = property(lambda self: _to_float(self.f[15]))
+    vdop     = property(lambda self: _to_float(self.f[16]))
+
+
+class RmcRecord(NmeaRecord):
+    __slots__ = ()
+    time = property(lambda self: self.f[0])
+    lat  = property(lambda self: nmea_to_decimal(self.f[2], self.f[3]))
+    lon  = property(lambda self: nmea_to_decimal(self.f[4], self.f[5]))
+    date = property(lambda self: self.f[8])
+
+
+class GstRecord(NmeaRecord):
+    # إحصاءات أخطاء الموقع (أمتار): RMS، قطع ناقص الخطأ، الانحرافات المعيارية
+    __slots__ = ()
+    time        = property(lambda self: self.f[0])
+    rms         = property(lambda self: _to_float(self.f[1]))
+    semi_major  = property(lambda self: _to_float(self.f[2]))
+    semi_minor  = property(lambda self: _to_float(self.f[3]))
+    orientation = property(lambda self: _to_float(self.f[4]))
+    lat_err     = property(lambda self: _to_float(self.f[5]))
+    lon_err     = property(lambda self: _to_float(self.f[6]))
+    alt_err     = property(lambda self: _to_float(self.f[7]))
+
+
+class SatRecord:
+    __slots__ = ('system', 'prn', 'elevation', 'azimuth', 'snr', 'last_seen')
+
+    def __init__(self, system, prn, elevation, azimuth, snr):
+        self.system    = system
+        self.prn       = prn            # int
+        self.elevation = elevation      # float أو None
+        self.azimuth   = azimuth
+        self.snr       = snr            # int أو None
+        self.last_seen = 0.0
+
+
+class GsvRecord(NmeaRecord):
+    __slots__ = ('_sats',)
+
+    def __init__(self, talker, f):
+        super().__init__(talker, f)
+        self._sats = None
+
+    total_msgs = property(lambda self: int(self.f[0]))
+    msg_num    = property(lambda self: int(self.f[1]))
+    total_sats = property(lambda self: int(self.f[2]))
+    finished   = property(lambda self: self.f[0] == self.f[1])
+
+    @property
+    def signal_id(self):
+        """معرّف الإشارة (NMEA 4.10: حقل أخير زائد بعد مجموعات الأقمار)، أو ''."""
+        f = self.f
+        return f[-1] if (len(f) - 3) % 4 == 1 else ''
+
+    @property
+    def sats(self):
+        """قائمة SatRecord، تُبنى مرّة واحدة عند أول طلب وتُشارَك بين المستهلكين."""
+        if self._sats is None:
+            f, talker = self.f, self.talker
+            sats = []
+            # 4 حقول لكل قمر؛ حقل signal id الإضافى (NMEA 4.10) يسقط تلقائياً
+            for i in range(3, len(f) - 3, 4):
+                prn = _to_int(f[i])
+                if prn is None:
+                    continue
+                system = (classify_prn(prn) or talker) if talker == "GN" else talker
+                sats.append(SatRecord(system, prn, _to_float(f[i + 1]),
+                                      _to_float(f[i + 2]), _to_int(f[i + 3])))
+            self._sats = sats
+        return self._sats
+
+
+@register_parser("GGA")
+def _parse_gga(talker, f):
+    return GgaRecord(talker, f) if len(f) >= 9 else None
+
+
+@register_parser("GSA")
+def _parse_gsa(talker, f):
+    if len(f) < 17 or f[1] not in ('1', '2', '3'):
+        return None
+    return GsaRecord(talker, f)
+
+
+@register_parser("GSV")
+def _parse_gsv(talker, f):
+    if len(f) < 3 or not (f[0].isdigit() and f[1].isdigit()):
+        return None
+    return GsvRecord(talker, f)
+
+
+@register_parser("RMC")
+def _parse_rmc(talker, f):
+    if len(f) < 9 or f[1] != 'A':
+        return None
+    return RmcRecord(talker, f)
+
+
+@register_parser("GST")
+def _parse_gst(talker, f):
+    return GstRecord(talker, f) if len(f) >= 8 else None
+
+
+##############################################
+# INGEST MODULE
+##############################################
+def sentence_kind(line):
+    """
+    تُعيد (talker, kind) لسطر واحد:
+        '$GNGSV,...'   → ('GN', 'GSV')
+        '$command,...' → ('', 'command')
+    الأسطر التى لا تبدأ بـ '$' تُعاد كـ ('', '').
+    """
+    if not line.startswith('$'):
+        return '', ''
+    comma = line.find(',')
+    head = line[1:comma] if comma > 0 else line[1:]
+    if len(head) == 5 and head.isupper():
+        return head[:2], head[2:]
+    return '', head
+
+
+class NmeaSentence:
+    """جملة واحدة كما وصلت من المنفذ مع نوعها وطابعها الزمنى وسجلّها المحلَّل."""
+    __slots__ = ('talker', 'kind', 'raw', 'ts', 'data')
+
+    def __init__(self, talker, kind, raw, ts, data=None):
+        self.talker = talker
+        self.kind   = kind
+        self.raw    = raw
+        self.ts     = ts
+        self.data   = data      # GgaRecord/GsvRecord/... أو None
+
+
+class Subscription:
+    """
+    اشتراك صفحة واحدة فى محرّك الإدخال.
+    الطابور محدود الطول: إذا امتلأ يُرمى الأقدم (drop-oldest)
+    حتى لا تُبطئ صفحة بطيئة بقيّة الصفحات.
+    """
+    def __init__(self, engine, kinds=None, maxlen=256):
+        self.kinds   = frozenset(kinds) if kinds else None   # None = كل الأنواع
+        self.dropped = 0
+        self.closed  = False
+        self.conflate = False    # True: آخر جملة لكل نوع فقط (صفحة مخفية)
+        self._engine = engine
+        self._queue  = deque(maxlen=maxlen)
+        self._latest = {}        # kind → آخر جملة فى وضع conflate
+        self._cond   = Condition()
+
+    def wants(self, kind):
+        return self.kinds is None or kind in self.kinds
+
+    def set_conflate(self, on):
+        """
+        وضع "آخر حالة فقط": بدل الطابور يُحتفظ بآخر جملة لكل نوع، فلا
+        يتراكم عمل لصفحة لا تُرى؛ عند الإلغاء يعود الطابور العادى.
+        """
+        with self._cond:
+            self.conflate = on
+            if on:
+                for item in self._queue:
+                    self._latest.pop(item.kind, None)
+                    self._latest[item.kind] = item
+                self._queue.clear()
+            else:
+                self._queue.extend(self._latest.values())
+                self._latest.clear()
+
+    def put(self, item):
+        with self._cond:
+            if self.conflate:
+                self._latest.pop(item.kind, None)     # الأحدث فى آخر الترتيب
+                self._latest[item.kind] = item
+            else:
+                if len(self._queue) == self._queue.maxlen:
+                    self.dropped += 1
+                self._queue.append(item)
+            self._cond.notify()
+
+    def _pop_locked(self):
+        if self._queue:
+            return self._queue.popleft()
+        if self._latest:
+            return self._latest.pop(next(iter(self._latest)))
+        return None
+
+    def get(self, timeout=None):
+        """ينتظر عنصراً واحداً؛ يُعيد None عند انتهاء المهلة أو الإغلاق."""
+        with self._cond:
+            if not self._queue and not self._latest and not self.closed:
+                self._cond.wait(timeout)
+            return self._pop_locked()
+
+    def drain(self):
+        """يسحب كل ما تراكم دفعة واحدة."""
+        with self._cond:
+            items = list(self._queue) + list(self._latest.values())
+            self._queue.clear()
+            self._latest.clear()
+            return items
+
+    def close(self):
+        self._engine.unsubscribe(self)
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+
+def nmea_checksum(body):
+    """
+    XOR لكل بايتات الجسم (بين '$' و '*') بدون حلقة بايثون على الأحرف:
+    يُحوَّل الجسم إلى عدد صحيح واحد ثم يُطوى على نفسه نصفاً بنصف
+    (log2(n) عمليات على أعداد كبيرة داخل C).
+    """
+    n = len(body)
+    x = int.from_bytes(body, 'little')
+    while n > 1:
+        half = (n + 1) >> 1
+        bits = half << 3
+        x = (x & ((1 << bits) - 1)) ^ (x >> bits)
+        n = half
+    return x
+
+
+class NmeaFramer:
+    """
+    يقطّع البايتات الخام إلى جمل كاملة ويتحقق من checksum كل جملة.
+    بافر واحد يُعاد استخدامه، والتقطيع على LF (مع حذف CR) يتم عبر
+    memoryview فلا تُنسخ إلا الجملة الناتجة نفسها.
+    الجمل التالفة تُرمى هنا قبل أى تحليل أو إشارة Qt.
+    """
+    MAX_PENDING = 4096       # ذيل بلا نهاية سطر أطول من هذا = ضجيج، يُرمى
+    VALID, BAD, TRUNCATED = 0, 1, 2
+
+    def __init__(self, verify=True):
+        self.verify = verify
+        self._buf = bytearray()
+        self.bytes = 0           # مجموع البايتات المستلمة
+        self.sentences = 0       # مجموع الجمل الصالحة المُمرَّرة
+        self.counts = {}         # {b'GGA': [valid, bad_checksum, truncated]}
+
+    def feed(self, data):
+        """يضيف بايتات ويُعيد قائمة الجمل الكاملة الصالحة (bytes بدون CR/LF)."""
+        buf = self._buf
+        buf += data
+        self.bytes += len(data)
+        out = []
+        start = 0
+        find = buf.find
+        with memoryview(buf) as mv:
+            while True:
+                nl = find(b'\n', start)
+                if nl < 0:
+                    break
+                end = nl - 1 if nl > start and buf[nl - 1] == 13 else nl
+                if end > start:
+                    out.append(bytes(mv[start:end]))
+                start = nl + 1
+        if start:
+            del buf[:start]
+        if len(buf) > self.MAX_PENDING:
+            buf.clear()
+        if self.verify:
+            out = [line for line in map(self._check, out) if line]
+        self.sentences += len(out)
+        return out
+
+    def _check(self, line):
+        """يتحقق من سطر واحد ويحدّث العدّادات؛ يُعيد السطر أو None."""
+        dollar = line.rfind(b'$')
+        if dollar < 0:
+            self._count(b'?', self.TRUNCATED)
+            return None
+        if dollar:
+            # أعد التزامن على آخر '$': ما قبله جمل انقطعت بلا نهاية سطر
+            # (تُعدّ مقطوعة) أو ضجيج، والجملة الأخيرة تُفحص كالمعتاد
+            for frag in line[:dollar].split(b'$')[1:]:
+                comma = frag.find(b',')
+                head = frag[:comma] if comma > 0 else b''
+                self._count(head[2:] if len(head) == 5 else b'?', self.TRUNCATED)
+            line = line[dollar:]
+        comma = line.find(b',')
+        head = line[1:comma] if comma > 0 else line[1:]
+        standard = len(head) == 5
+        kind = head[2:] if standard else head[:16]
+
+        star = line.rfind(b'*')
+        if star < 0:
+            # جمل NMEA القياسية يجب أن تحمل checksum؛ غيرها ($command...) قد لا تحمله
+            if standard:
+                self._count(kind, self.TRUNCATED)
+                return None
+        elif len(line) - star < 3:
+            self._count(kind, self.TRUNCATED)
+            return None
+        else:
+            try:
+                want = int(line[star + 1:star + 3], 16)
+            except ValueError:
+                self._count(kind, self.TRUNCATED)
+                return None
+            if nmea_checksum(line[1:star]) != want:
+                self._count(kind, self.BAD)
+                return None
+        self._count(kind, self.VALID)
+        return line
+
+    def _count(self, kind, idx):
+        c = self.counts.get(kind)
+        if c is None:
+            c = self.counts[kind] = [0, 0, 0]
+        c[idx] += 1
+
+    def stats(self):
+        """{'GGA': (valid, bad_checksum, truncated), ...}"""
+        return {k.decode('ascii', errors='replace'): tuple(c)
+                for k, c in list(self.counts.items())}
+
+    def totals(self):
+        """(valid, bad_checksum, truncated) لكل الأنواع معاً."""
+        t = [0, 0, 0]
+        for c in list(self.counts.values()):
+            t[0] += c[0]; t[1] += c[1]; t[2] += c[2]
+        return tuple(t)
+
+    def reset(self):
+        self._buf.clear()
+
+
+class IngestEngine:
+    """
+    محرّك إدخال واحد لكل اتصال: يملك المنفذ، يقرأ كل بايت مرّة واحدة،
+    ويوزّع الجمل على الصفحات المشتركة حسب نوع الجملة.
+    """
+    def __init__(self, ser):
+        self.ser = ser
+        self.framer = NmeaFramer()
+        self.sats = SatelliteStore()  # حالة الأقمار المشتركة بين الصفحات
+        self.track = TrackStore()     # مسار الجلسة من مواقع GGA الصالحة
+        self.commands = CommandEngine(self)   # كاتب الأوامر ومطابقة الـ ACK
+        self.rate = 0.0              # جمل/ثانية، يُحدَّث مرة كل ثانية
+        self._rate_t0 = time.time()
+        self._rate_n0 = 0
+        self.sizes = {}              # kind → [عدد، مجموع البايتات] للجمل المستلمة
+        self._subs = ()              # نسخة ثابتة تُستبدل عند كل (un)subscribe
+        self._taps = ()              # مستهلكو البايتات الخام (RawCaptureWriter)
+        self._subs_lock = Lock()
+        self._running = False
+        self._thread = None
+
+    # ---------------- الاشتراكات ---------------- #
+    def subscribe(self, kinds=None, maxlen=256):
+        sub = Subscription(self, kinds, maxlen)
+        with self._subs_lock:
+            self._subs = self._subs + (sub,)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._subs_lock:
+            self._subs = tuple(s for s in self._subs if s is not sub)
+
+    def measured_sizes(self):
+        """kind → متوسط طول الجملة بالبايت كما قيس من التيار."""
+        return {kind: total / n for kind, (n, total) in list(self.sizes.items())}
+
+    def add_tap(self, fn):
+        """fn(ts, data) تُستدعى فى خيط القراءة لكل قراءة خام؛ يجب أن تكون سريعة."""
+        with self._subs_lock:
+            self._taps = self._taps + (fn,)
+
+    def remove_tap(self, fn):
+        with self._subs_lock:
+            self._taps = tuple(t for t in self._taps if t != fn)
+
+    # ---------------- دورة الحياة ---------------- #
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._running = True
+        self._thread = Thread(target=self._run, daemon=True)
+        self._thread.start()
+        self.commands.start()
+
+    def stop(self):
+        self._running = False
+        self.commands.stop()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout=2)
+        for sub in self._subs:
+            sub.close()
+
+    # ---------------- داخلى ---------------- #
+    def _publish(self, sentence):
+        for sub in self._subs:
+            if sub.wants(sentence.kind):
+                sub.put(sentence)
+
+    def _read_chunk(self):
+        """
+        يفرّغ كل ما فى بافر النظام بقراءة واحدة؛ إذا كان فارغاً ينتظر
+        أول بايت حتى timeout المنفذ، فلا حاجة لأى sleep.
+        """
+        n = self.ser.in_waiting
+        return self.ser.read(n if n > 0 else 1)
+
+    def _run(self):
+        framer = self.framer
+        while self._running:
+            if not self.ser or not self.ser.is_open:
+                break
+            try:
+                data = self._read_chunk()
+            except serial.SerialException:
+                break
+            now = time.time()
+            if now - self._rate_t0 >= 1.0:
+                self.rate = (framer.sentences - self._rate_n0) / (now - self._rate_t0)
+                self._rate_t0, self._rate_n0 = now, framer.sentences
+                self.sats.expire(now)
+            if not data:
+                continue
+            self.feed(data, now)
+        self._running = False
+
+    def feed(self, data, now):
+        """يمرّر بايتات خام عبر المسار كاملاً (taps → تأطير → تحليل → توزيع)."""
+        # البايتات الخام كما قُرئت (للتسجيل الخام) قبل أى تأطير
+        for tap in self._taps:
+            tap(now, data)
+        for raw in self.framer.feed(data):
+            line = raw.decode('utf-8', errors='ignore').strip()
+            if not line:
+                continue
+            talker, kind = sentence_kind(line)
+            st = self.sizes.get(kind)
+            if st is None:
+                self.sizes[kind] = [1, len(raw) + 2]     # + CR/LF
+            else:
+                st[0] += 1
+                st[1] += len(raw) + 2
+            # التحليل مرّة واحدة هنا؛ الأنواع غير المسجّلة لا تُحلَّل
+            rec = parse_sentence(line) if kind in NMEA_PARSERS else None
+            if kind == "GSV" and rec is not None:
+                self.sats.add_gsv(rec, now)
+            elif kind == "GGA" and rec is not None and rec.fix_quality not in ('', '0'):
+                lat, lon = rec.lat, rec.lon
+                if lat is not None and lon is not None:
+                    self.track.append(lat, lon)
+            self._publish(NmeaSentence(talker, kind, line, now, rec))
+
+
+class SatTableView:
+    """
+    منظر للقراءة فقط على صفوف الجدول المشغولة (نسخ أعمدة NumPy غير قابلة
+    للكتابة). elevation/azimuth = NaN و snr = -1 عندما يكون الحقل فارغاً.
+    """
+    COLUMNS = ('system', 'talker', 'prn', 'elevation', 'azimuth', 'snr', 'last_seen')
+    __slots__ = COLUMNS
+
+    def __init__(self, columns):
+        for name in self.COLUMNS:
+            col = columns[name]
+            col.setflags(write=False)
+            setattr(self, name, col)
+
+    def __len__(self):
+        return len(self.prn)
+
+
+# الإشارة الأساسية لكل نظام (NMEA 4.10 signal id)؛ غيرها يُرتَّب بالرقم
+PRIMARY_SIGNAL = {"GA": "7"}             # Galileo: 7 = E1؛ البقية: 1 = L1/G1/B1I
+
+
+def signal_rank(system, signal_id):
+    """0 للإشارة الأساسية (أو بلا معرّف)، وإلا رقمها: الأصغر أولى بالـ SNR."""
+    if not signal_id or signal_id == PRIMARY_SIGNAL.get(system, "1"):
+        return 0
+    try:
+        return int(signal_id, 16)
+    except ValueError:
+        return 15
+
+
+class SatTable:
+    """
+    جدول أقمار بسعة ثابتة: خانة لكل (system, prn) تُحجز من قائمة حرّة،
+    وأعمدة NumPy للقيم. ترتيب آخر ظهور فى OrderedDict فيكون الانتهاء
+    تدريجياً من الأقدم (كلفة = عدد المنتهى فقط) والذاكرة ثابتة مهما طال التشغيل.
+    مع عدّة إشارات للقمر الواحد يُحفظ SNR الإشارة الأساسية، ولا تحلّ محلّها
+    إشارة أخرى إلا إذا لم تُرَ الأساسية منذ مهلة الانتهاء.
+    """
+    def __init__(self, capacity=512):
+        self.capacity  = capacity
+        self.system    = np.zeros(capacity, 'U2')
+        self.talker    = np.zeros(capacity, 'U2')
+        self.prn       = np.zeros(capacity, np.int16)
+        self.elevation = np.full(capacity, np.nan, np.float32)
+        self.azimuth   = np.full(capacity, np.nan, np.float32)
+        self.snr       = np.full(capacity, -1, np.int16)
+        self.last_seen = np.zeros(capacity, np.float64)
+        self.snr_rank  = np.zeros(capacity, np.int8)  # signal_rank مصدر الـ SNR
+        self.snr_seen  = np.zeros(capacity, np.float64)
+        self._slots = {}                              # (system, prn) → خانة
+        self._free = list(range(capacity - 1, -1, -1))
+        self._lru = OrderedDict()                     # (system, prn) → خانة، الأقدم أولاً
+
+    def __len__(self):
+        return len(self._slots)
+
+    def upsert(self, talker, sat, now, rank=0):
+        """يُحدّث قمراً؛ يعيد True إذا تغيّر شىء مرئى (قمر جديد، موقع، SNR)."""
+        key = (sat.system, sat.prn)
+        slot = self._slots.get(key)
+        if slot is None:
+            if not self._free:                        # امتلأ: أخرج الأقدم
+                self._release(*self._lru.popitem(last=False))
+            slot = self._free.pop()
+            self._slots[key] = slot
+            self.system[slot], self.prn[slot] = key
+            self.snr_rank[slot] = rank
+            changed = True
+        else:
+            self._lru.move_to_end(key)
+            changed = False
+        self._lru[key] = slot
+        elev = np.float32(np.nan if sat.elevation is None else sat.elevation)
+        azim = np.float32(np.nan if sat.azimuth is None else sat.azimuth)
+        changed |= (self.talker[slot] != talker
+                    or not _same_float(self.elevation[slot], elev)
+                    or not _same_float(self.azimuth[slot], azim))
+        self.talker[slot]    = talker
+        self.elevation[slot] = elev
+        self.azimuth[slot]   = azim
+        self.last_seen[slot] = now
+        if rank <= self.snr_rank[slot]:
+            snr = -1 if sat.snr is None else sat.snr
+            changed |= self.snr[slot] != snr
+            self.snr_rank[slot] = rank
+            self.snr[slot]      = snr
+            self.snr_seen[slot] = now
+        return bool(changed)
+
+    def expire(self, cutoff):
+        """يحذف من لم يُرَ منذ cutoff؛ يعيد عدد المحذوفين."""
+        # إشارة أساسية اختفت: أى إشارة تالية تتولّى الـ SNR
+        self.snr_rank[self.snr_seen < cutoff] = np.iinfo(np.int8).max
+        n, lru = 0, self._lru
+        while lru:
+            key, slot = next(iter(lru.items()))
+            if self.last_seen[slot] >= cutoff:
+                break
+            lru.popitem(last=False)
+            self._release(key, slot)
+            n += 1
+        return n
+
+    def _release(self, key, slot):
+        del self._slots[key]
+        self._free.append(slot)
+
+    def view(self):
+        idx = np.fromiter(self._slots.values(), np.intp, len(self._slots))
+        return SatTableView({name: getattr(self, name)[idx] for name in SatTableView.COLUMNS})
+
+
+class SatSnapshot:
+    """
+    لقطة ثابتة لحالة الأقمار. لا تُعدَّل بعد إنشائها؛ المخزن يستبدلها
+    بلقطة جديدة ذات version أكبر عند كل تغيير فعلى.
+        table : SatTableView لكل الأقمار المرئية خلال مهلة الانتهاء
+    """
+    __slots__ = ('version', 'ts', 'table')
+
+    def __init__(self, version, ts, table):
+        self.version = version
+        self.ts      = ts
+        self.table   = table
+
+
+def _same_float(a, b):
+    return a == b or (a != a and b != b)     # NaN == NaN هنا (حقل فارغ فى الحالتين)
+
+
+class SatelliteStore:
+    """
+    مخزن حالة الأقمار بين خيط القراءة والواجهة. الكاتب الوحيد هو
+    IngestEngine؛ القرّاء يأخذون snapshot() (قراءة مرجع واحد، ذرّية)
+    ويعيدون الرسم فقط إذا تغيّر version عن آخر ما رسموه. لقطة جديدة
+    تُنشر فقط إذا غيّرت السلسلة المكتملة شيئاً فى الجدول أو انتهى قمر.
+    """
+    def __init__(self, expiry=5.0, capacity=512):
+        self.expiry = expiry
+        self._lock = Lock()
+        self._building = {}      # (talker, signal_id) → أجزاء السلسلة الجارية
+        self._table = SatTable(capacity)
+        self._snapshot = SatSnapshot(0, 0.0, self._table.view())
+        self._watchers = ()      # fn() عند كل لقطة جديدة (من خيط القراءة)
+
+    @property
+    def version(self):
+        return self._snapshot.version
+
+    def watch(self, fn):
+        """fn() تُستدعى بعد نشر كل لقطة؛ يجب أن تكون سريعة (مثلاً RenderTask.request)."""
+        self._watchers = self._watchers + (fn,)
+
+    def unwatch(self, fn):
+        self._watchers = tuple(w for w in self._watchers if w != fn)
+
+    def snapshot(self):
+        return self._snapshot
+
+    def add_gsv(self, rec, now):
+        """
+        تُستدعى لكل جملة GSV محلَّلة؛ تنشر لقطة عند اكتمال السلسلة. مستقبِلات
+        NMEA 4.10 ترسل سلسلة لكل إشارة، فالسلسلة تُعرَّف بـ (talker, signal_id).
+        """
+        series = (rec.talker, rec.signal_id)
+        part = self._building.setdefault(series, [])
+        if rec.msg_num == 1:
+            part.clear()                     # سلسلة جديدة (الجزء السابق ناقص)
+        part.extend(rec.sats)
+        if not rec.finished:
+            return
+        sats = tuple(part)
+        part.clear()
+        with self._lock:
+            changed = False
+            for s in sats:
+                changed |= self._table.upsert(rec.talker, s, now,
+                                              signal_rank(s.system, rec.signal_id))
+            changed |= self._expire_locked(now)
+            if changed:
+                self._publish_locked(now)
+
+    def expire(self, now):
+        """يزيل ما لم يُرَ خلال expiry ثانية؛ ينشر لقطة فقط إذا حُذف شىء."""
+        with self._lock:
+            if self._expire_locked(now):
+                self._publish_locked(now)
+
+    def _expire_locked(self, now):
+        return self._table.expire(now - self.expiry) > 0
+
+    def _publish_locked(self, now):
+        self._snapshot = SatSnapshot(self._snapshot.version + 1, now, self._table.view())
+        for fn in self._watchers:
+            fn()
+
+
+class StreamHistory:
+    """
+    سجلّ دائرى بسعة ثابتة لآخر الأسطر المستلمة، مع عمودَى NumPy لرمز نوع
+    الجملة و talker لكل سطر. الترشيح حسب النوع/المُرسِل قناع متجه على
+    الأعمدة بدل مسح النصوص، والبحث النصى يمرّ فقط على ما بقى بعد القناع
+    ومن الأحدث إلى الأقدم حتى يكتمل الحد المطلوب.
+    """
+    def __init__(self, capacity=200000):
+        self.capacity = capacity
+        self.total = 0                       # رقم تسلسل السطر التالى
+        self._lines = [None] * capacity
+        self._kind = np.zeros(capacity, np.uint16)
+        self._talker = np.zeros(capacity, np.uint16)
+        self._codes = {'': 0}                # اسم (نوع أو talker) → رمز
+        self._lock = Lock()
+
+    def _code(self, name):
+        code = self._codes.get(name)
+        if code is None:
+            code = self._codes[name] = len(self._codes)
+        return code
+
+    def append(self, line, talker='', kind=''):
+        with self._lock:
+            i = self.total % self.capacity
+            self._lines[i] = line
+            self._kind[i] = self._code(kind)
+            self._talker[i] = self._code(talker)
+            self.total += 1
+
+    def query(self, start=0, kinds=None, talkers=None, text=None, limit=None):
+        """
+        يعيد (total، الأسطر المطابقة ذات التسلسل ≥ start) بالترتيب الزمنى؛
+        مع limit تُعاد أحدث limit سطراً فقط.
+        """
+        with self._lock:
+            total = self.total
+            lo = max(start, total - self.capacity)
+            if lo >= total:
+                return total, []
+            pos = np.arange(lo, total) % self.capacity
+            for names, col in ((kinds, self._kind), (talkers, self._talker)):
+                if names:
+                    codes = [self._codes[n] for n in names if n in self._codes]
+                    pos = pos[np.isin(col[pos], codes)]
+            lines = self._lines
+            if text:
+                out = []
+                for p in pos[::-1].tolist():
+                    if text in lines[p]:
+                        out.append(lines[p])
+                        if limit and len(out) >= limit:
+                            break
+                out.reverse()
+            else:
+                if limit:
+                    pos = pos[-limit:]
+                out = [lines[p] for p in pos.tolist()]
+        return total, out
+
+
+##############################################
+# TRACK MODULE
+##############################################
+# مسار الجلسة كاملاً (حتى يوم كامل بـ 10 Гц) بعدّة مستويات تفصيل. المستوى
+# 0 هو النقاط الخام، وكل مستوى تالٍ تبسيط Douglas–Peucker للسابق بسماحية
+# أكبر ×4. التبسيط تزايدى على قطع ثابتة الطول، فكلفة كل نقطة جديدة ثابتة
+# ولا يُعاد حساب المسار القديم أبداً.
+
+EARTH_RADIUS_M = 6371000.0
+
+
+def douglas_peucker(lat, lon, tolerance):
+    """
+    مؤشرات النقاط التى يُبقيها Douglas–Peucker (دائماً تشمل الطرفين).
+    المسافة بالأمتار على إسقاط محلى مستطيل، وهو كافٍ لمقاطع قصيرة.
+    """
+    n = len(lat)
+    if n < 3:
+        return list(range(n))
+    lat = np.asarray(lat, float)
+    lon = np.asarray(lon, float)
+    k = math.radians(1) * EARTH_RADIUS_M
+    y = lat * k
+    x = lon * k * math.cos(math.radians(lat[0]))
+    keep = np.zeros(n, bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        a, b = stack.pop()
+        if b - a < 2:
+            continue
+        dx, dy = x[b] - x[a], y[b] - y[a]
+        px, py = x[a + 1:b] - x[a], y[a + 1:b] - y[a]
+        seg = math.hypot(dx, dy)
+        if seg:
+            d = np.abs(px * dy - py * dx) / seg
+        else:
+            d = np.hypot(px, py)
+        i = int(d.argmax())
+        if d[i] > tolerance:
+            m = a + 1 + i
+            keep[m] = True
+            stack.append((a, m))
+            stack.append((m, b))
+    return np.flatnonzero(keep).tolist()
+
+
+class _TrackLevel:
+    """مستوى تفصيل واحد: نقاط مثبَّتة + قطعة معلّقة لم تُبسَّط بعد."""
+    __slots__ = ('tolerance', 'lat', 'lon', 'pending')
+
+    def __init__(self, tolerance):
+        self.tolerance = tolerance
+        self.lat = array('d')
+        self.lon = array('d')
+        self.pending = []        # [(lat, lon)]؛ العنصر الأول = آخر نقطة مثبَّتة
+
+
+class TrackStore:
+    """
+    مسار للإلحاق فقط يُغذّى من جمل GGA فى خيط الإدخال.
+    tail(level, start) يعيد النقاط المثبَّتة الجديدة لمستوى ما منذ start
+    مع "الذيل الحى" (نقاط لم تُبسَّط بعد حتى آخر موقع)، فتُرسل للخريطة
+    الإضافات فقط بدل المسار كاملاً.
+    """
+    TOLERANCES = (0.0, 0.5, 2.0, 8.0, 32.0, 128.0, 512.0)   # أمتار لكل مستوى
+    CHUNK = 128                                             # طول القطعة المبسَّطة
+
+    def __init__(self):
+        self.levels = [_TrackLevel(t) for t in self.TOLERANCES]
+        self.total = 0               # عدد المواقع الخام
+        self._lock = Lock()
+
+    def __len__(self):
+        return self.total
+
+    def append(self, lat, lon):
+        with self._lock:
+            self.total += 1
+            self._commit(0, lat, lon)
+
+    def _commit(self, k, lat, lon):
+        lvl = self.levels[k]
+        lvl.lat.append(lat)
+        lvl.lon.append(lon)
+        if k + 1 < len(self.levels):
+            self._feed(k + 1, lat, lon)
+
+    def _feed(self, k, lat, lon):
+        lvl = self.levels[k]
+        if not lvl.pending:
+            # أول نقطة فى المستوى تُثبَّت مباشرةً كمرساة
+            lvl.pending.append((lat, lon))
+            self._commit(k, lat, lon)
+            return
+        lvl.pending.append((lat, lon))
+        if len(lvl.pending) < self.CHUNK:
+            return
+        pend = lvl.pending
+        lats, lons = zip(*pend)
+        keep = douglas_peucker(lats, lons, lvl.tolerance)
+        lvl.pending = [pend[-1]]
+        for i in keep[1:]:           # pend[0] مثبَّتة سابقاً
+            self._commit(k, *pend[i])
+
+    def count(self, level):
+        return len(self.levels[level].lat)
+
+    def level_for(self, zoom, lat=0.0, max_points=None):
+        """
+        أخشن مستوى سماحيته ≤ بكسل واحد عند zoom (خرائط ويب Mercator)؛
+        مع max_points يُختار مستوى أخشن إذا كان المثبَّت فيه أكبر من ذلك.
+        """
+        m_per_px = 156543.03 * math.cos(math.radians(lat)) / (2 ** zoom)
+        level = 0
+        for k, tol in enumerate(self.TOLERANCES):
+            if tol <= m_per_px:
+                level = k
+        if max_points:
+            while level + 1 < len(self.levels) and self.count(level) > max_points:
+                level += 1
+        return level
+
+    def tail(self, level, start=0):
+        """
+        (count، المثبَّت من start كقائمة [lat, lon]، الذيل الحى) لمستوى level.
+        الذيل الحى يبدأ بعد آخر نقطة مثبَّتة وينتهى بآخر موقع خام.
+        """
+        with self._lock:
+            lvl = self.levels[level]
+            count = len(lvl.lat)
+            added = [[a, b] for a, b in zip(lvl.lat[start:], lvl.lon[start:])]
+            live = []
+            for k in range(level, 0, -1):
+                live.extend([a, b] for a, b in self.levels[k].pending[1:])
+        return count, added, live
+
+
+##############################################
+# COMMAND MODULE
+##############################################
+# قناة أوامر غير حاجبة: الأوامر تدخل طابوراً ويكتبها خيط كاتب واحد،
+# والـ ACK ($command,<cmd>,response: OK*xx) يُطابَق من تيار محرّك الإدخال
+# المشترك دون قراءة المنفذ أو تفريغ بافره. كل أمر يُعيد Future.
+
+class CommandError(Exception):
+    """أمر لم يُؤكَّد: رفضه الجهاز، نفدت المحاولات، أو انقطع الاتصال."""
+
+
+class CommandAck:
+    """نتيجة أمر مؤكَّد (قيمة الـ Future)."""
+    __slots__ = ('cmd', 'raw', 'attempts', 'latency')
+
+    def __init__(self, cmd, raw, attempts, latency):
+        self.cmd      = cmd
+        self.raw      = raw          # سطر الـ ACK أو None إذا لم يُنتظر
+        self.attempts = attempts     # 0 = لم يُرسل (مؤكَّد سابقاً فى الجلسة)
+        self.latency  = latency      # ثوانٍ من آخر إرسال حتى الـ ACK
+
+
+def _norm_cmd(cmd):
+    return " ".join(cmd.split()).lower()
+
+
+def ack_matches(cmd, raw):
+    """هل سطر $command يخصّ هذا الأمر (بدون حساسية للحالة والمسافات)؟"""
+    parts = raw.split(',', 2)
+    if len(parts) == 3 and parts[0].lower().endswith("command"):
+        return _norm_cmd(parts[1]) == _norm_cmd(cmd)
+    return _norm_cmd(cmd) in _norm_cmd(raw)
+
+
+def ack_response(raw):
+    """نصّ الرد بعد 'response:' (مثلاً 'OK')، أو '' إذا لم يوجد."""
+    i = raw.find("response:")
+    if i < 0:
+        return ""
+    return raw[i + 9:].split('*', 1)[0].strip()
+
+
+# أوامر "أفعال" لا حالة لها: تُرسل دائماً ولا تُعدّ مؤكَّدة
+ACTION_COMMANDS = frozenset(("saveconfig", "reset", "freset"))
+
+
+def command_key(cmd):
+    """
+    مفتاح الإعداد الذى يغيّره الأمر: أمر لاحق بنفس المفتاح يحلّ محلّه.
+    'GPGGA 1' → 'gpgga'، 'RTCM1074 COM2 1' → 'rtcm1074 com2'،
+    'config com2 9600' → 'config com2'، 'MODE BASE ...' → 'mode'.
+    مفتاح log/unlog هو اسم الرسالة والمنفذ كما فى الصيغة القصيرة:
+    'unlog gpgga' → 'gpgga'، 'log com1 gpgga ontime 1' → 'gpgga com1'.
+    """
+    tokens = _norm_cmd(cmd).split()
+    if not tokens:
+        return ""
+    if tokens[0] == "mode":
+        return "mode"
+    if tokens[0] == "config":
+        return " ".join(tokens[:2])
+    if tokens[0] in ("log", "unlog"):
+        ports = [t for t in tokens[1:] if t[:3] == "com" and t[3:].isdigit()]
+        rest = [t for t in tokens[1:] if t not in ports]
+        if not rest:
+            return tokens[0]
+        return " ".join(rest[:1] + ports[:1])
+    return " ".join(tokens[:-1]) or tokens[0]
+
+
+class _PendingCommand:
+    __slots__ = ('cmd', 'timeout', 'retries', 'expect_ack', 'future', 'attempts', 'sent')
+
+    def __init__(self, cmd, timeout, retries, expect_ack):
+        self.cmd        = cmd
+        self.timeout    = timeout
+        self.retries    = retries
+        self.expect_ack = expect_ack
+        self.future     = Future()
+        self.attempts   = 0
+        self.sent       = 0.0        # perf_counter لآخر إرسال
+
+
+class _CommandBatch:
+    __slots__ = ('items', 'window', 'skip_confirmed', 'future')
+
+    def __init__(self, items, window, skip_confirmed):
+        self.items          = items
+        self.window         = window
+        self.skip_confirmed = skip_confirmed
+        self.future         = Future()
+
+
+class BatchReport:
+    """
+    نتيجة دفعة: لكل أمر (cmd, status, latency, attempts, error) حيث status
+    'ok' أو 'skipped' (مؤكَّد سابقاً فى هذه الجلسة) أو 'failed'.
+    """
+    def __init__(self, entries, total):
+        self.entries = entries
+        self.total   = total         # ثوانٍ للدفعة كاملةً
+
+    def count(self, status):
+        return sum(1 for e in self.entries if e[1] == status)
+
+    @property
+    def ok(self):
+        return not self.count('failed')
+
+
+class CommandEngine:
+    """
+    كاتب الأوامر لاتصال واحد (يملكه IngestEngine). submit() و submit_batch()
+    لا يحجبان أبداً: يُعيدان Future تُحلّ من خيط الكاتب، فعلى الواجهة نقل
+    النتيجة إلى خيطها (إشارة Qt) قبل لمس أى ودجت.
+    داخل الدفعة يبقى حتى window أمراً بانتظار ACK فى آن واحد، والـ ACKs
+    تُطابَق بأى ترتيب وصلت. الأوامر المؤكَّدة فى هذه الجلسة تُسجَّل حسب
+    command_key، فإعادة تطبيق نفس الإعدادات لا ترسل إلا الفرق.
+    """
+    def __init__(self, ingest, timeout=1.0, retries=3, window=4):
+        self.ingest  = ingest
+        self.timeout = timeout
+        self.retries = retries
+        self.window  = window
+        self._sent_watchers = ()     # fn(cmd, attempt) من خيط الكاتب (الترمينالات)
+        self.confirmed = {}          # command_key → آخر أمر مؤكَّد (مطبَّع)
+        self._queue  = queue.Queue()
+        self._ack    = None
+        self._thread = None
+        self._running = False
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._ack = self.ingest.subscribe({"command"}, maxlen=256)
+        self.confirmed.clear()       # اتصال جديد: لا نعرف ما تغيّر على المستقبِل
+        self._running = True
+        self._thread = Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        if self._ack:
+            self._ack.close()
+        self._queue.put(None)
+        if self._thread and self._thread.is_alive() and self._thread is not current_thread():
+            self._thread.join(timeout=2)
+        self._fail_queued(CommandError("соединение закрыто"))
+
+    def _pending(self, cmd, timeout, retries, expect_ack=True):
+        return _PendingCommand(cmd,
+                               self.timeout if timeout is None else timeout,
+                               self.retries if retries is None else retries,
+                               expect_ack)
+
+    def _enqueue(self, batch):
+        if not self._running:
+            error = CommandError("нет соединения")
+            for p in batch.items:
+                p.future.set_exception(error)
+            batch.future.set_exception(error)
+        else:
+            self._queue.put(batch)
+
+    def submit(self, cmd, timeout=None, retries=None, expect_ack=True):
+        """يضع أمراً واحداً فى الطابور ويُعيد Future بـ CommandAck فوراً."""
+        p = self._pending(cmd, timeout, retries, expect_ack)
+        self._enqueue(_CommandBatch([p], 1, False))
+        return p.future
+
+    def submit_batch(self, cmds, window=None, timeout=None, retries=None,
+                     skip_confirmed=True):
+        """
+        يضع دفعة أوامر ويُعيد Future بـ BatchReport. الأوامر تُرسل بالترتيب
+        مع حدّ window أمراً بانتظار ACK؛ فشل أمر لا يوقف بقيّة الدفعة.
+        """
+        items = [self._pending(c, timeout, retries) for c in cmds]
+        batch = _CommandBatch(items, window or self.window, skip_confirmed)
+        self._enqueue(batch)
+        return batch.future
+
+    def watch_sent(self, fn):
+        """fn(cmd, attempt) تُستدعى من خيط الكاتب بعد كل إرسال؛ يجب أن تكون سريعة."""
+        self._sent_watchers = self._sent_watchers + (fn,)
+
+    def unwatch_sent(self, fn):
+        self._sent_watchers = tuple(w for w in self._sent_watchers if w != fn)
+
+    def is_confirmed(self, cmd):
+        return self.confirmed.get(command_key(cmd)) == _norm_cmd(cmd)
+
+    # ---------------- داخلى ---------------- #
+    def _fail_queued(self, error):
+        while True:
+            try:
+                batch = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            if batch is None:
+                continue
+            for p in batch.items:
+                if p.future.set_running_or_notify_cancel():
+                    p.future.set_exception(error)
+            if batch.future.set_running_or_notify_cancel():
+                batch.future.set_exception(error)
+
+    def _run(self):
+        while self._running:
+            batch = self._queue.get()
+            if batch is None:
+                break
+            if not batch.future.set_running_or_notify_cancel():
+                continue
+            t0 = time.perf_counter()
+            try:
+                self._execute(batch)
+            except Exception as e:       # أى خطأ يُسلَّم للـ Futures ولا يُسقط الكاتب
+                for p in batch.items:
+                    if not p.future.done():
+                        p.future.set_exception(e)
+            batch.future.set_result(self._report(batch, time.perf_counter() - t0))
+        self._fail_queued(CommandError("соединение закрыто"))
+
+    @staticmethod
+    def _report(batch, total):
+        entries = []
+        for p in batch.items:
+            if p.future.cancelled():
+                entries.append((p.cmd, 'failed', None, p.attempts, "отменено"))
+                continue
+            err = p.future.exception()
+            if err is not None:
+                entries.append((p.cmd, 'failed', None, p.attempts, str(err)))
+            else:
+                ack = p.future.result()
+                status = 'skipped' if ack.attempts == 0 else 'ok'
+                entries.append((p.cmd, status, ack.latency, ack.attempts, None))
+        return BatchReport(entries, total)
+
+    def _write(self, p):
+        ser = self.ingest.ser
+        if not self._running or not ser or not ser.is_open or self._ack.closed:
+            raise CommandError("нет соединения")
+        try:
+            sendCommand(ser, p.cmd)
+        except serial.SerialException as e:
+            raise CommandError(str(e)) from None
+        p.attempts += 1
+        p.sent = time.perf_counter()
+        for fn in self._sent_watchers:
+            fn(p.cmd, p.attempts)
+
+    def _resolve(self, p, raw):
+        resp = ack_response(raw)
+        if resp and not resp.upper().startswith("OK"):
+            p.future.set_exception(CommandError(f"{p.cmd}: {resp}"))
+            return
+        key = command_key(p.cmd)
+        if key in ("reset", "freset"):
+            self.confirmed.clear()       # المستقبِل عاد لإعداداته المحفوظة/الافتراضية
+        elif key and key not in ACTION_COMMANDS:
+            self.confirmed[key] = _norm_cmd(p.cmd)
+        p.future.set_result(CommandAck(p.cmd, raw, p.attempts, time.perf_counter() - p.sent))
+
+    def _execute(self, batch):
+        waiting = deque(batch.items)
+        inflight = []                    # بترتيب الإرسال
+        seen = set()
+        self._ack.drain()                # ACKs قديمة (لأوامر انتهت مهلتها)
+        while waiting or inflight:
+            # 1) املأ النافذة
+            while waiting and len(inflight) < batch.window:
+                p = waiting.popleft()
+                if not p.future.set_running_or_notify_cancel():
+                    continue
+                norm = _norm_cmd(p.cmd)
+                if batch.skip_confirmed and (norm in seen or self.is_confirmed(p.cmd)):
+                    p.future.set_result(CommandAck(p.cmd, None, 0, 0.0))
+                    continue
+                seen.add(norm)
+                try:
+                    self._write(p)
+                except CommandError as e:
+                    p.future.set_exception(e)
+                    continue
+                if p.expect_ack:
+                    inflight.append(p)
+                else:
+                    p.future.set_result(CommandAck(p.cmd, None, p.attempts, 0.0))
+            if not inflight:
+                continue
+
+            # 2) انتظر أول ACK أو أقرب مهلة
+            left = min(p.sent + p.timeout for p in inflight) - time.perf_counter()
+            s = self._ack.get(timeout=max(0.0, left))
+            if s is not None:
+                for p in inflight:
+                    if ack_matches(p.cmd, s.raw):
+                        inflight.remove(p)
+                        self._resolve(p, s.raw)
+                        break
+            elif self._ack.closed:
+                error = CommandError("соединение закрыто")
+                for p in inflight:
+                    p.future.set_exception(error)
+                inflight = []
+                continue
+
+            # 3) انتهت مهلته: أعد الإرسال أو افشل
+            now = time.perf_counter()
+            for p in [p for p in inflight if now >= p.sent + p.timeout]:
+                if p.attempts <= p.retries:
+                    try:
+                        self._write(p)
+                        continue
+                    except CommandError as e:
+                        p.future.set_exception(e)
+                else:
+                    p.future.set_exception(
+                        CommandError(f"{p.cmd}: нет ответа (попыток: {p.attempts})"))
+                inflight.remove(p)
+
+
+##############################################
+# PROFILE MODULE
+##############################################
+# ملفات تعريف إعداد المستقبِل: قائمة أوامر مسمّاة محفوظة على القرص
+# (profiles.json)، مع آخر حالة مطبَّقة لكل مستقبِل (receivers.json) كقاموس
+# command_key → أمر. التطبيق يرسل فقط الأوامر المختلفة ثم saveconfig واحداً.
+
+DEFAULT_PROFILES = {
+    "RTK base": [
+        "config pvtalg multi",
+        "MODE BASE TIME 120 1",
+        "RTCM1006 COM2 10",
+        "RTCM1033 COM2 10",
+        "RTCM1074 COM2 1",
+        "RTCM1084 COM2 1",
+        "RTCM1094 COM2 1",
+        "RTCM1114 COM2 1",
+        "RTCM1124 COM2 1",
+    ],
+    "rover 10 Hz": [
+        "MODE ROVER",
+        "GPGGA 0.1",
+        "GPRMC 0.1",
+        "GPGSA 1",
+        "GPGST 1",
+        "GPGSV 1",
+        "RTCM1006 COM2 0",
+        "RTCM1033 COM2 0",
+        "RTCM1074 COM2 0",
+        "RTCM1084 COM2 0",
+        "RTCM1094 COM2 0",
+        "RTCM1114 COM2 0",
+        "RTCM1124 COM2 0",
+    ],
+    "NMEA only": [
+        "GPGGA 1",
+        "GPGSA 1",
+        "GPGST 1",
+        "GPGSV 1",
+        "GPRMC 1",
+        "RTCM1006 COM2 0",
+        "RTCM1033 COM2 0",
+        "RTCM1074 COM2 0",
+        "RTCM1084 COM2 0",
+        "RTCM1094 COM2 0",
+        "RTCM1114 COM2 0",
+        "RTCM1124 COM2 0",
+    ],
+}
+
+
+def _load_json(path, default):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+
+def _save_json(path, data):
+    """كتابة ذرّية: ملف مؤقت ثم استبدال، فلا يبقى ملف نصف مكتوب."""
+    folder = os.path.dirname(path)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+
+class ProfileStore:
+    """ملفات التعريف المسمّاة: الاسم → قائمة أوامر بالترتيب."""
+    def __init__(self, path):
+        self.path = path
+        self.profiles = _load_json(path, None) or {k: list(v) for k, v in DEFAULT_PROFILES.items()}
+
+    def names(self):
+        return sorted(self.profiles)
+
+    def get(self, name):
+        return list(self.profiles.get(name, ()))
+
+    def put(self, name, cmds):
+        self.profiles[name] = [c.strip() for c in cmds if c.strip()]
+        self.save()
+
+    def delete(self, name):
+        if self.profiles.pop(name, None) is not None:
+            self.save()
+
+    def save(self):
+        _save_json(self.path, self.profiles)
+
+
+class ReceiverState:
+    """آخر حالة مطبَّقة لكل مستقبِل: receiver → {command_key: أمر مطبَّع}."""
+    def __init__(self, path):
+        self.path = path
+        self.state = _load_json(path, {})
+
+    def applied(self, receiver):
+        return self.state.get(receiver, {})
+
+    def diff(self, receiver, cmds):
+        """
+        الأوامر التى تختلف عن الحالة المطبَّقة (بترتيب الملف)، بدون
+        saveconfig؛ لكل command_key يُعتدّ بآخر أمر فى القائمة.
+        """
+        applied = self.applied(receiver)
+        last = {}
+        for cmd in cmds:
+            key = command_key(cmd)
+            if key and key not in ACTION_COMMANDS:
+                last[key] = cmd
+        return [cmd for key, cmd in last.items() if applied.get(key) != _norm_cmd(cmd)]
+
+    def record(self, receiver, cmds):
+        applied = self.state.setdefault(receiver, {})
+        for cmd in cmds:
+            key = command_key(cmd)
+            if key and key not in ACTION_COMMANDS:
+                applied[key] = _norm_cmd(cmd)
+        self.save()
+
+    def forget(self, receiver):
+        if self.state.pop(receiver, None) is not None:
+            self.save()
+
+    def save(self):
+        _save_json(self.path, self.state)
+
+
+def plan_profile(state, receiver, cmds, full=False):
+    """
+    قائمة الإرسال لتطبيق ملف تعريف: الفرق فقط (أو كل الأوامر مع full)
+    ثم saveconfig واحد فى النهاية؛ قائمة فارغة إذا لا شيء تغيّر.
+    """
+    if full:
+        todo = [c for c in cmds if command_key(c) not in ACTION_COMMANDS]
+    else:
+        todo = state.diff(receiver, cmds)
+    return todo + ["saveconfig"] if todo else []
+
+
+##############################################
+# BANDWIDTH MODULE
+##############################################
+# تقدير حمل رسائل الإخراج على كل منفذ تسلسلى ومقارنته بسعة الـ baud.
+# الأحجام: المقيسة من التيار الحى (IngestEngine.sizes) للـ NMEA إن وُجدت،
+# وإلا تقديرات ثابتة؛ RTCM MSM تُحسب من بنية الرسالة وعدد الأقمار.
+
+BAUD_RATES = (9600, 19200, 38400, 57600, 115200, 230400, 460800, 921600)
+SERIAL_FRAME_BITS = 10               # 8N1: بت بداية + 8 + بت توقف
+BANDWIDTH_HEADROOM = 0.8             # تحذير فوق 80% من السعة
+MAX_PERIOD = 10.0                    # أبطأ معدّل يُقترح (ث)
+
+# متوسط طول الجملة بالبايت مع CR/LF
+NMEA_SENTENCE_BYTES = {'GGA': 82, 'RMC': 72, 'GSA': 66, 'GST': 62, 'GSV': 70,
+                       'VTG': 40, 'ZDA': 38, 'GLL': 50, 'GNS': 90, 'HDT': 20}
+RTCM_FIXED_BYTES = {1005: 25, 1006: 27, 1008: 40, 1019: 67, 1020: 51, 1033: 40,
+                    1042: 70, 1044: 73, 1045: 68, 1046: 69, 1230: 14}
+RTCM_MSM_SYSTEM = {1070: "GPS", 1080: "GLO", 1090: "GAL", 1100: "SBAS",
+                   1110: "QZSS", 1120: "BDS"}
+MSM_BITS = {4: (18, 48), 5: (36, 63), 6: (18, 65), 7: (36, 80)}   # (لكل قمر، لكل إشارة)
+MSM_HEADER_BITS = 169
+MSM_SIGNALS_PER_SAT = 2
+SYSTEM_TALKERS = {"GPS": ("GP",), "GLO": ("GL",), "GAL": ("GA",),
+                  "BDS": ("BD", "GB"), "QZSS": ("QZ",), "SBAS": ("SB",)}
+
+
+def baud_capacity(baud):
+    """بايت/ث الممكنة على منفذ بهذا الـ baud."""
+    return baud / SERIAL_FRAME_BITS
+
+
+def parse_output_command(cmd, default_port="COM1"):
+    """
+    'GPGSV 1' → ('GSV', 'COM1', 1.0)، 'RTCM1074 COM2 1' → ('RTCM1074', 'COM2', 1.0).
+    None إذا لم يكن أمر إخراج رسالة.
+    """
+    tokens = cmd.split()
+    if len(tokens) not in (2, 3):
+        return None
+    name = tokens[0].upper()
+    if name.startswith("RTCM") and name[4:].isdigit():
+        msg = name
+    elif len(name) == 5 and name.isalpha() and name[2:] in NMEA_SENTENCE_BYTES:
+        msg = name[2:]
+    else:
+        return None
+    port = tokens[1].upper() if len(tokens) == 3 else default_port
+    try:
+        period = float(tokens[-1])
+    except ValueError:
+        return None
+    return msg, port, period
+
+
+def message_bytes(msg, sats, measured=None):
+    """
+    (بايت لكل إخراج، هل الحجم مقيس) لرسالة عند عدد أقمار لكل نظام sats.
+    """
+    measured = measured or {}
+    if msg.startswith("RTCM"):
+        num = int(msg[4:])
+        if num in RTCM_FIXED_BYTES:
+            return RTCM_FIXED_BYTES[num], False
+        system = RTCM_MSM_SYSTEM.get(num - num % 10)
+        bits = MSM_BITS.get(num % 10)
+        if system is None or bits is None:
+            return 40, False
+        n = sats.get(system, 0)
+        sig = MSM_SIGNALS_PER_SAT
+        body = MSM_HEADER_BITS + n * sig + n * bits[0] + n * sig * bits[1]
+        return 6 + math.ceil(body / 8), False          # 3 رأس + 3 CRC
+    size = measured.get(msg)
+    is_measured = size is not None
+    if size is None:
+        size = NMEA_SENTENCE_BYTES.get(msg, 80)
+    if msg == 'GSV':
+        # أربعة أقمار لكل جملة، سلسلة لكل نظام
+        return size * max(1, sum(math.ceil(c / 4) for c in sats.values() if c)), is_measured
+    if msg == 'GSA':
+        return size * max(1, sum(1 for c in sats.values() if c)), is_measured
+    return size, is_measured
+
+
+class BandwidthEntry:
+    __slots__ = ('cmd', 'msg', 'port', 'period', 'size', 'measured')
+
+    def __init__(self, cmd, msg, port, period, size, measured):
+        self.cmd      = cmd
+        self.msg      = msg
+        self.port     = port
+        self.period   = period       # ثوانٍ بين إخراجين (0 = معطّل)
+        self.size     = size         # بايت لكل إخراج
+        self.measured = measured
+
+    @property
+    def rate(self):
+        return 1.0 / self.period if self.period > 0 else 0.0
+
+    @property
+    def load(self):
+        return self.size * self.rate
+
+
+def plan_bandwidth(cmds, sats, measured=None, default_port="COM1"):
+    """port → [BandwidthEntry] للرسائل المفعّلة؛ آخر أمر لكل رسالة ومنفذ يغلب."""
+    last = {}
+    for cmd in cmds:
+        parsed = parse_output_command(cmd, default_port)
+        if parsed:
+            last[(parsed[0], parsed[1])] = (cmd, parsed[2])
+    ports = {}
+    for (msg, port), (cmd, period) in last.items():
+        if period <= 0:
+            continue
+        size, is_measured = message_bytes(msg, sats, measured)
+        ports.setdefault(port, []).append(
+            BandwidthEntry(cmd, msg, port, period, size, is_measured))
+    return ports
+
+
+def suggest_baud(load, headroom=BANDWIDTH_HEADROOM):
+    """أصغر baud قياسى يحمل load بايت/ث ضمن الهامش، أو None."""
+    for baud in BAUD_RATES:
+        if load <= baud_capacity(baud) * headroom:
+            return baud
+    return None
+
+
+def suggest_periods(entries, baud, headroom=BANDWIDTH_HEADROOM):
+    """
+    أوامر بمعدّلات أبطأ تناسب baud: تُضاعف فترة أثقل رسالة حتى يكفى
+    الحمل (حتى MAX_PERIOD). يُعيد {cmd القديم: cmd الجديد} أو None.
+    """
+    budget = baud_capacity(baud) * headroom
+    periods = {e.cmd: e.period for e in entries}
+    load = lambda: sum(e.size / periods[e.cmd] for e in entries)
+    while load() > budget:
+        slower = [e for e in entries if periods[e.cmd] * 2 <= MAX_PERIOD]
+        if not slower:
+            return None
+        heavy = max(slower, key=lambda e: e.size / periods[e.cmd])
+        periods[heavy.cmd] *= 2
+    out = {}
+    for e in entries:
+        if periods[e.cmd] != e.period:
+            tokens = e.cmd.split()
+            tokens[-1] = f"{periods[e.cmd]:g}"
+            out[e.cmd] = " ".join(tokens)
+    return out
+
+
+def port_bauds(cmds):
+    """{port: baud} من أوامر 'config comN <baud>' داخل القائمة."""
+    out = {}
+    for cmd in cmds:
+        tokens = cmd.split()
+        if (len(tokens) == 3 and tokens[0].lower() == "config"
+                and tokens[1].upper().startswith("COM") and tokens[2].isdigit()):
+            out[tokens[1].upper()] = int(tokens[2])
+    return out
+
+
+def satellites_by_system(view):
+    """
+    عدد الأقمار المرئية لكل نظام من SatTableView. يُعدّ عمود system (المصنَّف
+    من PRN عند $GN...) لا talker، وإلا ضاعت كل أقمار $GNGSV.
+    """
+    codes, counts = np.unique(view.system, return_counts=True)
+    by_code = dict(zip(codes.tolist(), counts.tolist()))
+    return {system: sum(by_code.get(c, 0) for c in cs)
+            for system, cs in SYSTEM_TALKERS.items()}
+
+
+##############################################
+# BATCH DECODE MODULE
+##############################################
+# تحليل سجلات NMEA الضخمة (تحليل لاحق، بدون واجهة) إلى مصفوفات NumPy
+# منظَّمة: مصفوفة لكل نوع جملة. الملف يُقرأ على قطع فتبقى الذاكرة ثابتة
+# مهما كبر حجمه؛ التأطير والـ checksum والتحويلات الرقمية متجهة بالكامل.
+
+BATCH_CHUNK_BYTES = 8 << 20          # 8 MiB لكل قطعة
+
+GGA_DTYPE = np.dtype([
+    ('time', 'f8'),                  # ثوانٍ منذ منتصف الليل UTC
+    ('lat',  'f8'),                  # درجات عشرية
+    ('lon',  'f8'),
+    ('alt',  'f4'),
+    ('fix',  'i1'),                  # -1 إذا كان الحقل فارغاً
+    ('nsat', 'i2'),
+    ('hdop', 'f4'),
+])
+GSA_DTYPE = np.dtype([('fix', 'i1'), ('pdop', 'f4'), ('hdop', 'f4'), ('vdop', 'f4')])
+GSV_DTYPE = np.dtype([                # صفّ لكل قمر
+    ('system', 'U2'),
+    ('prn',    'i2'),
+    ('elev',   'f4'),
+    ('azim',   'f4'),
+    ('snr',    'f4'),                 # NaN = غير متتبَّع
+])
+RMC_DTYPE = np.dtype([('time', 'f8'), ('lat', 'f8'), ('lon', 'f8'), ('date', 'U6')])
+
+_HEX_LUT = np.full(256, -1, np.int16)
+for _c in "0123456789ABCDEFabcdef":
+    _HEX_LUT[ord(_c)] = int(_c, 16)
+
+_TALKER_CODES = np.array([(ord(t[0]) << 8) | ord(t[1]) for t in NMEA_TALKERS], np.uint16)
+
+
+def nmea_to_degrees(values, hemis):
+    """
+    النسخة المتجهة من _to_decimal: ddmm.mmmm / dddmm.mmmm → درجات عشرية.
+    values: مصفوفة float، hemis: مصفوفة bytes (b'N', b'S', b'E', b'W').
+    """
+    deg = np.floor(values / 100.0)
+    dec = deg + (values - deg * 100.0) / 60.0
+    return np.where((hemis == b'S') | (hemis == b'W'), -dec, dec)
+
+
+def classify_prn_array(prn):
+    """النسخة المتجهة من classify_prn؛ الأرقام الملتبسة (398/399) تبقى 'GN'."""
+    return np.select(
+        [(prn >= 1) & (prn <= 32), (prn >= 65) & (prn <= 96),
+         (prn >= 201) & (prn <= 237), (prn >= 301) & (prn <= 336),
+         (prn >= 120) & (prn <= 158), (prn == 193) | (prn == 194)],
+        ['GP', 'GL', 'BD', 'GA', 'SB', 'QZ'], 'GN')
+
+
+def _col_float(col):
+    """عمود bytes → float64؛ الحقول الفارغة أو التالفة → NaN."""
+    col = np.where(col == b'', b'nan', col)
+    try:
+        return col.astype(np.float64)
+    except ValueError:
+        vals = [_to_float(v.decode('ascii', 'ignore')) for v in col]
+        return np.array([np.nan if v is None else v for v in vals], np.float64)
+
+
+def _col_int(col, missing=-1):
+    return np.nan_to_num(_col_float(col), nan=missing).astype(np.int64)
+
+
+def _hms_to_seconds(t):
+    return np.floor(t / 10000.0) * 3600 + (np.floor(t / 100.0) % 100) * 60 + t % 100
+
+
+def _decode_gga(t, nf, talkers):
+    t = t[nf >= 9]
+    out = np.empty(len(t), GGA_DTYPE)
+    out['time'] = _hms_to_seconds(_col_float(t[:, 0]))
+    out['lat']  = nmea_to_degrees(_col_float(t[:, 1]), t[:, 2])
+    out['lon']  = nmea_to_degrees(_col_float(t[:, 3]), t[:, 4])
+    out['fix']  = _col_int(t[:, 5])
+    out['nsat'] = _col_int(t[:, 6])
+    out['hdop'] = _col_float(t[:, 7])
+    out['alt']  = _col_float(t[:, 8])
+    return out
+
+
+def _decode_gsa(t, nf, talkers):
+    t = t[(nf >= 17) & np.isin(t[:, 1], (b'1', b'2', b'3'))]
+    out = np.empty(len(t), GSA_DTYPE)
+    out['fix']  = _col_int(t[:, 1])
+    out['pdop'] = _col_float(t[:, 14])
+    out['hdop'] = _col_float(t[:, 15])
+    out['vdop'] = _col_float(t[:, 16])
+    return out
+
+
+def _decode_gsv(t, nf, talkers):
+    keep = nf >= 3
+    t, nf, talkers = t[keep], nf[keep], talkers[keep]
+    width = t.shape[1]
+    # حتى 4 أقمار فى السطر، 4 حقول لكل قمر ابتداءً من الحقل 3
+    prn, elev, azim, snr, present = [], [], [], [], []
+    for j in range(4):
+        c = 3 + 4 * j
+        if c + 3 >= width:
+            break
+        prn.append(t[:, c]); elev.append(t[:, c + 1])
+        azim.append(t[:, c + 2]); snr.append(t[:, c + 3])
+        # حقل signal id (NMEA 4.10) لا يُحسب قمراً
+        present.append((nf - 3) // 4 > j)
+    if not prn:
+        return np.empty(0, GSV_DTYPE)
+    prn = np.stack(prn, axis=1)
+    mask = np.stack(present, axis=1) & (prn != b'')
+    prn_i = _col_int(prn[mask])
+    system = np.repeat(talkers, mask.sum(axis=1))
+    gn = system == 'GN'
+    system[gn] = classify_prn_array(prn_i[gn])
+
+    out = np.empty(len(prn_i), GSV_DTYPE)
+    out['system'] = system
+    out['prn']    = prn_i
+    out['elev']   = _col_float(np.stack(elev, axis=1)[mask])
+    out['azim']   = _col_float(np.stack(azim, axis=1)[mask])
+    out['snr']    = _col_float(np.stack(snr, axis=1)[mask])
+    return out
+
+
+def _decode_rmc(t, nf, talkers):
+    t = t[(nf >= 9) & (t[:, 1] == b'A')]
+    out = np.empty(len(t), RMC_DTYPE)
+    out['time'] = _hms_to_seconds(_col_float(t[:, 0]))
+    out['lat']  = nmea_to_degrees(_col_float(t[:, 2]), t[:, 3])
+    out['lon']  = nmea_to_degrees(_col_float(t[:, 4]), t[:, 5])
+    out['date'] = t[:, 8].astype('U6')
+    return out
+
+
+BATCH_DECODERS = {
+    'GGA': (GGA_DTYPE, _decode_gga),
+    'GSA': (GSA_DTYPE, _decode_gsa),
+    'GSV': (GSV_DTYPE, _decode_gsv),
+    'RMC': (RMC_DTYPE, _decode_rmc),
+}
+
+
+def _frame_block(buf, verify=True):
+    """
+    يحدّد حدود كل جملة داخل كتلة تنتهى بـ LF دون أى حلقة بايثون.
+    يُعيد (arr, dollar, star) للجمل الصالحة فقط.
+    """
+    arr = np.frombuffer(buf, np.uint8)
+    ends = np.flatnonzero(arr == 10)
+    if not len(ends):
+        return arr, ends, ends
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    dollars = np.flatnonzero(arr == 36)
+    stars = np.flatnonzero(arr == 42)
+    if not len(dollars) or not len(stars):
+        empty = np.empty(0, np.int64)
+        return arr, empty, empty
+
+    # آخر '$' وآخر '*' فى كل سطر: جملة مقطوعة بلا LF تلتصق بالتالية،
+    # فالتزامن على آخر '$' يُبقى الجملة السليمة بعدها
+    i = np.searchsorted(dollars, ends) - 1
+    d = dollars[np.maximum(i, 0)]
+    j = np.searchsorted(stars, ends) - 1
+    s = stars[np.maximum(j, 0)]
+    ok = (i >= 0) & (d >= starts) & (j >= 0) & (s > d + 6) & (s + 2 < ends)
+    d, s = d[ok], s[ok]
+
+    if verify:
+        hi = _HEX_LUT[arr[s + 1]]
+        lo = _HEX_LUT[arr[s + 2]]
+        cum = np.bitwise_xor.accumulate(arr)
+        good = (hi >= 0) & (lo >= 0) & ((cum[s - 1] ^ cum[d]) == (hi * 16 + lo))
+        d, s = d[good], s[good]
+    return arr, d, s
+
+
+def _decode_block(buf, kinds, verify):
+    arr, d, s = _frame_block(buf, verify)
+    out = {}
+    if not len(d):
+        return {k: np.empty(0, BATCH_DECODERS[k][0]) for k in kinds}
+    kind_code = (arr[d + 3].astype(np.uint32) << 16) | (arr[d + 4].astype(np.uint32) << 8) | arr[d + 5]
+    talker_code = (arr[d + 1].astype(np.uint16) << 8) | arr[d + 2]
+    base = (arr[d + 6] == 44) & np.isin(talker_code, _TALKER_CODES)
+
+    for kind in kinds:
+        dtype, decode = BATCH_DECODERS[kind]
+        code = (ord(kind[0]) << 16) | (ord(kind[1]) << 8) | ord(kind[2])
+        sel = base & (kind_code == code)
+        if not sel.any():
+            out[kind] = np.empty(0, dtype)
+            continue
+        lo, hi = (d[sel] + 7).tolist(), s[sel].tolist()
+        rows = [buf[a:b].split(b',') for a, b in zip(lo, hi)]
+        nf = np.fromiter(map(len, rows), np.int64, len(rows))
+        width = max(int(nf.max()), 20)      # أعرض من أى حقل تقرؤه الدوال أعلاه
+        table = np.array([r + [b''] * (width - len(r)) for r in rows], dtype=bytes)
+        talkers = np.stack([arr[d[sel] + 1], arr[d[sel] + 2]], axis=1).copy()
+        talkers = talkers.view('S2').ravel().astype('U2')
+        out[kind] = decode(table, nf, talkers)
+    return out
+
+
+def _open_binary(source):
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return io.BytesIO(source)
+    if isinstance(source, (str, os.PathLike)):
+        return open(source, 'rb')
+    return contextlib.nullcontext(source)          # كائن ملف مفتوح مسبقاً
+
+
+def iter_decode_nmea(source, kinds=None, chunk_bytes=BATCH_CHUNK_BYTES, verify=True):
+    """
+    يقرأ ملف/بافر NMEA قطعة قطعة ويولّد لكل قطعة dict:
+        {'GGA': ndarray(GGA_DTYPE), 'GSV': ndarray(GSV_DTYPE), ...}
+    الذاكرة المستعملة لا تتجاوز حجم قطعة واحدة مهما كبر الملف.
+    """
+    kinds = tuple(kinds or BATCH_DECODERS)
+    with _open_binary(source) as f:
+        tail = b''
+        while True:
+            block = f.read(chunk_bytes)
+            if not block:
+                break
+            buf = tail + block
+            cut = buf.rfind(b'\n') + 1
+            tail = buf[cut:]
+            if len(tail) > NmeaFramer.MAX_PENDING:  # سطر بلا نهاية = ضجيج
+                tail = b''
+            if cut:
+                yield _decode_block(buf[:cut], kinds, verify)
+        if tail:
+            yield _decode_block(tail + b'\n', kinds, verify)
+
+
+def decode_nmea_log(source, kinds=None, chunk_bytes=BATCH_CHUNK_BYTES, verify=True):
+    """يجمع نتائج iter_decode_nmea فى مصفوفة واحدة لكل نوع."""
+    kinds = tuple(kinds or BATCH_DECODERS)
+    parts = {k: [] for k in kinds}
+    for chunk in iter_decode_nmea(source, kinds, chunk_bytes, verify):
+        for k, a in chunk.items():
+            if len(a):
+                parts[k].append(a)
+    return {k: np.concatenate(v) if v else np.empty(0, BATCH_DECODERS[k][0])
+            for k, v in parts.items()}
+
+
+##############################################
+# LOGGING MODULE
+##############################################
+class AsyncLogWriter:
+    """
+    كاتب CSV بخيط مستقل: write() تضع الصف فى طابور وتعود فوراً،
+    والخيط يكتب الصفوف دفعات عند امتلاء الدفعة أو مرور flush_interval.
+    الملف يبقى مفتوحاً بين الدفعات ويُدوَّر حسب الحجم و/أو الزمن.
+    """
+    def __init__(self, filePath, header=None, max_bytes=None, rotate_seconds=None,
+                 batch_rows=500, flush_interval=1.0):
+        self.filePath = filePath
+        self.header = header
+        self.max_bytes = max_bytes
+        self.rotate_seconds = rotate_seconds
+        self.batch_rows = batch_rows
+        self.flush_interval = flush_interval
+        self.rows_written = 0
+        self.current_path = None
+        self._queue = queue.SimpleQueue()
+        self._file = None
+        self._writer = None
+        self._opened_at = 0.0
+        self._thread = Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    # ---------------- الواجهة ---------------- #
+    def write(self, row):
+        self._queue.put(row)
+
+    def close(self, timeout=5):
+        """يفرّغ ما تبقّى فى الطابور ويغلق الملف."""
+        if self._thread.is_alive():
+            self._queue.put(_LOG_STOP)
+            self._thread.join(timeout)
+
+    # ---------------- داخلى ---------------- #
+    def _rotating(self):
+        return bool(self.max_bytes or self.rotate_seconds)
+
+    def _open(self):
+        if self._rotating():
+            # ملف جديد لكل دورة: name_YYYYmmdd_HHMMSS.csv
+            stem, ext = os.path.splitext(self.filePath)
+            base = f"{stem}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+            path, n = f"{base}{ext or '.csv'}", 1
+            while os.path.exists(path):              # أكثر من دورة فى الثانية نفسها
+                path, n = f"{base}_{n}{ext or '.csv'}", n + 1
+        else:
+            path = self.filePath
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        fresh = not os.path.exists(path) or os.path.getsize(path) == 0
+        self._file = open(path, 'a', newline='', encoding='utf-8')
+        self._writer = csv.writer(self._file)
+        self._opened_at = time.time()
+        self.current_path = path
+        if fresh and self.header:
+            self._writer.writerow(self.header)
+
+    def _close_file(self):
+        if self._file:
+            self._file.close()
+            self._file = self._writer = None
+
+    def _need_rotation(self):
+        if self.max_bytes and self._file.tell() >= self.max_bytes:
+            return True
+        return bool(self.rotate_seconds) and time.time() - self._opened_at >= self.rotate_seconds
+
+    def _flush(self, batch):
+        try:
+            if self._file is None:
+                self._open()
+            self._writer.writerows(batch)
+            self._file.flush()
+            self.rows_written += len(batch)
+            if self._rotating() and self._need_rotation():
+                self._close_file()
+        except Exception as e:
+            print("Ошибка записи лога:", e)
+            self._close_file()
+
+    def _run(self):
+        batch = []
+        last_flush = time.time()
+        stop = False
+        while not stop:
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                item = None
+            # اسحب كل ما تراكم دون انتظار
+            while item is not None:
+                if item is _LOG_STOP:
+                    stop = True
+                    break
+                batch.append(item)
+                if len(batch) >= self.batch_rows:
+                    break
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    item = None
+            now = time.time()
+            if batch and (stop or len(batch) >= self.batch_rows
+                          or now - last_flush >= self.flush_interval):
+                self._flush(batch)
+                batch = []
+                last_flush = now
+        self._close_file()
+
+
+_LOG_STOP = object()
+_LOG_WRITERS = {}          # {filePath: AsyncLogWriter} لـ writeLog
+_LOG_WRITERS_LOCK = Lock()
+
+
+def writeLog(filePath, data):
+    """يضيف صفاً إلى ملف CSV عبر كاتب غير متزامن مشترك لهذا المسار."""
+    with _LOG_WRITERS_LOCK:
+        writer = _LOG_WRITERS.get(filePath)
+        if writer is None:
+            writer = _LOG_WRITERS[filePath] = AsyncLogWriter(filePath)
+    writer.write(data)
+
+
+def closeLogs():
+    """يفرّغ ويغلق كل كتّاب writeLog (يُستدعى عند الخروج)."""
+    with _LOG_WRITERS_LOCK:
+        writers = list(_LOG_WRITERS.values())
+        _LOG_WRITERS.clear()
+    for writer in writers:
+        writer.close()
+
+
+atexit.register(closeLogs)
+
+
+class SessionRecorder:
+    """
+    جلسة تسجيل: يشترك فى محرّك الإدخال (GGA/GSA) ويكتب صفاً لكل GGA
+    مع آخر قيم DOP، عبر AsyncLogWriter فلا يمسّ خيط القراءة أى ملف.
+    """
+    HEADER = ["pc_time", "utc", "lat", "lon", "alt", "fix", "num_sat",
+              "hdop", "pdop", "vdop"]
+
+    def __init__(self, ingest, filePath, max_bytes=None, rotate_seconds=None):
+        self.writer = AsyncLogWriter(filePath, header=self.HEADER,
+                                     max_bytes=max_bytes, rotate_seconds=rotate_seconds)
+        self._sub = ingest.subscribe({"GGA", "GSA"}, maxlen=4096)
+        self._running = True
+        self._thread = Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        self._sub.close()
+        self._thread.join(timeout=2)
+        self.writer.close()
+
+    def _run(self):
+        pdop = vdop = None
+        while self._running:
+            s = self._sub.get(timeout=0.5)
+            if s is None:
+                if self._sub.closed:
+                    break
+                continue
+            rec = s.data
+            if rec is None:
+                continue
+            if s.kind == "GSA":
+                pdop, vdop = rec.pdop, rec.vdop
+                continue
+            self.writer.write([
+                datetime.fromtimestamp(s.ts).isoformat(timespec='milliseconds'),
+                rec.time, rec.lat, rec.lon, rec.alt, rec.fix_quality,
+                rec.num_sat, rec.hdop, pdop, vdop,
+            ])
+
+##############################################
+# RAW CAPTURE MODULE
+##############################################
+# صيغة التسجيل الخام (.gnr) – البايتات كما قُرئت من المنفذ حرفياً:
+#   رأس الملف : CAP_MAGIC | زمن البداية (f8)
+#   كل كتلة   : ts (f8) | raw_len (u4) | stored_len (u4) | codec (u1) | payload
+#   الـ payload بعد فكّ الضغط سلسلة قراءات: dt_us (u4) | len (u4) | bytes
+# الفهرس الجانبى (.gnr.idx): IDX_MAGIC | زمن البداية (f8) | الخطوة بالثوانى (u4)
+#   ثم u8 لكل خطوة k = إزاحة آخر كتلة طابعها ≤ البداية + k × الخطوة.
+#   فتح التسجيل عند أى دقيقة = قراءة 8 بايت من موضع محسوب ⇒ زمن ثابت.
+
+CAP_MAGIC = b"GNSSRAW1"
+IDX_MAGIC = b"GNSSIDX1"
+_CAP_HEADER = struct.Struct('<8sd')
+_CAP_CHUNK  = struct.Struct('<dIIB')
+_CAP_READ   = struct.Struct('<II')
+_IDX_HEADER = struct.Struct('<8sdI')
+_IDX_ENTRY  = struct.Struct('<Q')
+CODEC_RAW, CODEC_ZLIB = 0, 1
+
+
+class RawCaptureWriter:
+    """
+    مسجّل البايتات الخام. write() تُستدعى من خيط القراءة (كـ tap فى
+    IngestEngine) وتنسخ البايتات إلى الكتلة الحالية فقط؛ الضغط والكتابة
+    على القرص فى خيط مستقل.
+    """
+    def __init__(self, path, compress=True, block_bytes=64 * 1024,
+                 block_seconds=0.5, index_step=1):
+        self.path = path
+        self.compress = compress
+        self.block_bytes = block_bytes
+        self.block_seconds = block_seconds
+        self.index_step = index_step
+        self.bytes_in = 0            # بايتات خام مستلمة
+        self.bytes_out = 0           # بايتات مكتوبة على القرص
+        self._lock = Lock()
+        self._block = bytearray()
+        self._block_ts = None
+        self._queue = queue.SimpleQueue()
+        self._next_k = 0             # أول خطوة فهرس لم تُكتب بعد
+        self._prev_off = None        # إزاحة آخر كتلة مكتوبة
+        self._last_ts = None         # زمن آخر قراءة خام
+
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        self.start = time.time()
+        self._f = open(path, 'wb')
+        self._idx = open(path + '.idx', 'wb')
+        self._f.write(_CAP_HEADER.pack(CAP_MAGIC, self.start))
+        self._idx.write(_IDX_HEADER.pack(IDX_MAGIC, self.start, index_step))
+        self._thread = Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    # ---------------- الواجهة ---------------- #
+    def write(self, ts, data):
+        with self._lock:
+            if self._block_ts is None:
+                self._block_ts = ts
+            self._last_ts = ts
+            dt_us = max(0, round((ts - self._block_ts) * 1e6))
+            self._block += _CAP_READ.pack(dt_us, len(data))
+            self._block += data
+            self.bytes_in += len(data)
+            if (len(self._block) >= self.block_bytes
+                    or ts - self._block_ts >= self.block_seconds):
+                self._cut_locked()
+
+    def close(self, timeout=5):
+        """يكتب الكتلة الأخيرة ويغلق الملفين."""
+        if self._thread.is_alive():
+            with self._lock:
+                self._cut_locked()
+            self._queue.put(_LOG_STOP)
+            self._thread.join(timeout)
+
+    # ---------------- داخلى ---------------- #
+    def _cut_locked(self):
+        if self._block:
+            self._queue.put((self._block_ts, bytes(self._block)))
+            self._block.clear()
+            self._block_ts = None
+
+    def _write_chunk(self, ts, payload):
+        stored, codec = payload, CODEC_RAW
+        if self.compress:
+            z = zlib.compress(payload, 1)
+            if len(z) < len(payload):
+                stored, codec = z, CODEC_ZLIB
+        off = self._f.tell()
+        self._f.write(_CAP_CHUNK.pack(ts, len(payload), len(stored), codec))
+        self._f.write(stored)
+        self._f.flush()
+        self.bytes_out += _CAP_CHUNK.size + len(stored)
+
+        # الخطوة k تشير إلى آخر كتلة بدأت عند start + k·step أو قبله، أى
+        # الكتلة التى تغطّى ذلك الزمن: كل خطوة قبل ts تخصّ الكتلة السابقة
+        # (أو هذه إن كانت الأولى)، وما بعد ts يُحسم مع الكتلة التالية
+        self._index_until(math.ceil((ts - self.start) / self.index_step),
+                          off if self._prev_off is None else self._prev_off)
+        self._prev_off = off
+
+    def _index_until(self, k_end, off):
+        """يكتب off لكل خطوات الفهرس من _next_k حتى ما قبل k_end."""
+        if k_end > self._next_k:
+            self._idx.write(_IDX_ENTRY.pack(off) * (k_end - self._next_k))
+            self._idx.flush()
+            self._next_k = k_end
+
+    def _run(self):
+        while True:
+            try:
+                item = self._queue.get(timeout=self.block_seconds)
+            except queue.Empty:
+                # لا بيانات جديدة: أغلق الكتلة الجزئية حتى لا تبقى فى الذاكرة
+                with self._lock:
+                    if self._block_ts is not None and time.time() - self._block_ts >= self.block_seconds:
+                        self._cut_locked()
+                continue
+            if item is _LOG_STOP:
+                # الخطوات حتى آخر قراءة تغطّيها الكتلة الأخيرة
+                if self._prev_off is not None and self._last_ts is not None:
+                    try:
+                        self._index_until(int((self._last_ts - self.start) // self.index_step) + 1,
+                                          self._prev_off)
+                    except OSError as e:
+                        print("Ошибка записи захвата:", e)
+                break
+            try:
+                self._write_chunk(*item)
+            except OSError as e:
+                print("Ошибка записи захвата:", e)
+                break
+        self._f.close()
+        self._idx.close()
+
+
+class RawCaptureReader:
+    """قارئ ملفات .gnr مع القفز إلى أى زمن عبر الفهرس الجانبى."""
+    def __init__(self, path):
+        self.path = path
+        self._f = open(path, 'rb')
+        magic, self.start = _CAP_HEADER.unpack(self._f.read(_CAP_HEADER.size))
+        if magic != CAP_MAGIC:
+            self._f.close()
+            raise ValueError(f"Не файл записи GNSS: {path}")
+        self._idx = None
+        self.index_step = 1
+        self.index_len = 0
+        try:
+            idx = open(path + '.idx', 'rb')
+        except OSError:
+            return                                   # بدون فهرس: قراءة من البداية فقط
+        magic, start, step = _IDX_HEADER.unpack(idx.read(_IDX_HEADER.size))
+        if magic == IDX_MAGIC and start == self.start:
+            self._idx = idx
+            self.index_step = step
+            self.index_len = (os.path.getsize(path + '.idx') - _IDX_HEADER.size) // _IDX_ENTRY.size
+        else:
+            idx.close()
+
+    @property
+    def end_time(self):
+        """نهاية تقريبية (بدقة خطوة الفهرس)."""
+        return self.start + self.index_len * self.index_step
+
+    def offset_at(self, t):
+        """إزاحة الكتلة التى تبدأ عندها القراءة للزمن t (epoch)؛ None بعد النهاية."""
+        if self._idx is None or t <= self.start:
+            return _CAP_HEADER.size
+        k = int((t - self.start) // self.index_step)
+        if k >= self.index_len:
+            return None
+        self._idx.seek(_IDX_HEADER.size + k * _IDX_ENTRY.size)
+        return _IDX_ENTRY.unpack(self._idx.read(_IDX_ENTRY.size))[0]
+
+    def reads(self, from_time=None):
+        """يولّد (ts, data) لكل قراءة خام بالترتيب، ابتداءً من from_time إن حُدِّد."""
+        off = self.offset_at(from_time) if from_time else _CAP_HEADER.size
+        if off is None:
+            return
+        f = self._f
+        f.seek(off)
+        while True:
+            hdr = f.read(_CAP_CHUNK.size)
+            if len(hdr) < _CAP_CHUNK.size:
+                return                               # نهاية الملف (أو كتلة مبتورة)
+            ts, raw_len, stored_len, codec = _CAP_CHUNK.unpack(hdr)
+            stored = f.read(stored_len)
+            if len(stored) < stored_len:
+                return
+            payload = zlib.decompress(stored) if codec == CODEC_ZLIB else stored
+            pos, end = 0, len(payload)
+            while pos < end:
+                dt_us, n = _CAP_READ.unpack_from(payload, pos)
+                pos += _CAP_READ.size
+                rts = ts + dt_us / 1e6
+                # dt_us مقرَّب لأقرب µs: نصف µs سماحية فتُشمل قراءة طابعها from_time تماماً
+                if from_time is None or rts >= from_time - 5e-7:
+                    yield rts, payload[pos:pos + n]
+                pos += n
+
+    def close(self):
+        self._f.close()
+        if self._idx:
+            self._idx.close()
+
+
+##############################################
+# REPLAY MODULE
+##############################################
+# مصدر بديل يتصرّف كمقبض serial.Serial: يعيد تشغيل تسجيل خام (.gnr) أو
+# ملف NMEA نصى بالزمن الحقيقى أو مضروباً فى معامل (10×، 100×) أو بأقصى
+# سرعة. IngestEngine والصفحات لا تفرّق بينه وبين منفذ حقيقى.
+
+REPLAY_PORT   = "Воспроизведение…"
+SIM_PORT      = "Симулятор…"
+REPLAY_SPEEDS = {"1×": 1.0, "10×": 10.0, "100×": 100.0, "Макс.": 0.0}
+
+
+def _nmea_time_of_day(line):
+    """ثوانى اليوم من حقل الزمن فى GGA/RMC، أو None."""
+    if not line.startswith(b'$') or line[3:6] not in (b'GGA', b'RMC'):
+        return None
+    parts = line.split(b',', 2)
+    if len(parts) < 2 or len(parts[1]) < 6:
+        return None
+    f = parts[1]
+    try:
+        return int(f[0:2]) * 3600 + int(f[2:4]) * 60 + float(f[4:])
+    except ValueError:
+        return None
+
+
+def iter_nmea_text(path):
+    """
+    يولّد (ts, bytes) من ملف NMEA نصى: كل الأسطر بين زمنين مختلفين فى
+    GGA/RMC تشكّل حقبة واحدة، والفارق بين الحقب يُؤخذ من حقل الزمن.
+    """
+    ts, last_tod = 0.0, None
+    chunk = bytearray()
+    with open(path, 'rb') as f:
+        for line in f:
+            tod = _nmea_time_of_day(line)
+            if tod is not None and tod != last_tod:
+                if chunk:
+                    yield ts, bytes(chunk)
+                    chunk.clear()
+                if last_tod is not None:
+                    dt = tod - last_tod
+                    if dt < -43200:                  # عبور منتصف الليل
+                        dt += 86400
+                    ts += dt if 0 < dt <= 60 else 1.0  # قفزات/فجوات → ثانية
+                last_tod = tod
+            chunk += line
+    if chunk:
+        yield ts, bytes(chunk)
+
+
+def replay_source(path):
+    """مصنع مولّدات (ts, bytes) حسب صيغة الملف: تسجيل خام أو نص NMEA."""
+    with open(path, 'rb') as f:
+        raw = f.read(len(CAP_MAGIC)) == CAP_MAGIC
+    if raw:
+        def source():
+            reader = RawCaptureReader(path)
+            try:
+                yield from reader.reads()
+            finally:
+                reader.close()
+        return source
+    return lambda: iter_nmea_text(path)
+
+
+class ReplaySerial:
+    """
+    منفذ تسلسلى افتراضى. source دالة تعيد مولّد (ts, bytes)؛ خيط داخلى
+    يضخّ البايتات إلى بافر الاستقبال حسب الطوابع الزمنية مقسومة على speed
+    (0 = بأقصى سرعة يستهلكها القارئ). البافر محدود فلا تنفجر الذاكرة.
+    """
+    MAX_BUFFER = 256 * 1024
+
+    def __init__(self, source, speed=1.0, loop=False, timeout=1, port="replay"):
+        self.port = port
+        self.baudrate = 0
+        self.timeout = timeout
+        self.speed = speed
+        self.loop = loop
+        self.finished = False        # انتهى الملف (بدون loop)
+        self.bytes_replayed = 0
+        self.bytes_written = 0       # الأوامر المرسلة تُهمل
+        self._source = source
+        self._buf = bytearray()
+        self._cond = Condition()
+        self._open = True
+        self._thread = Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    @classmethod
+    def from_file(cls, path, speed=1.0, loop=False, timeout=1):
+        return cls(replay_source(path), speed, loop, timeout,
+                   port=os.path.basename(path))
+
+    # ---------------- واجهة serial.Serial ---------------- #
+    @property
+    def is_open(self):
+        return self._open
+
+    @property
+    def in_waiting(self):
+        return len(self._buf)
+
+    def _check_open(self):
+        if not self._open:
+            raise serial.SerialException("Порт воспроизведения закрыт")
+
+    def read(self, size=1):
+        self._check_open()
+        with self._cond:
+            if not self._buf and self.timeout != 0:
+                self._cond.wait_for(lambda: self._buf or not self._open, self.timeout)
+            data = bytes(self._buf[:size])
+            del self._buf[:size]
+            self._cond.notify_all()
+        return data
+
+    def readline(self):
+        self._check_open()
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        with self._cond:
+            while b'\n' not in self._buf and self._open:
+                left = None if deadline is None else deadline - time.monotonic()
+                if left is not None and left <= 0:
+                    break
+                self._cond.wait(left)
+            i = self._buf.find(b'\n')
+            n = i + 1 if i >= 0 else len(self._buf)
+            data = bytes(self._buf[:n])
+            del self._buf[:n]
+            self._cond.notify_all()
+        return data
+
+    def write(self, data):
+        self._check_open()
+        self.bytes_written += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def reset_input_buffer(self):
+        with self._cond:
+            self._buf.clear()
+            self._cond.notify_all()
+
+    def reset_output_buffer(self):
+        pass
+
+    def close(self):
+        with self._cond:
+            self._open = False
+            self._cond.notify_all()
+        if self._thread.is_alive() and self._thread is not current_thread():
+            self._thread.join(timeout=2)
+
+    # ---------------- خيط الضخّ ---------------- #
+    def _wait(self, seconds):
+        """نوم قابل للمقاطعة بالإغلاق."""
+        with self._cond:
+            self._cond.wait_for(lambda: not self._open, seconds)
+
+    def _run(self):
+        try:
+            while self._open:
+                t0, ts0 = time.monotonic(), None
+                for ts, data in self._source():
+                    if not self._open:
+                        return
+                    if self.speed > 0:
+                        if ts0 is None:
+                            ts0 = ts
+                        delay = t0 + (ts - ts0) / self.speed - time.monotonic()
+                        if delay > 0:
+                            self._wait(delay)
+                    with self._cond:
+                        self._cond.wait_for(
+                            lambda: len(self._buf) < self.MAX_BUFFER or not self._open)
+                        self._buf += data
+                        self.bytes_replayed += len(data)
+                        self._cond.notify_all()
+                if not self.loop:
+                    break
+        except (OSError, ValueError) as e:
+            print("Ошибка воспроизведения:", e)
+        finally:
+            self.finished = True
+
 
-def parseRMC(raw):
-        """
-        يُستخرج منها فقط الحقول الأساسية:
-        parts[2] = status ('A' = active)
-        parts[3],parts[4] = latitude, N/S
-        parts[5],parts[6] = longitude, E/W
-        """
-        parts = raw.split(',')
-        if len(parts) < 7 or parts[2] != 'A':
-            return None
-        return {
-            'latitude':     parts[3],
-            'lat_direction':parts[4],
-            'longitude':    parts[5],
-            'lon_direction':parts[6],
-        }
 ##############################################
-# LOGGING MODULE
+# SIMULATION MODULE
 ##############################################
-def writeLog(filePath, data):
+# مولّد حركة NMEA اصطناعية قابلة للتكرار (نفس البذرة ⇒ نفس البايتات):
+# GGA/GSA/GSV/RMC/GST لعدّة كوكبات، بعدد أقمار ومعدّل ومسار قابلة للضبط،
+# مع حقن أعطال (checksum خاطئ، أسطر مبتورة، أجزاء GSV مفقودة).
+# يُشغَّل عبر ReplaySerial كمنفذ افتراضى أو عبر طرفية زائفة (pty).
+
+# نطاقات PRN مطابقة لـ classify_prn
+SIM_PRN_RANGES = {
+    "GP": range(1, 33),    "GL": range(65, 97),   "GA": range(301, 337),
+    "BD": range(201, 238), "QZ": (193, 194),      "SB": range(120, 159),
+}
+
+SIM_PRESETS = {
+    "Статика: 12 спутников GPS, 1 Гц":  dict(sats=12, systems=("GP",), rate_hz=1),
+    "Движение: 40 спутников, 10 Гц":    dict(sats=40, rate_hz=10, moving=True),
+    "Нагрузка: 120 спутников, 20 Гц":   dict(sats=120, rate_hz=20, moving=True),
+    "Сбои: 30 спутников, 5 Гц":         dict(sats=30, rate_hz=5, bad_checksum=0.02,
+                                             truncate=0.02, drop_gsv=0.05),
+}
+
+
+def _nmea_coord(value, is_lat):
+    """درجة عشرية → (ddmm.mmmmm أو dddmm.mmmmm، نصف الكرة)."""
+    if is_lat:
+        hemi = "N" if value >= 0 else "S"
+    else:
+        hemi = "E" if value >= 0 else "W"
+    v = abs(value)
+    d = int(v)
+    m = (v - d) * 60
+    return (f"{d:02d}{m:08.5f}" if is_lat else f"{d:03d}{m:08.5f}"), hemi
+
+
+class NmeaSimulator:
+    """
+    مولّد حقب NMEA. stream() مولّد (ts, bytes) بحقبة واحدة لكل عنصر،
+    يبدأ من البذرة فى كل استدعاء فيصلح مباشرة كمصدر لـ ReplaySerial.
+    """
+    def __init__(self, seed=0, sats=12, systems=("GP", "GL", "GA", "BD", "QZ", "SB"),
+                 rate_hz=1, moving=False, lat=55.7512, lon=37.6184, alt=150.0,
+                 speed_mps=10.0, date="010125", start_tod=12 * 3600,
+                 bad_checksum=0.0, truncate=0.0, drop_gsv=0.0):
+        if not 1 <= rate_hz <= 50:
+            raise ValueError("rate_hz должен быть в диапазоне 1–50")
+        unknown = set(systems) - set(SIM_PRN_RANGES)
+        if unknown:
+            raise ValueError(f"Неизвестные системы: {sorted(unknown)}")
+        self.seed = seed
+        self.sats = sats
+        self.systems = tuple(systems)
+        self.rate_hz = rate_hz
+        self.moving = moving
+        self.lat, self.lon, self.alt = lat, lon, alt
+        self.speed_mps = speed_mps
+        self.date = date
+        self.start_tod = start_tod
+        self.bad_checksum = bad_checksum
+        self.truncate = truncate
+        self.drop_gsv = drop_gsv
+        self.injected = {"bad_checksum": 0, "truncated": 0, "dropped_gsv": 0}
+
+    # ---------------- الهندسة ---------------- #
+    def _make_sats(self, rng):
+        """توزيع الأقمار دوريّاً على الكوكبات فى حدود نطاق PRN لكل منها."""
+        pools = {sys_: list(SIM_PRN_RANGES[sys_]) for sys_ in self.systems}
+        for pool in pools.values():
+            rng.shuffle(pool)
+        sats = []
+        while len(sats) < self.sats and any(pools.values()):
+            for sys_ in self.systems:
+                if pools[sys_] and len(sats) < self.sats:
+                    # [system, prn, elevation, azimuth, d_el/s, d_az/s, snr]
+                    sats.append([sys_, pools[sys_].pop(), rng.uniform(0, 90),
+                                 rng.uniform(0, 360), rng.uniform(-0.01, 0.01),
+                                 rng.uniform(-0.02, 0.02), None])
+        sats.sort(key=lambda s: (self.systems.index(s[0]), s[1]))
+        return sats
+
+    # ---------------- الإخراج ---------------- #
+    def _line(self, body, frng):
+        cs = nmea_checksum(body.encode('ascii'))
+        if self.bad_checksum and frng.random() < self.bad_checksum:
+            cs ^= frng.randrange(1, 256)
+            self.injected["bad_checksum"] += 1
+        line = f"${body}*{cs:02X}\r\n"
+        if self.truncate and frng.random() < self.truncate:
+            # سطر مبتور بلا نهاية: الجملة التالية تبدأ بـ '$' مباشرة
+            line = line[:frng.randrange(2, len(line) - 2)]
+            self.injected["truncated"] += 1
+        return line
+
+    def stream(self, duration=None):
+        """يولّد (ts, bytes) لكل حقبة؛ duration بالثوانى أو None لتدفق لا ينتهى."""
+        rng = random.Random(self.seed)
+        frng = random.Random(f"{self.seed}-faults")   # الأعطال لا تغيّر الهندسة
+        self.injected = dict.fromkeys(self.injected, 0)
+        sats = self._make_sats(rng)
+        dt = 1.0 / self.rate_hz
+        lat, lon = self.lat, self.lon
+        heading = rng.uniform(0, 360)
+        talker = self.systems[0] if len(self.systems) == 1 else "GN"
+        n = 0
+        while duration is None or n * dt < duration:
+            t = n * dt
+            tod = (self.start_tod + t) % 86400
+            hh, rem = divmod(tod, 3600)
+            mm, ss = divmod(rem, 60)
+            utc = f"{int(hh):02d}{int(mm):02d}{ss:05.2f}"
+
+            # الموقع
+            if self.moving:
+                heading = (heading + rng.gauss(0, 2) * dt) % 360
+                step = self.speed_mps * dt
+                lat += step * math.cos(math.radians(heading)) / 111320
+                lon += step * math.sin(math.radians(heading)) / (111320 * math.cos(math.radians(lat)))
+                speed_kn, course = self.speed_mps * 1.943844, heading
+            else:
+                speed_kn, course = 0.0, 0.0
+            fix_lat = lat + rng.gauss(0, 0.3) / 111320
+            fix_lon = lon + rng.gauss(0, 0.3) / 111320
+
+            # الأقمار: حركة بطيئة فى السماء، SNR من الارتفاع
+            used = {}
+            for s in sats:
+                s[2] += s[4] * dt
+                if not 0 <= s[2] <= 90:
+                    s[4] = -s[4]
+                    s[2] = min(90.0, max(0.0, s[2]))
+                s[3] = (s[3] + s[5] * dt) % 360
+                s[6] = None
+                if s[2] >= 5:
+                    s[6] = int(min(55, max(10, 25 + s[2] * 0.25 + rng.gauss(0, 2))))
+                    if s[2] >= 10:
+                        used.setdefault(s[0], []).append(s[1])
+            n_used = sum(len(v) for v in used.values())
+            hdop = max(0.5, 6.0 / math.sqrt(n_used)) if n_used else 99.9
+            vdop = hdop * 1.4
+            pdop = math.hypot(hdop, vdop)
+
+            la, ns_ = _nmea_coord(fix_lat, True)
+            lo, ew = _nmea_coord(fix_lon, False)
+            out = [self._line(
+                f"{talker}GGA,{utc},{la},{ns_},{lo},{ew},{1 if n_used >= 4 else 0},"
+                f"{n_used:02d},{hdop:.1f},{self.alt + rng.gauss(0, 0.5):.1f},M,14.0,M,,", frng)]
+            for sys_ in self.systems:
+                prns = used.get(sys_, [])[:12]
+                if not prns:
+                    continue
+                fields = ",".join([f"{p:02d}" for p in prns] + [""] * (12 - len(prns)))
+                out.append(self._line(
+                    f"{talker}GSA,A,3,{fields},{pdop:.1f},{hdop:.1f},{vdop:.1f}", frng))
+            for sys_ in self.systems:
+                group = [s for s in sats if s[0] == sys_]
+                total = max(1, (len(group) + 3) // 4)
+                for k in range(total):
+                    if self.drop_gsv and total > 1 and frng.random() < self.drop_gsv:
+                        self.injected["dropped_gsv"] += 1
+                        continue
+                    body = f"{sys_}GSV,{total},{k + 1},{len(group):02d}"
+                    for s in group[k * 4:k * 4 + 4]:
+                        snr = "" if s[6] is None else f"{s[6]:02d}"
+                        body += f",{s[1]:02d},{int(s[2]):02d},{int(s[3]):03d},{snr}"
+                    out.append(self._line(body, frng))
+            out.append(self._line(
+                f"{talker}RMC,{utc},A,{la},{ns_},{lo},{ew},{speed_kn:.2f},{course:.1f},"
+                f"{self.date},,,A", frng))
+            out.append(self._line(
+                f"{talker}GST,{utc},{hdop * 0.8:.2f},{hdop * 1.2:.2f},{hdop * 0.7:.2f},"
+                f"{course:.1f},{hdop * 0.9:.2f},{hdop * 0.8:.2f},{vdop * 1.1:.2f}", frng))
+            yield t, "".join(out).encode('ascii')
+            n += 1
+
+
+def _pty_garble(data, rng, ratio):
+    """
+    ما يراه UART بسرعة خاطئة: بايتات عشوائية بعدد يتناسب مع نسبة السرعتين،
+    بلا زيادة على حجم الدفعة نفسها: الزائد يملأ بافر الطرف فيصل بعد أن غيّر
+    القارئ سرعته، وهذا لا يحدث مع منفذ حقيقى.
+    """
+    return bytes(rng.getrandbits(8) for _ in range(max(1, int(len(data) * min(ratio, 1.0)))))
+
+
+def serve_pty(source, speed=1.0, baud=None):
+    """
+    يكتب مصدر (ts, bytes) إلى طرفية زائفة (POSIX فقط) بنفس توقيت
+    ReplaySerial، ويعيد (مسار الطرف، دالة الإيقاف). يُفتح المسار كأى منفذ.
+    مع baud يحاكى جهازاً بسرعة ثابتة: إذا ضبط القارئ الطرف على سرعة أخرى
+    تصله بايتات مشوّهة بدل الجمل (لاختبار اكتشاف السرعة).
+    """
+    if not hasattr(os, "openpty"):
+        raise OSError("Псевдотерминал недоступен на этой платформе")
+    import tty
+    import termios
+    master, slave = os.openpty()
+    tty.setraw(slave)
+    name = os.ttyname(slave)
+    feed = ReplaySerial(source, speed, timeout=0.5, port=name)
+    want = getattr(termios, f"B{baud}", None) if baud else None
+    speeds = {getattr(termios, f"B{b}"): b for b in COMMON_BAUDS if hasattr(termios, f"B{b}")}
+    rng = random.Random(baud)
+
+    def pump():
+        try:
+            while feed.is_open:
+                data = feed.read(max(1, feed.in_waiting))
+                if data and want is not None:
+                    # سرعة القارئ كما ضبطها على الطرف (ospeed)
+                    ospeed = termios.tcgetattr(slave)[5]
+                    if ospeed != want:
+                        data = _pty_garble(data, rng, speeds.get(ospeed, baud) / baud)
+                if data:
+                    os.write(master, data)
+        except (OSError, serial.SerialException):
+            pass
+
+    Thread(target=pump, daemon=True).start()
+
+    def stop():
+        feed.close()
+        for fd in (master, slave):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+    return name, stop
+
+
+def sim_pty_main(argv):
+    """تشغيل المولّد على pty من سطر الأوامر: improved_ui.py --sim-pty [خيارات]."""
+    import argparse
+    ap = argparse.ArgumentParser(prog="improved_ui.py --sim-pty")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--sats", type=int, default=12)
+    ap.add_argument("--rate", type=int, default=1, help="Гц, 1–50")
+    ap.add_argument("--systems", default="GP,GL,GA,BD,QZ,SB")
+    ap.add_argument("--moving", action="store_true")
+    ap.add_argument("--bad-checksum", type=float, default=0.0)
+    ap.add_argument("--truncate", type=float, default=0.0)
+    ap.add_argument("--drop-gsv", type=float, default=0.0)
+    ap.add_argument("--baud", type=int, default=None,
+                    help="محاكاة جهاز بهذه السرعة (لاختبار AUTO)")
+    args = ap.parse_args(argv)
+    sim = NmeaSimulator(seed=args.seed, sats=args.sats, rate_hz=args.rate,
+                        systems=tuple(args.systems.split(",")), moving=args.moving,
+                        bad_checksum=args.bad_checksum, truncate=args.truncate,
+                        drop_gsv=args.drop_gsv)
+    name, stop = serve_pty(sim.stream, baud=args.baud)
+    at = f" @ {args.baud}" if args.baud else ""
+    print(f"Симулятор NMEA на {name}{at} (Ctrl+C для выхода)")
     try:
-        with open(filePath, 'a', newline='', encoding='utf-8') as csvfile:
-            writer = csv.writer(csvfile)
-            writer.writerow(data)
-    except Exception as e:
-        print("Ошибка записи лога:", e)
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop()
+
 
 ##############################################
 # CONFIGURATION & LANGUAGE MODULE
 ##############################################
+USER_CONFIG_DIR = "SelkhozRisheniya"
+
+def user_config_path(name="settings.ini"):
+    """
+    ملف إعدادات المستخدم القابل للكتابة: %APPDATA% على ويندوز وإلا ~/.config.
+    config.ini بجانب البرنامج (أو داخل _MEIPASS عند التشغيل كـ exe) للقراءة فقط.
+    """
+    base = os.environ.get("APPDATA") or os.path.join(os.path.expanduser("~"), ".config")
+    return os.path.join(base, USER_CONFIG_DIR, name)
+
+def user_data_path(path):
+    """مسار من config.ini: النسبى يُحلّ فى مجلد المستخدم (بجانب settings.ini) لا فى CWD."""
+    return os.path.join(os.path.dirname(user_config_path()), os.path.expanduser(path))
+
 def loadConfiguration(configFile):
+    # إعدادات المستخدم تُقرأ بعد config.ini فتتقدّم عليه
     config = configparser.ConfigParser()
-    config.read(configFile, encoding="utf-8")
+    config.read([configFile, user_config_path()], encoding="utf-8")
     return config
 
+def saveConfiguration(config, configFile):
+    with open(configFile, "w", encoding="utf-8") as f:
+        config.write(f)
+
+def saveUserSettings(section, values):
+    """يحدّث مفاتيح قسم واحد فى ملف المستخدم ويُبقى بقيّته وحالة أحرف المفاتيح."""
+    path = user_config_path()
+    config = configparser.ConfigParser()
+    config.optionxform = str
+    config.read(path, encoding="utf-8")
+    if not config.has_section(section):
+        config.add_section(section)
+    for key, value in values.items():
+        config.set(section, key, str(value))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    saveConfiguration(config, path)
+
 def loadLanguageResources(language):
     resources = {}
     try:
@@ -298,81 +3087,140 @@ class TrackingCanvas(FigureCanvas):
         "ALL": "#ff3030",        # للأوضاع المختلطة
     }
 
+    SPACING = 3                  # المسافة بين مراكز الأعمدة
+    BAR_W   = 1.3                # عرض العمود
+    SLOTS   = {                  # عدد الخانات الثابت لكل كوكبة
+        "ALL": 63, "GP": 32, "BD": 63, "GL": 27,
+        "GA": 36, "QZ":  5, "SB": 40, "GI": 14
+    }
+
     def __init__(self, parent=None):
         self.fig = Figure(figsize=(5,3), dpi=100, tight_layout=False)
         self.ax  = self.fig.add_subplot(111)
         super().__init__(self.fig)
         self.setParent(parent)
-        self.sats_by_sys = {}     # {'GP':[...], 'BD':[...]}
+        self.view = None          # SatTableView من مخزن الأقمار
         self.current_sys = 'ALL'  # افتراضى
 
+        # الأجزاء الثابتة تُرسم مرّة واحدة وتُحفظ كخلفية؛ الأعمدة والنصوص
+        # فنانون "متحركون" (animated) يُعاد استعمالهم ويُرسمون فوقها بالـ blit.
+        self._bars = []           # Rectangle لكل خانة
+        self._vals = []           # قيمة SNR فوق العمود
+        self._prns = []           # رقم القمر تحت العمود (بدلاً من ticks)
+        self._shown = 0           # عدد الخانات المرئية حالياً
+        self._last_key = None     # آخر حالة مرسومة (لتخطّى الرسم إن لم تتغيّر)
+        self._background = None
+        self._blit_box = None
+        self._xmax = None
+
+        self.ax.set_ylim(0, 65)              # أقصى ارتفاع
+        self.ax.set_ylabel("SNR (dB‑Hz)")
+        self.ax.set_xticks([])
+        self.ax.grid(axis='y', linestyle='--', alpha=.25)
+        self._title = self.ax.text(1.0, 1.01, "", transform=self.ax.transAxes,
+                                   ha='right', va='bottom', fontsize=9, animated=True)
+        self._set_xmax(self.SLOTS["ALL"])
+        self.mpl_connect('draw_event', self._on_draw)
+
+    def _set_xmax(self, xmax):
+        self.ax.set_xlim(-0.5, xmax - 0.5)   # مجال x ثابت
+        self._xmax = xmax
+
+    def _ensure_pool(self, n):
+        prn_tf = blended_transform_factory(self.ax.transData, self.ax.transAxes)
+        while len(self._bars) < n:
+            x = len(self._bars) * self.SPACING
+            bar = Rectangle((x - self.BAR_W / 2, 0), self.BAR_W, 0,
+                            facecolor="#ff3030", edgecolor='black', linewidth=0.5,
+                            animated=True, visible=False)
+            self.ax.add_patch(bar)
+            self._bars.append(bar)
+            self._vals.append(self.ax.text(x, 1, "", ha='center', va='bottom', fontsize=8,
+                                           animated=True, visible=False))
+            self._prns.append(self.ax.text(x, -0.01, "", transform=prn_tf, ha='center',
+                                           va='top', fontsize=8, clip_on=False,
+                                           animated=True, visible=False))
+
+    def _on_draw(self, event):
+        """بعد كل رسم كامل (أول مرّة، تغيير الحجم أو المحاور): خزّن الخلفية."""
+        fig_box, ax_box = self.fig.bbox, self.ax.bbox
+        # عمود منطقة البيانات بكامل الارتفاع: يشمل أرقام الأقمار تحتها والعنوان فوقها
+        self._blit_box = Bbox.from_extents(max(fig_box.x0, ax_box.x0 - 1), fig_box.y0,
+                                           min(fig_box.x1, ax_box.x1 + 1), fig_box.y1)
+        self._background = self.copy_from_bbox(self._blit_box)
+        self._draw_artists()
+
+    def _draw_artists(self):
+        draw = self.ax.draw_artist
+        for i in range(self._shown):
+            draw(self._bars[i])
+            draw(self._vals[i])
+            draw(self._prns[i])
+        draw(self._title)
+
     # يُستدعى دورياً
     # -------------------------------------------------------
-    #     ترسيم أعمدة الـ SNR مع حجم ثابت ووسم القيم
+    #     تحديث أعمدة الـ SNR فى مكانها ثم blit لمنطقة البيانات فقط
     # -------------------------------------------------------
     def update_plot(self):
-        self.ax.clear()
-
-        # -------- 1. اختيار الأقمار --------
-        if self.current_sys == 'ALL':
-            sats = [s for lst in self.sats_by_sys.values() for s in lst]
-            slots = 63                       # نطاق شامل يكفى كل الأنظمة
+        # -------- 1. اختيار الأقمار ذات SNR رقمى --------
+        slots = self.SLOTS.get(self.current_sys, 63)
+        v = self.view
+        if v is None:
+            systems, prns, snrs = [], [], []
         else:
-            sats  = self.sats_by_sys.get(self.current_sys, [])
-            # عدد الخانات الثابت لكل كوكبة (يمكن تعديله لاحقاً)
-            slots = {
-                "GP": 32, "BD": 63, "GL": 27,
-                "GA": 36, "QZ":  5, "SB": 40, "GI": 14
-            }.get(self.current_sys, 63)
-
-        # استبعد أى SNR غير رقمى
-        # فقط الأقمار ذات PRN و SNR رقميين
-        sats = [
-            s for s in sats
-            if s.get('snr') and s['snr'].isdigit()
-            and s.get('prn') and s['prn'].isdigit()
-        ]
-        sats.sort(key=lambda s: int(s['snr']), reverse=True)
-
-        # -------- 2. تحويل إلى قوائم --------
-        labels   = [s['prn'] for s in sats]
-        values   = [int(s['snr']) for s in sats]
-        xs       = range(len(values))
-        bar_col  = "#ff3030"                # لون ثابت
-
-        # -------- 3. رسم الأعمدة مع فراغ حقيقى --------
-        SPACING = 3                             # كل عمود يبعد 1.5 وحدة
-        xs = [i * SPACING for i in range(len(values))]
-
-        BAR_W = 1.3                               # عرض العمود
-        self.ax.bar(xs, values,
-                    width=BAR_W,
-                    color=bar_col,
-                    edgecolor='black',
-                    linewidth=0.5)
-
-        # كتابة قيمة الـ SNR فوق العمود
-        for x, val in zip(xs, values):
-            self.ax.text(x, val + 1, str(val),
-                         ha='center', va='bottom', fontsize=8)
-
-
-        # -------- 4. إعداد المحاور --------
-        self.ax.set_ylim(0, 65)              # أقصى ارتفاع
-        self.ax.set_xlim(-0.5, slots - 0.5)  # مجال x ثابت
-        self.ax.set_ylabel("SNR (dB‑Hz)")
-        self.ax.set_xticks(xs)
-        self.ax.set_xticklabels(labels, fontsize=8)
-        self.ax.grid(axis='y', linestyle='--', alpha=.25)
-
-        # -------- 5. المتوسّطات --------
+            mask = v.snr >= 0
+            if self.current_sys != 'ALL':
+                mask &= v.talker == self.current_sys
+            idx = np.flatnonzero(mask)
+            idx = idx[np.argsort(-v.snr[idx], kind='stable')]
+            systems, prns, snrs = v.system[idx].tolist(), v.prn[idx].tolist(), v.snr[idx].tolist()
+
+        # -------- 2. لا شىء تغيّر → لا رسم --------
+        key = (self.current_sys, tuple(systems), tuple(prns), tuple(snrs))
+        if key == self._last_key and self._background is not None:
+            return
+        self._last_key = key
+
+        # -------- 3. تحديث الفنانين فى مكانهم --------
+        n = len(snrs)
+        self._ensure_pool(n)
+        for i, (system, prn_no, snr) in enumerate(zip(systems, prns, snrs)):
+            bar, val, prn = self._bars[i], self._vals[i], self._prns[i]
+            bar.set_height(snr)
+            color = self.COLOR_BY_SYS.get(system, "#ff3030")
+            if bar.get_facecolor() != to_rgba(color):
+                bar.set_facecolor(color)
+            val.set_y(snr + 1)
+            val.set_text(str(snr))
+            prn.set_text(str(prn_no))
+            if i >= self._shown:
+                bar.set_visible(True); val.set_visible(True); prn.set_visible(True)
+        for i in range(n, self._shown):
+            self._bars[i].set_visible(False)
+            self._vals[i].set_visible(False)
+            self._prns[i].set_visible(False)
+        self._shown = n
+
+        # -------- 4. المتوسّطات --------
+        values = snrs
         if values:
             avg  = sum(values) / len(values)
             top4 = sum(values[:4]) / min(4, len(values))
-            self.ax.set_title(f"Average: {avg:.1f}   Top4: {top4:.1f}",
-                              fontsize=9, loc='right')
-
-        self.draw()
+            self._title.set_text(f"Average: {avg:.1f}   Top4: {top4:.1f}")
+        else:
+            self._title.set_text("")
+
+        # -------- 5. الرسم --------
+        xmax = max(slots, n * self.SPACING)
+        if xmax != self._xmax or self._background is None:
+            # المحاور تغيّرت: رسم كامل مرّة واحدة يعيد بناء الخلفية
+            self._set_xmax(xmax)
+            self.draw_idle()
+            return
+        self.restore_region(self._background)
+        self._draw_artists()
+        self.blit(self._blit_box)
 
 
 
@@ -422,6 +3270,165 @@ class IconTextButton(QtWidgets.QWidget):
         if event.button() == QtCore.Qt.LeftButton:
             self.clicked.emit()
 
+##############################################
+# RENDER SCHEDULER
+##############################################
+class RenderTask:
+    """مهمّة رسم صفحة واحدة داخل المُجدوِل."""
+    __slots__ = ('scheduler', 'name', 'callback', 'base_interval', 'interval',
+                 'max_interval', 'next_due', 'cost', 'enabled', 'dirty')
+
+    def __init__(self, scheduler, name, callback, interval_ms, max_interval_ms):
+        self.scheduler     = scheduler
+        self.name          = name
+        self.callback      = callback
+        self.base_interval = interval_ms / 1000   # الفترة المطلوبة
+        self.interval      = self.base_interval   # الفترة الفعلية بعد التكيّف
+        self.max_interval  = max_interval_ms / 1000
+        self.next_due      = 0.0
+        self.cost          = 0.0                  # متوسط أسّى لزمن الرسم (ث)
+        self.enabled       = True
+        self.dirty         = False                # وصلت بيانات لم تُرسم بعد
+
+    @property
+    def load(self):
+        """نسبة الوقت التى تستهلكها المهمّة بفترتها الحالية."""
+        return self.cost / self.interval
+
+    def request(self):
+        """تغيّرت بيانات الصفحة: تُرسم فى أول إطار مستحق. آمنة من أى خيط."""
+        self.dirty = True
+        if self.enabled:
+            self.scheduler.wake()
+
+    def set_visible(self, visible):
+        """صفحة غير مرئية لا تُرسم؛ عند ظهورها تُرسم فوراً فى الإطار التالى."""
+        if visible and not self.enabled:
+            self.next_due = 0.0
+            self.dirty = True
+        self.enabled = visible
+        if visible and self.dirty:
+            self.scheduler.wake()
+
+
+class RenderScheduler(QtCore.QObject):
+    """
+    مُجدوِل رسم مركزى لكل صفحات الـ MDI بدلاً من مؤقّت لكل صفحة.
+    مؤقّت واحد كل frame_ms يعمل فقط ما دامت مهمّة مرئية تنتظر الرسم: الصفحة
+    تستدعى task.request() عند وصول بيانات، وعند فراغ الطابور يتوقف المؤقّت.
+    فى كل إطار تُرسم المهام المستحقّة (الأقدم استحقاقاً أولاً) حتى تنفد
+    ميزانية الإطار (budget × frame_ms)، والباقى ينتظر الإطار التالى فلا
+    تتزامن كل الصفحات فى نفس الدورة.
+    إذا تجاوز مجموع الأحمال الميزانية تُضاعَف فترة أثقل مهمّة (حتى
+    max_interval)، وعند الراحة تعود الفترات تدريجياً إلى المطلوب.
+    """
+    ADAPT_PERIOD = 0.5           # ثوانٍ بين قرارات التكيّف
+    _instance = None
+    _wakeRequested = QtCore.pyqtSignal()   # من أى خيط → _start فى خيط الواجهة
+
+    @classmethod
+    def instance(cls):
+        if cls._instance is None:
+            cls._instance = cls(QtWidgets.QApplication.instance())
+        return cls._instance
+
+    def __init__(self, parent=None, frame_ms=16, budget=0.5):
+        super().__init__(parent)
+        self.frame_ms = frame_ms
+        self.budget = budget
+        self._tasks = []
+        self._last_adapt = 0.0
+        self._awake = False      # المؤقّت يعمل أو طُلب تشغيله
+        self._timer = QtCore.QTimer(self)
+        self._timer.timeout.connect(self._tick)
+        self._wakeRequested.connect(self._start)
+
+    def configure(self, frame_ms=None, budget=None):
+        if frame_ms:
+            self.frame_ms = frame_ms
+            if self._timer.isActive():
+                self._timer.start(frame_ms)
+        if budget:
+            self.budget = budget
+
+    def wake(self):
+        """يشغّل المؤقّت إذا كان متوقفاً؛ آمنة من أى خيط."""
+        if not self._awake:
+            self._awake = True
+            self._wakeRequested.emit()
+
+    def _start(self):
+        if not self._timer.isActive():
+            self._timer.start(self.frame_ms)
+
+    def _pending(self):
+        return any(t.enabled and t.dirty for t in self._tasks)
+
+    def register(self, owner, callback, interval_ms, max_interval_ms=2000):
+        """يسجّل callback لصفحة owner؛ يُلغى التسجيل تلقائياً عند تدميرها."""
+        task = RenderTask(self, type(owner).__name__, callback, interval_ms, max_interval_ms)
+        self._tasks.append(task)
+        owner.destroyed.connect(lambda _=None, t=task: self.unregister(t))
+        return task
+
+    def unregister(self, task):
+        if task in self._tasks:
+            self._tasks.remove(task)
+
+    @property
+    def load(self):
+        return sum(t.load for t in self._tasks)
+
+    def stats(self):
+        """[(اسم, فترة ms, كلفة ms)] للعرض فى شريط الحالة."""
+        return [(t.name, t.interval * 1000, t.cost * 1000) for t in self._tasks]
+
+    def _tick(self):
+        now = time.perf_counter()
+        due = sorted((t for t in self._tasks if t.enabled and t.dirty and now >= t.next_due),
+                     key=lambda t: t.next_due)
+        frame_budget = self.frame_ms / 1000 * self.budget
+        spent = 0.0
+        for task in due:
+            # مهمّة واحدة على الأقل فى كل إطار حتى لا تجوع المهام الثقيلة
+            if spent and spent + task.cost > frame_budget:
+                break
+            task.dirty = False               # request() أثناء الرسم يعيدها للطابور
+            t0 = time.perf_counter()
+            try:
+                task.callback()
+            except Exception as e:
+                print(f"Ошибка отрисовки {task.name}:", e)
+            dt = time.perf_counter() - t0
+            spent += dt
+            task.cost = dt if task.cost == 0 else 0.8 * task.cost + 0.2 * dt
+            task.next_due = t0 + task.interval
+        if now - self._last_adapt >= self.ADAPT_PERIOD:
+            self._last_adapt = now
+            self._adapt()
+        if not self._pending():
+            self._awake = False
+            self._timer.stop()
+            # request() من خيط آخر بين الفحص و _awake = False لم يستدعِ wake
+            if self._pending():
+                self.wake()
+
+    def _adapt(self):
+        active = [t for t in self._tasks if t.enabled]
+        if not active:
+            return
+        load = sum(t.load for t in active)
+        if load > self.budget:
+            heavy = max((t for t in active if t.interval < t.max_interval),
+                        key=lambda t: t.load, default=None)
+            if heavy:
+                heavy.interval = min(heavy.max_interval, heavy.interval * 2)
+        elif load < self.budget / 2:
+            for t in active:
+                if t.interval > t.base_interval:
+                    t.interval = max(t.base_interval, t.interval * 0.8)
+
+
 ##############################################
 # PAGES
 ##############################################
@@ -478,14 +3485,43 @@ class FlagButton(QtWidgets.QWidget):
             self.clicked.emit(self.talker)
 
 
+def update_location_info(info, s):
+    """يحدّث قاموس locationDetailed من جملة محلَّلة؛ True إذا تغيّر."""
+    rec = s.data
+    if rec is None:
+        return False
+
+    # 1) جملة GGA ⇒ إحداثيات + جودة fix + عدد الأقمار + HDOP + ارتفاع
+    if s.kind == "GGA":
+        info.update({
+            'lat': rec.lat,
+            'lon': rec.lon,
+            'alt': rec.alt if rec.alt is not None else 0.0,
+            'fix_quality': rec.fix_quality,
+            'num_sat': rec.num_sat,
+            'hdop': rec.hdop,
+        })
+        return True
+
+    # 2) جملة GSA ⇒ PDOP, VDOP
+    if s.kind == "GSA":
+        info.update({
+            'pdop': rec.pdop,
+            'vdop': rec.vdop,
+        })
+        return True
+
+    # 3) جملة RMC: لا نعدل info لأن RMC لا يصدر ارتفاعاً
+    return False
+
+
 class Поток_данных(QtWidgets.QWidget):
     """صفحة بثّ البيانات – تُشبه Terminal وتعرض أحدث إحداثيات GNSS."""
 
-    # إشارة داخلية لتمرير كل سطر يُستقبَل من الـ COM إلى واجهة المستخدم
-    newLine = QtCore.pyqtSignal(str)
     locationChanged = QtCore.pyqtSignal(float, float, float)  # lat, lon, alt
     locationDetailed = QtCore.pyqtSignal(dict)
-    
+    commandFinished = QtCore.pyqtSignal(str, object)   # cmd, Future (من خيط الكاتب)
+    batchFinished = QtCore.pyqtSignal(object)          # Future بـ BatchReport
 
     # ---------------------------------------------
     # قائمة الأوامر السريعة
@@ -519,14 +3555,11 @@ class Поток_данных(QtWidgets.QWidget):
             speed = combo.currentText()
             cmd = f"Config com2 {speed}"
             # بدل وضع النص في self.input نرسل وننتظر ACK
-            self.sendAndWaitUntilAck(cmd, timeout=1.0)
+            self.submitCommand(cmd, timeout=1.0)
 
     def sendGGA1Commands(self):
         raws = ["GPGGA 1", "GPGSA 1", "GPGST 1", "GPGSV 1", "GPRMC 1"]
-        for cmd in raws:
-            self.sendAndWaitUntilAck(cmd, timeout=1.0)
-            # يمكن إضافة msleep بسيط هنا إذا أحببت:
-            QThread.msleep(10)
+        self.submitBatch(raws)
 
 
     def __init__(self, parent=None):
@@ -553,8 +3586,46 @@ class Поток_данных(QtWidgets.QWidget):
         layout.addWidget(self.coordLabel)
 
         # 2) نافذة الترمينال (إخراج فقط)
+        # الأسطر تُحفظ فى StreamHistory (من أى خيط) وتُلحق دفعة واحدة بمعدّل
+        # العرض؛ المستند محدود بـ Scrollback سطراً فلا تكبر الذاكرة ولا تبطؤ الإضافة.
+        cfg = loadConfiguration(resource_path("config.ini"))
+        self.scrollback = cfg.getint("Terminal", "Scrollback", fallback=5000)
+        self.cmdWindow = cfg.getint("Commands", "Window", fallback=4)   # أوامر بانتظار ACK
+        self.history = StreamHistory(cfg.getint("Terminal", "History", fallback=200000))
+        self._shownSeq = 0           # تسلسل أول سطر لم يُعرض بعد
+        self._filter = {}            # kinds / talkers / text
+        self._paused = False
+
+        # 2.1) شريط الترشيح: النوع، المُرسِل، نص
+        filterRow = QtWidgets.QHBoxLayout()
+        filterRow.setContentsMargins(0, 0, 0, 0)
+        filterRow.setSpacing(4)
+        self.kindFilter = QtWidgets.QComboBox()
+        self.kindFilter.setEditable(True)            # أنواع أخرى تُكتب يدوياً
+        self.kindFilter.addItems(["Все типы"] + sorted(NMEA_PARSERS) + ["command"])
+        self.talkerFilter = QtWidgets.QComboBox()
+        self.talkerFilter.addItems(["Все"] + sorted(NMEA_TALKERS))
+        self.searchEdit = QtWidgets.QLineEdit()
+        self.searchEdit.setPlaceholderText("Поиск (например, PRN)…")
+        filterRow.addWidget(QtWidgets.QLabel("Тип:"))
+        filterRow.addWidget(self.kindFilter)
+        filterRow.addWidget(QtWidgets.QLabel("Источник:"))
+        filterRow.addWidget(self.talkerFilter)
+        filterRow.addWidget(self.searchEdit, 1)
+        layout.addLayout(filterRow)
+        # تجميع ضغطات المفاتيح: إعادة عرض واحدة بعد توقف الكتابة
+        self.filterTimer = QtCore.QTimer(self)
+        self.filterTimer.setSingleShot(True)
+        self.filterTimer.setInterval(150)
+        self.filterTimer.timeout.connect(self._applyFilter)
+        self.kindFilter.currentTextChanged.connect(lambda _: self.filterTimer.start())
+        self.talkerFilter.currentTextChanged.connect(lambda _: self.filterTimer.start())
+        self.searchEdit.textChanged.connect(lambda _: self.filterTimer.start())
+
         self.terminal = QtWidgets.QPlainTextEdit()
         self.terminal.setReadOnly(True)
+        self.terminal.setMaximumBlockCount(self.scrollback)
+        self.terminal.setUndoRedoEnabled(False)
         self.terminal.setStyleSheet(
             "background:#1e1e1e; color:#dcdcdc; font-family:Consolas;"
         )
@@ -621,25 +3692,38 @@ class Поток_данных(QtWidgets.QWidget):
         btnSave.clicked.connect(self.sendSaveConfig)
         btnRow.addWidget(btnSave)
 
+        # تجميد العرض: البافر يستمر فى الاستقبال بدون رسم
+        self.btnPause = QtWidgets.QPushButton("Пауза")
+        self.btnPause.setFixedHeight(26)
+        self.btnPause.setCheckable(True)
+        self.btnPause.toggled.connect(self.setPaused)
+        btnRow.addWidget(self.btnPause)
+
+        self.renderTask = RenderScheduler.instance().register(self, self._flush_terminal, 100)
+        self.commandFinished.connect(self._on_command_finished)
+        self.batchFinished.connect(self._on_batch_finished)
+
 
 
         # ربط الإشارات
-        self.newLine.connect(self._append_line)
         self.input.returnPressed.connect(self._on_input_entered)
 
-        # مقبض المنفذ التسلسلي (سيملؤه MainWindow لاحقاً)
+        # مقبض المنفذ التسلسلي ومحرّك الإدخال (سيملؤهما MainWindow لاحقاً)
         self.ser = None
+        self.ingest = None
+        self._visible = True         # MainWindow يُبلغ بـ setPageVisible
+        self._sub = None
         self._thread = None          # سيُحفظ فيه الخيط
 
     def sendSaveConfig(self):
         """
-        يرسل الأمر 'saveconfig' ويكرر المحاولة حتى يستلم ACK.
+        يرسل الأمر 'saveconfig' (مع إعادة محاولة محدودة حتى يصل ACK).
         """
-        self.sendAndWaitUntilAck("saveconfig", timeout=1.0) 
+        self.submitCommand("saveconfig", timeout=1.0) 
 
     def sendRtcmCommands(self):
         """
-        يرسل دفعة أوامر RTCM وينتظر ACK لكل أمر قبل الانتقال.
+        يطبّق دفعة أوامر RTCM بنافذة ACK مفتوحة (انظر submitBatch).
         """
         cmds = [
             "config pvtalg multi",
@@ -651,10 +3735,9 @@ class Поток_данных(QtWidgets.QWidget):
             "RTCM1114 COM2 1",
             "RTCM1124 COM2 1",
         ]
-        for cmd in cmds:
-            # sendAndWaitUntilAck سيعرض في التيرمينال (> cmd)
-            # ويكرر إرسال cmd حتى يستلم ACK ($command,…)
-            self.sendAndWaitUntilAck(cmd, timeout=1.0)
+        # الكاتب يعرض فى التيرمينال (> cmd) ويعيد الإرسال
+        # حتى يستلم ACK ($command,…) أو تنفد المحاولات
+        self.submitBatch(cmds)
 
     def showModeBaseDialog(self):
         dlg = QDialog(self)
@@ -697,37 +3780,68 @@ class Поток_данных(QtWidgets.QWidget):
                 cmd += f" {base}"
 
             # إرسال وانتظار ACK
-            self.sendAndWaitUntilAck(cmd, timeout=1.0)
-
-    def sendAndWaitUntilAck(self, cmd: str, timeout: float = 1.0):
+            self.submitCommand(cmd, timeout=1.0)
 
+    def submitCommand(self, cmd: str, timeout: float = 1.0, retries=None):
+        """
+        يضع الأمر فى طابور CommandEngine ويعود فوراً (لا يحجب الواجهة).
+        النتيجة تصل إلى _on_command_finished فى خيط الواجهة؛ يُعيد الـ Future.
+        """
         if cmd.startswith("MODE BASE"):
             self._is_searching = True
 
-        if not self.ser or not self.ser.is_open:
-            return
-        while True:
-            # ← نظّف بافر الاستقبال بأمان
-            try:
-                self.ser.reset_input_buffer()
-            except (serial.SerialException, serial.SerialTimeoutException):
-                return
-
-            sendCommand(self.ser, cmd)
-            try:    self.newLine.emit("> " + cmd)
-            except: pass
+        if not self.ingest:
+            self._append_line(f"! {cmd}: нет соединения", kind="command")
+            return None
+        fut = self.ingest.commands.submit(cmd, timeout=timeout, retries=retries)
+        fut.add_done_callback(lambda f, c=cmd: self.commandFinished.emit(c, f))
+        return fut
 
-            start = time.time()
-            while time.time() - start < timeout:
-                if not self.ser or not self.ser.is_open:
-                    return
-                line = readData(self.ser).strip()
-                if line.startswith("$command") and cmd in line:
-                    try: self.newLine.emit(line)
-                    except: pass
-                    return
-                QtCore.QThread.msleep(1)
-            # لو انتهت المهلة بدون ACK تعود الحلقة لإعادة الإرسال
+    def submitBatch(self, cmds, timeout: float = 1.0):
+        """
+        يطبّق دفعة أوامر مع حتى cmdWindow أمراً بانتظار ACK فى آن واحد؛
+        المؤكَّد سابقاً فى هذه الجلسة يُتخطّى. التقرير يُكتب فى الترمينال.
+        """
+        if not self.ingest:
+            self._append_line("! нет соединения", kind="command")
+            return None
+        fut = self.ingest.commands.submit_batch(cmds, window=self.cmdWindow, timeout=timeout)
+        fut.add_done_callback(lambda f: self.batchFinished.emit(f))
+        return fut
+
+    @QtCore.pyqtSlot(object)
+    def _on_batch_finished(self, fut):
+        if fut.cancelled() or fut.exception() is not None:
+            if not fut.cancelled():
+                self._append_line(f"! {fut.exception()}", kind="command")
+            return
+        report = fut.result()
+        for cmd, status, latency, attempts, error in report.entries:
+            if status == 'ok':
+                retry = f", попыток: {attempts}" if attempts > 1 else ""
+                self._append_line(f"# {cmd}: {latency * 1000:.0f} мс{retry}", kind="command")
+            elif status == 'skipped':
+                self._append_line(f"# {cmd}: уже применено", kind="command")
+            else:
+                self._append_line(f"! {error}", kind="command")
+        self._append_line(
+            f"# пакет: {len(report.entries)} команд, применено {report.count('ok')}, "
+            f"пропущено {report.count('skipped')}, ошибок {report.count('failed')}, "
+            f"{report.total * 1000:.0f} мс", kind="command")
+
+    def _on_command_sent(self, cmd, attempt):
+        """من خيط الكاتب: صدى الأمر فى الترمينال."""
+        suffix = f"  (повтор {attempt})" if attempt > 1 else ""
+        self._append_line(f"> {cmd}{suffix}", kind="command")
+
+    @QtCore.pyqtSlot(str, object)
+    def _on_command_finished(self, cmd, fut):
+        # الـ ACK نفسه يظهر فى الترمينال عبر الاشتراك العام؛ هنا الفشل فقط
+        if fut.cancelled():
+            return
+        err = fut.exception()
+        if err is not None:
+            self._append_line(f"! {err}", kind="command")
 
 
     def showSelfOptimizeDialog(self):
@@ -772,88 +3886,108 @@ class Поток_данных(QtWidgets.QWidget):
                 cmd += f" {base_id}"
 
             # أرسله وكرر حتى تستلم ACK
-            self.sendAndWaitUntilAck(cmd, timeout=1.0)
+            self.submitCommand(cmd, timeout=1.0)
 
 
             # إذا لم نسمع ACK خلال timeout نعيد المحاولة تلقائياً
 
     # --------------------------------------------------------------------- #
     #                          واجهة الاستخدام                               #
-    # --------------------------------------------------------------------- #
-    def setSerial(self, ser):
-        """يُمرَّر المقبض من MainWindow عند نجاح الاتصال."""
-        self.ser = ser
-        self._thread = Thread(target=self._read_loop, daemon=True)
+    def setIngest(self, ingest):
+        """يُمرَّر محرّك الإدخال من MainWindow عند نجاح الاتصال."""
+        if self._sub:
+            self._sub.close()
+        if self.ingest:
+            self.ingest.commands.unwatch_sent(self._on_command_sent)
+        self.ingest = ingest
+        self.ser = ingest.ser
+        ingest.commands.watch_sent(self._on_command_sent)
+        self._sub = ingest.subscribe(maxlen=1024)     # الترمينال يريد كل الأسطر
+        self._running = True
+        self._sub.set_conflate(not self._visible)
+        self._thread = Thread(target=self._read_loop, args=(self._sub,), daemon=True)
         self._thread.start()
 
+    def setPageVisible(self, visible):
+        """مخفية: الاشتراك يحتفظ بآخر جملة لكل نوع فقط بدل كل الأسطر."""
+        if visible == self._visible:
+            return
+        self._visible = visible
+        self.renderTask.set_visible(visible)
+        if self._sub:
+            self._sub.set_conflate(not visible)
+
     # --------------------------------------------------------------------- #
     #                       وظائف داخليـة (Private)                          #
     # --------------------------------------------------------------------- #
-    def _append_line(self, text: str):
-        """يُضيف سطراً إلى الترمينال مع تمرير سطر جديد."""
-        self.terminal.appendPlainText(text)
+    def _append_line(self, text: str, talker: str = '', kind: str = ''):
+        """يُضيف سطراً إلى سجلّ الترمينال؛ آمنة من أى خيط."""
+        self.history.append(text, talker, kind)
+        self.renderTask.request()
+
+    def _flush_terminal(self):
+        """يُستدعى من المُجدوِل: يلحق كل ما وصل (ويطابق المرشّح) كنصّ واحد."""
+        if self._paused or self.history.total == self._shownSeq:
+            return
+        start = self._shownSeq
+        total, lines = self.history.query(start, limit=self.scrollback, **self._filter)
+        self._shownSeq = total
+        if total - start >= self.scrollback:
+            # ما وصل يكفى لملء الشاشة: استبدلها كاملةً
+            self.terminal.setPlainText("\n".join(lines))
+            self.terminal.moveCursor(QtGui.QTextCursor.End)
+        elif lines:
+            self.terminal.appendPlainText("\n".join(lines))
+
+    def _applyFilter(self):
+        """يعيد بناء العرض من فهرس السجلّ حسب المرشّح الحالى."""
+        kind = self.kindFilter.currentText().strip()
+        talker = self.talkerFilter.currentText()
+        text = self.searchEdit.text().strip()
+        self._filter = {
+            'kinds': [k.strip() for k in kind.split(',')] if kind and kind != "Все типы" else None,
+            'talkers': [talker] if talker != "Все" else None,
+            'text': text or None,
+        }
+        total, lines = self.history.query(0, limit=self.scrollback, **self._filter)
+        self._shownSeq = total
+        self.terminal.setPlainText("\n".join(lines))
+        self.terminal.moveCursor(QtGui.QTextCursor.End)
+
+    def setPaused(self, paused):
+        self._paused = paused
+        self.btnPause.setText("Продолжить" if paused else "Пауза")
+        if not paused:
+            self.renderTask.request()        # ما وصل أثناء التجميد
 
     def _on_input_entered(self):
         """إرسال أمر عبر الـ COM عندما يضغط المستخدم Enter."""
         cmd = self.input.text().strip()
-        if cmd and self.ser:
-            sendCommand(self.ser, cmd)
-            self._append_line(f"> {cmd}")
+        if cmd and self.ingest:
+            # عبر الكاتب نفسه حتى لا تتداخل الكتابة مع أوامر الطابور
+            self.ingest.commands.submit(cmd, expect_ack=False)
         self.input.clear()
 
-    def _read_loop(self):
+    def _read_loop(self, sub):
+        try:
+            self._consume(sub)
+        finally:
+            sub.close()
+
+    def _consume(self, sub):
         while self._running:
-            # ← إذا المنفذ غير مفتوح، اخرج من الخيط
-            if not self.ser or not self.ser.is_open:
-                break
-            line = readData(self.ser)
-            if not line:
-                QtCore.QThread.msleep(40)
+            s = sub.get(timeout=0.5)
+            if s is None:
+                if sub.closed:        # انقطع الاتصال
+                    break
                 continue
 
-            line = line.strip()
-            # 0) عرض أي سطر يصل في التيرمينال
-            try:
-                self.newLine.emit(line)
-            except RuntimeError:
-                break  # إذا حُذفت الصفحة أثناء التشغيل
-
-            # 1) جملة GGA ⇒ إحداثيات + جودة fix + عدد الأقمار + HDOP + ارتفاع
-            if line.startswith(("$GPGGA", "$GNGGA")):
-                gga = parseGGA(line)
-                if gga:
-                    lat = self._to_decimal(gga["latitude"], gga["lat_direction"])
-                    lon = self._to_decimal(gga["longitude"], gga["lon_direction"])
-                    alt = float(gga["altitude"]) if gga["altitude"] else 0.0
-
-                    # حدّث المعلومات
-                    self._last_info.update({
-                        'lat': lat,
-                        'lon': lon,
-                        'alt': alt,
-                        'fix_quality': gga['fix_quality'],
-                        'num_sat': gga['num_satellites'],
-                        'hdop': gga['hdop'],
-                    })
-                    # بُثّ المعلومات المفصلة
-                    self.locationDetailed.emit(self._last_info)
-
-            # 2) جملة GSA ⇒ PDOP, VDOP
-            elif "GSA" in line:
-                gsa = parseGSA(line)
-                if gsa:
-                    self._last_info.update({
-                        'pdop': gsa['pdop'],
-                        'vdop': gsa['vdop'],
-                    })
-                    self.locationDetailed.emit(self._last_info)
-
-            # 3) جملة RMC (إن أردت معالجتها)
-            elif RMC_RE.match(line):
-                # هنا لا نعدل self._last_info لأن RMC لا يصدر ارتفاعاً
-                pass
+            # 0) كل سطر يصل يذهب إلى سجلّ الترمينال (يُعرض دفعةً واحدة لاحقاً)
+            self._append_line(s.raw, s.talker, s.kind)
 
-            QtCore.QThread.msleep(40)
+            # بُثّ المعلومات المفصلة عند كل GGA/GSA
+            if update_location_info(self._last_info, s):
+                self.locationDetailed.emit(self._last_info)
 
 
     def _update_coordinates(self, lat, lon, alt):
@@ -900,6 +4034,8 @@ class Поток_данных(QtWidgets.QWidget):
     def closeEvent(self, event):
         """يُستدعى عندما تُغلق الصفحة داخل الـ MDI."""
         self._running = False                       # أوقف الحلقة
+        if self.ingest:                             # لا صدى أوامر إلى صفحة مغلقة
+            self.ingest.commands.unwatch_sent(self._on_command_sent)
         if self._thread and self._thread.is_alive():
             self._thread.join(timeout=1)            # انتظر الخيط لحظة
         super().closeEvent(event)                   # أكمل الإغلاق
@@ -933,6 +4069,10 @@ class ConstellationCanvas(FigureCanvas):
         self._load_icons()       # ← حمِّل الأعلام مرّة واحدة
         self.configure_axes()
 
+        self.markers = {}        # {(system, prn): [icon, text, (θ, r)]}
+        self._background = None  # الشبكة القطبية الثابتة (للـ blit)
+        self.mpl_connect('draw_event', self._on_draw)
+
     # ----------------------------------------------------------
     #            المساعدة: تحميل أيقونات الأعلام
     # ----------------------------------------------------------
@@ -970,53 +4110,91 @@ class ConstellationCanvas(FigureCanvas):
     # ----------------------------------------------------------
     #      الدالة التى يستدعيها Созвездие كل ثانية
     # ----------------------------------------------------------
-    def plot_satellites(self, sats):
-        self.ax.clear()
-        self.configure_axes()
-
-        # ===== تصفيّة الأقمار: فقط PRN أرقام صالحة وإحداثيات كاملة =====
-        clean_sats = [
-            s for s in sats
-            if s.get('prn') and s['prn'].isdigit()
-            and s.get('elevation') is not None
-            and s.get('azimuth')   is not None
-        ]
-
-        for sat in clean_sats:
-            elev   = sat['elevation']
-            azim   = sat['azimuth']
-            prn    = sat['prn']
-            talker = sat['system']
-
-            if elev is None or azim is None:
-                continue
-
-            r  = 90 - elev
-            th = math.radians(azim)
-            x, y = th, r
-
-            img, z = self._get_icon(talker)
-            if img is not None:
-                ab = AnnotationBbox(
-                    OffsetImage(img, zoom=z, interpolation='bilinear'),
-                    (x, y), frameon=False, xycoords='data'
-                )
-                self.ax.add_artist(ab)
-            else:
-                self.ax.scatter(x, y, s=300, c='lightgray', edgecolors='k')
+    def plot_satellites(self, view):
+        """
+        يحدّث العلامات فى مكانها من SatTableView: تُنشأ عند ظهور قمر وتُحذف
+        عند انتهائه، وتُحرَّك فقط إذا تغيّر موقعها. لا رسم إن لم يتغيّر شىء.
+        """
+        # ===== تصفيّة الأقمار: فقط إحداثيات كاملة =====
+        ok = ~(np.isnan(view.elevation) | np.isnan(view.azimuth))
+        wanted = {
+            (system, prn): (math.radians(az), 90 - el)
+            for system, prn, el, az in zip(view.system[ok].tolist(), view.prn[ok].tolist(),
+                                           view.elevation[ok].tolist(), view.azimuth[ok].tolist())
+        }
 
-            # اكتب رقم القمر بالأبيض مع ستروك أسود
-            txt = self.ax.text(
-                x, y, str(prn),
-                color='white', fontsize=8, weight='bold',
-                ha='center', va='center'
+        changed = False
+        for key in self.markers.keys() - wanted.keys():      # أقمار انتهت
+            for artist in self.markers.pop(key)[:2]:
+                artist.remove()
+            changed = True
+        for key, pos in wanted.items():
+            m = self.markers.get(key)
+            if m is None:                                    # قمر جديد
+                self.markers[key] = self._make_marker(key, pos)
+                changed = True
+            elif m[2] != pos:                                # قمر تحرّك
+                self._move_marker(m, pos)
+                changed = True
+
+        if changed:
+            self._blit()
+
+    def _make_marker(self, key, pos):
+        """[علامة العلم أو دائرة، نص الرقم، الموقع] لقمر واحد."""
+        system, prn = key
+        x, y = pos
+        img, z = self._get_icon(system)
+        if img is not None:
+            icon = AnnotationBbox(
+                OffsetImage(img, zoom=z, interpolation='bilinear'),
+                (x, y), frameon=False, xycoords='data'
             )
-            txt.set_path_effects([
-                patheffects.Stroke(linewidth=1, foreground='black'),
-                patheffects.Normal()
-            ])
+            self.ax.add_artist(icon)
+        else:
+            icon, = self.ax.plot([x], [y], 'o', ms=17, mfc='lightgray', mec='k')
+        icon.set_animated(True)
+
+        # اكتب رقم القمر بالأبيض مع ستروك أسود
+        txt = self.ax.text(
+            x, y, str(prn),
+            color='white', fontsize=8, weight='bold',
+            ha='center', va='center', animated=True
+        )
+        txt.set_path_effects([
+            patheffects.Stroke(linewidth=1, foreground='black'),
+            patheffects.Normal()
+        ])
+        return [icon, txt, pos]
 
-        self.draw()
+    @staticmethod
+    def _move_marker(m, pos):
+        icon, txt = m[0], m[1]
+        if isinstance(icon, AnnotationBbox):
+            icon.xy = icon.xybox = pos
+        else:
+            icon.set_data([pos[0]], [pos[1]])
+        txt.set_position(pos)
+        m[2] = pos
+
+    def _on_draw(self, event):
+        """بعد كل رسم كامل (أول مرّة أو تغيير الحجم): خزّن الشبكة القطبية كخلفية."""
+        self._background = self.copy_from_bbox(self.ax.bbox)
+        self._draw_markers()
+
+    def _draw_markers(self):
+        draw = self.ax.draw_artist
+        for icon, txt, _ in self.markers.values():
+            draw(icon)
+            draw(txt)
+
+    def _blit(self):
+        if self._background is None:
+            self.draw_idle()              # لم تُرسم الخلفية بعد
+            return
+        self.restore_region(self._background)
+        self._draw_markers()
+        self.blit(self.ax.bbox)
 
 
 ##############################################
@@ -1024,77 +4202,88 @@ class ConstellationCanvas(FigureCanvas):
 ##############################################
 class Созвездие(QtWidgets.QWidget):
     """
-    صفحة رسم الأقمار – لا تفتح المنفذ بنفسها بل تنتظر setSerial()
-    لتلقّي المقبض من MainWindow.
+    صفحة رسم الأقمار – لا تفتح المنفذ بنفسها بل تنتظر setIngest()
+    لتلقّي مخزن الأقمار من محرّك الإدخال.
     """
     def __init__(self, parent=None):
         super().__init__(parent)
 
-        self.ser = None          # يُملأ لاحقاً
-        self.sats = []           # قائمة الأقمار النشطة
+        self._store = None       # SatelliteStore من محرّك الإدخال، يُملأ لاحقاً
+        self._drawn = -1         # version آخر لقطة رُسمت
 
         # واجهة الرسم
         lay = QtWidgets.QVBoxLayout(self)
         self.canvas = ConstellationCanvas(self, 5, 5, 100)
         lay.addWidget(self.canvas)
 
-        # مؤقّت للتحديث البصري
-        self.timer = QtCore.QTimer(self)
-        self.timer.timeout.connect(
-            lambda: self.canvas.plot_satellites(self.sats)
-        )
-        self.timer.start(1000)
+        # تحديث بصرى عبر المُجدوِل المركزى: يرسم فقط إذا تغيّرت اللقطة
+        self.renderTask = RenderScheduler.instance().register(self, self._refresh, 250)
 
     # ------------------------------------------------------------------ #
     #              تُستدعى من MainWindow بعد نجاح الاتصال                 #
     # ------------------------------------------------------------------ #
-    def setSerial(self, ser):
-        if self.ser is not None:          # لا تفتح خيطاً ثانياً لنفس المقبض
+    def setIngest(self, ingest):
+        if self._store is not None:
+            self._store.unwatch(self.renderTask.request)
+        self._store = ingest.sats
+        self._store.watch(self.renderTask.request)
+        # المخزن قد يعيش بعد الصفحة: ألغِ المراقبة عند تدميرها
+        self.destroyed.connect(lambda _=None, s=self._store, fn=self.renderTask.request:
+                               s.unwatch(fn))
+        self._drawn = -1
+        self.renderTask.request()
+
+    def _refresh(self):
+        if self._store is None:
             return
-        self.ser = ser
-        Thread(target=self._read_loop, daemon=True).start()
-
-    # ------------------------------------------------------------------ #
-    #                       حلقة القراءة الداخلية                        #
-    # ------------------------------------------------------------------ #
-    def _read_loop(self):
-        buffer   = {}              # {'GP':[...جزئية...], ...}
-        sats_map = {}              # {(sys,prn): {'elev':..,'azim':..,'t':timestamp}}
+        snap = self._store.snapshot()
+        if snap.version == self._drawn:
+            return
+        self._drawn = snap.version
+        self.canvas.plot_satellites(snap.table)
 
-        while True:
-            raw = readData(self.ser)
-            talker, finished, sats = parseGSV(raw)
-            if not sats:
-                QtCore.QThread.msleep(25)
-                continue
+    def setPageVisible(self, visible):
+        self.renderTask.set_visible(visible)
 
-            # اجمع الشرائح
-            buffer.setdefault(talker, []).extend(sats)
-            if not finished:
-                continue
 
-            now = time.time()
-            for sat in buffer[talker]:
-                key = (sat['system'], sat['prn'])
-                sat['last_seen'] = now            # ← طابع زمنى
-                sats_map[key] = sat               # يكتب/يحدث القمر
-            buffer[talker] = []                  # ابدأ سلسلة جديدة
 
-            # احذف الأقمار الأقدم من 15 ثانية
-            sats_map = {k: s for k, s in sats_map.items() if now - s['last_seen'] < 5}
 
-            # صفّ القائمة المُرسَلة للرسم
-            self.sats = list(sats_map.values())
 
-            QtCore.QThread.msleep(40)
 
 
+class MapBridge(QtCore.QObject):
+    """
+    قناة دائمة بين بايثون وصفحة الخريطة عبر QWebChannel بدل runJavaScript
+    لكل تحديث. كل إطار يُرسل رسالة واحدة مضغوطة "lat,lon" فقط إذا تغيّر
+    الموقع، والـ JS يطبّقها فى requestAnimationFrame. المسار يُرسل عبر track
+    كإضافات JSON فقط، والصفحة تُبلغ بتغيّر التكبير عبر setZoom.
+    """
+    frame = QtCore.pyqtSignal(str)
+    track = QtCore.pyqtSignal(str)
+    zoomChanged = QtCore.pyqtSignal(int)
 
+    @QtCore.pyqtSlot(int)
+    def setZoom(self, zoom):
+        self.zoomChanged.emit(zoom)
 
 
+def _qwebchannel_js():
+    """نصّ qwebchannel.js من موارد Qt ليُضمَّن داخل الصفحة مباشرة."""
+    f = QtCore.QFile(":/qtwebchannel/qwebchannel.js")
+    if not f.open(QtCore.QIODevice.ReadOnly):
+        return ""
+    try:
+        return bytes(f.readAll()).decode("utf-8")
+    finally:
+        f.close()
 
 
 class Карта(QtWidgets.QWidget):
+    CENTER_EVERY_MS = 1000   # أقل فترة بين إعادتَى توسيط
+    CENTER_MARGIN   = 0.25   # لا توسيط طالما العلامة داخل الوسط (نسبة من كل جانب)
+    ZOOM            = 19     # التكبير عند أول موقع فقط؛ بعده يبقى تكبير المستخدم
+    TRACK_RESET_MAX = 20000  # أقصى نقاط تُرسل عند تبديل مستوى التفصيل
+
     def __init__(self, parent=None):
         super().__init__(parent)
         self.layout = QtWidgets.QGridLayout(self)
@@ -1110,6 +4299,13 @@ class Карта(QtWidgets.QWidget):
         infoLayout.addWidget(self.infoLabel)
         self.layout.addWidget(self.infoFrame, 0, 0, alignment=QtCore.Qt.AlignLeft | QtCore.Qt.AlignBottom)
         self.setMinimumSize(400, 300)
+
+        # قناة QWebChannel: الجسر يُسجَّل قبل تحميل الصفحة
+        self.bridge = MapBridge(self)
+        self.channel = QtWebChannel.QWebChannel(self.webView.page())
+        self.channel.registerObject("bridge", self.bridge)
+        self.webView.page().setWebChannel(self.channel)
+
         html = f"""
         <!DOCTYPE html>
         <html>
@@ -1120,8 +4316,71 @@ class Карта(QtWidgets.QWidget):
 
             <!-- خرائط ياندكس -->
             <script src='https://api-maps.yandex.ru/2.1/?lang=en_RU'></script>
+            <script>{_qwebchannel_js()}</script>
             <script>
-            var map, marker;
+            var map, marker, track, live, bridge;
+            var trackQueue = [];       // رسائل المسار قبل جاهزية الخريطة
+            var pending = null;        // آخر رسالة لم تُطبَّق بعد
+            var scheduled = false;
+            var centered = false;      // هل ضُبط التكبير مرّة
+            var lastCenter = 0;
+
+            // رسالة واحدة لكل إطار مهما كان معدّل الوصول
+            function onFrame(msg) {{
+                pending = msg;
+                if (!scheduled) {{
+                    scheduled = true;
+                    requestAnimationFrame(apply);
+                }}
+            }}
+
+            function apply() {{
+                scheduled = false;
+                if (!map || pending === null) return;
+                var p = pending.split(',');
+                pending = null;
+                var pos = [parseFloat(p[0]), parseFloat(p[1])];
+                marker.geometry.setCoordinates(pos);
+
+                var now = Date.now();
+                if (!centered) {{
+                    map.setCenter(pos, {self.ZOOM});
+                    marker.balloon.open();
+                    centered = true;
+                    lastCenter = now;
+                    return;
+                }}
+                // التوسيط مقيَّد: فقط إذا اقتربت العلامة من الحافة وبحدّ أقصى مرّة كل فترة
+                if (now - lastCenter < {self.CENTER_EVERY_MS}) return;
+                var b = map.getBounds();
+                var dy = (b[1][0] - b[0][0]) * {self.CENTER_MARGIN};
+                var dx = (b[1][1] - b[0][1]) * {self.CENTER_MARGIN};
+                if (pos[0] < b[0][0] + dy || pos[0] > b[1][0] - dy ||
+                    pos[1] < b[0][1] + dx || pos[1] > b[1][1] - dx) {{
+                    map.setCenter(pos);
+                    lastCenter = now;
+                }}
+            }}
+
+            // المسار: المثبَّت يُلحق بالإدراج فقط، والذيل الحى يُستبدل
+            function onTrack(msg) {{
+                var m = JSON.parse(msg);
+                if (m.r) trackQueue = [];
+                trackQueue.push(m);
+                if (map) flushTrack();
+            }}
+
+            function flushTrack() {{
+                var g = track.geometry;
+                for (var j = 0; j < trackQueue.length; j++) {{
+                    var m = trackQueue[j];
+                    if (m.r) g.setCoordinates(m.a);
+                    else for (var i = 0; i < m.a.length; i++) g.insert(g.getLength(), m.a[i]);
+                    var n = g.getLength();
+                    live.geometry.setCoordinates(n ? [g.get(n - 1)].concat(m.l) : m.l);
+                }}
+                trackQueue = [];
+            }}
 
             ymaps.ready(function () {{
                 map = new ymaps.Map('map', {{
@@ -1134,8 +4393,26 @@ class Карта(QtWidgets.QWidget):
                     {{}},  // لا مُحتوى للبالون عند الإقلاع
                     {{ preset:'islands#redDotIcon' }}
                 );
+                track = new ymaps.Polyline([], {{}}, {{ strokeColor:'#1e64c8', strokeWidth:3 }});
+                live  = new ymaps.Polyline([], {{}}, {{ strokeColor:'#1e64c8', strokeWidth:3 }});
+                map.geoObjects.add(track);
+                map.geoObjects.add(live);
                 map.geoObjects.add(marker);
+                map.events.add('boundschange', function (e) {{
+                    if (bridge && e.get('newZoom') !== e.get('oldZoom'))
+                        bridge.setZoom(e.get('newZoom'));
+                }});
+                if (bridge) bridge.setZoom(map.getZoom());
+                if (pending !== null) onFrame(pending);
+                flushTrack();
+
+            }});
 
+            new QWebChannel(qt.webChannelTransport, function (channel) {{
+                bridge = channel.objects.bridge;
+                bridge.frame.connect(onFrame);
+                bridge.track.connect(onTrack);
+                if (map) bridge.setZoom(map.getZoom());
             }});
             </script>
         </head>
@@ -1144,10 +4421,89 @@ class Карта(QtWidgets.QWidget):
         """
         self.webView.setHtml(html)
 
-    
+        # الإشارات تحفظ آخر قيمة فقط؛ الموقع يُرسل بمعدّل الإطار والنص أبطأ
+        self._pendingPosition = None
+        self._pendingInfo = None
+        self._coord = None       # آخر (lat, lon) وصل من أى إشارة
+        self._sent = None        # آخر رسالة أُرسلت عبر الجسر
+        self._track = None       # TrackStore من محرّك الإدخال
+        self._zoom = 16
+        self._trackLevel = None  # المستوى المعروض حالياً (None = أعد الإرسال كاملاً)
+        self._trackCount = 0     # عدد النقاط المثبَّتة المُرسلة من هذا المستوى
+        self._trackTotal = -1    # track.total عند آخر إرسال
+        self.bridge.zoomChanged.connect(self._on_zoom)
+        scheduler = RenderScheduler.instance()
+        self.renderTask = scheduler.register(self, self._render_frame, scheduler.frame_ms)
+        self.infoTask = scheduler.register(self, self._render, 500)
+
     @QtCore.pyqtSlot(float, float, float)
     def update_position(self, lat, lon, alt):
-        # 1) حدِّد دقة العرض للنص (مثلاً 6–7 أرقام عشرية)
+        self._pendingPosition = (lat, lon, alt)
+        self._coord = (lat, lon)
+        self.renderTask.request()
+        self.infoTask.request()
+
+    @QtCore.pyqtSlot(dict)
+    def update_info(self, info):
+        self._pendingInfo = dict(info)
+        lat, lon = info.get('lat'), info.get('lon')
+        if isinstance(lat, float) and isinstance(lon, float):
+            self._coord = (lat, lon)
+            self.renderTask.request()
+        self.infoTask.request()
+
+    def setIngest(self, ingest):
+        self._track = ingest.track
+        self._trackLevel = None
+        self.renderTask.request()
+
+    @QtCore.pyqtSlot(int)
+    def _on_zoom(self, zoom):
+        self._zoom = zoom
+        self.renderTask.request()            # مستوى تفصيل المسار قد يتغيّر
+
+    def setPageVisible(self, visible):
+        # المخفية لا تُرسل شيئاً؛ آخر قيمة محفوظة تُرسل مرّة واحدة عند الظهور
+        self.renderTask.set_visible(visible)
+        self.infoTask.set_visible(visible)
+
+    def _render_frame(self):
+        """رسالة واحدة للخريطة لكل إطار، وفقط إذا تغيّر الموقع."""
+        if self._coord is None:
+            return
+        msg = "%.8f,%.8f" % self._coord
+        if msg != self._sent:
+            self._sent = msg
+            self.bridge.frame.emit(msg)
+        self._render_track()
+
+    def _render_track(self):
+        """يرسل إضافات المسار فقط؛ المسار كاملاً عند تغيّر مستوى التفصيل."""
+        track = self._track
+        if track is None:
+            return
+        level = track.level_for(self._zoom, self._coord[0], self.TRACK_RESET_MAX)
+        reset = level != self._trackLevel
+        if not reset and track.total == self._trackTotal:
+            return
+        start = 0 if reset else self._trackCount
+        self._trackTotal = track.total
+        count, added, live = track.tail(level, start)
+        self._trackLevel, self._trackCount = level, count
+        r7 = lambda pts: [[round(a, 7), round(b, 7)] for a, b in pts]
+        self.bridge.track.emit(json.dumps({'r': reset, 'a': r7(added), 'l': r7(live)},
+                                          separators=(',', ':')))
+
+    def _render(self):
+        if self._pendingPosition is not None:
+            self._render_position(*self._pendingPosition)
+            self._pendingPosition = None
+        if self._pendingInfo is not None:
+            self._render_info(self._pendingInfo)
+            self._pendingInfo = None
+
+    def _render_position(self, lat, lon, alt):
+        # 1) حدِّد دقة العرض للنص (مثلاً 6–7 أرقام عشرية)
         self.infoLabel.setText(
             f"Широта: {lat:.7f}\n"
             f"Долгота: {lon:.7f}\n"
@@ -1155,18 +4511,7 @@ class Карта(QtWidgets.QWidget):
             f"UTC: {datetime.utcnow().strftime('%H:%M:%S')}"
         )
 
-        # 2) حدد مستوى التكبير الذي تريده (مثلاً 18 أو 19)
-        #    setCenter يمكن أن يأخذ الوسيط الثاني للـ zoom
-        js = f"""
-            marker.geometry.setCoordinates([{lat}, {lon}]);
-            map.setCenter([{lat}, {lon}], 19);
-            marker.balloon.open();
-        """
-        self.webView.page().runJavaScript(js)
-
-
-    @QtCore.pyqtSlot(dict)
-    def update_info(self, info):
+    def _render_info(self, info):
         # استخرج القيم مع fallback
         lat  = info.get('lat')
         lon  = info.get('lon')
@@ -1208,20 +4553,6 @@ class Карта(QtWidgets.QWidget):
         )
         self.infoLabel.setText(txt)
 
-        # 4) إذا لدينا إحداثيات صحيحة، حدّد المركز
-        if isinstance(lat, float) and isinstance(lon, float):
-            # داخل update_position أو update_info
-            js = f"""
-                marker.geometry.setCoordinates([{lat}, {lon}]);
-                map.setCenter([{lat}, {lon}], 19);
-                marker.balloon.open();
-            """
-            self.webView.page().runJavaScript(js)
-
-
-
-
-
 
 class Статус_отслеживания(QtWidgets.QWidget):
     FLAG_INFO = {
@@ -1238,7 +4569,8 @@ class Статус_отслеживания(QtWidgets.QWidget):
 
     def __init__(self, parent=None):
         super().__init__(parent)
-        self.ser = None
+        self._store = None       # SatelliteStore من محرّك الإدخال
+        self._drawn = -1         # version آخر لقطة نُقلت إلى الرسم
 
         # 1) إنشاء شريط الأعلام
         flagsBar = QtWidgets.QHBoxLayout()
@@ -1264,10 +4596,8 @@ class Статус_отслеживания(QtWidgets.QWidget):
         self.canvas.current_sys = "ALL"
         self.flagBtns["ALL"].setSelected(True)
 
-        # 5) مؤقت التحديث
-        self.timer = QtCore.QTimer(self)
-        self.timer.timeout.connect(self.canvas.update_plot)
-        self.timer.start(1000)
+        # 5) التحديث عبر المُجدوِل المركزى: 10 Гц؛ لا رسم إذا لم تتغيّر البيانات
+        self.renderTask = RenderScheduler.instance().register(self, self._refresh, 100)
 
     def _on_flag_clicked(self, talker):
         # تغيير النظام الجاري
@@ -1279,46 +4609,349 @@ class Статус_отслеживания(QtWidgets.QWidget):
 
 
     # يُستدعى من MainWindow بعد الاتصال
-    def setSerial(self, ser):
-        if self.ser:  # لا نعيد فتح الحلقة
+    def setIngest(self, ingest):
+        if self._store is not None:
+            self._store.unwatch(self.renderTask.request)
+        self._store = ingest.sats
+        self._store.watch(self.renderTask.request)
+        # المخزن قد يعيش بعد الصفحة: ألغِ المراقبة عند تدميرها
+        self.destroyed.connect(lambda _=None, s=self._store, fn=self.renderTask.request:
+                               s.unwatch(fn))
+        self._drawn = -1
+        self.renderTask.request()
+
+    def _refresh(self):
+        if self._store is None:
             return
-        self.ser = ser
-        Thread(target=self._read_loop, daemon=True).start()
-
-    def _read_loop(self):
-        build = {}
-        while True:
-            raw = readData(self.ser)
-            talker, finished, sats = parseGSV(raw)
-            if not sats:
-                QtCore.QThread.msleep(20)
-                continue
+        snap = self._store.snapshot()
+        if snap.version == self._drawn:
+            return
+        self._drawn = snap.version
+        self.canvas.view = snap.table
+        self.canvas.update_plot()
 
-            build.setdefault(talker, []).extend(sats)
-            if finished:
-                # خزّن القائمة كاملة ثم ابدأ سلسلة جديدة
-                self.canvas.sats_by_sys[talker] = build[talker]
-                build[talker] = []
-            QtCore.QThread.msleep(10)
+    def setPageVisible(self, visible):
+        self.renderTask.set_visible(visible)
 
 class ModeConfigurationPage(QtWidgets.QWidget):
+    """
+    ملفات تعريف المستقبِل: تحرير الملفات المحفوظة، وتطبيق ما يختلف فقط عن
+    آخر حالة مطبَّقة على المستقبِل المتصل ثم saveconfig واحد.
+    """
+    batchFinished = QtCore.pyqtSignal(object, str)   # Future بـ BatchReport، المستقبِل
+
     def __init__(self, parent=None):
         super().__init__(parent)
+        cfg = loadConfiguration(resource_path("config.ini"))
+        # ملفات قابلة للكتابة: فى مجلد المستخدم لا بجانب exe ولا فى CWD
+        self.profiles = ProfileStore(
+            user_data_path(cfg.get("Profiles", "File", fallback="profiles.json")))
+        self.state = ReceiverState(
+            user_data_path(cfg.get("Profiles", "State", fallback="receivers.json")))
+        self.window = cfg.getint("Commands", "Window", fallback=4)
+        self.ingest = None
+        self._plan = []
+
         layout = QtWidgets.QVBoxLayout(self)
-        lbl = QtWidgets.QLabel("Страница настройки режима", self)
-        lbl.setAlignment(QtCore.Qt.AlignCenter)
-        layout.addWidget(lbl)
+        row = QtWidgets.QHBoxLayout()
+        row.addWidget(QtWidgets.QLabel("Приёмник:"))
+        self.receiverEdit = QtWidgets.QLineEdit()
+        self.receiverEdit.setPlaceholderText("имя или порт приёмника")
+        row.addWidget(self.receiverEdit, 1)
+        btnForget = QtWidgets.QPushButton("Сбросить состояние")
+        row.addWidget(btnForget)
+        layout.addLayout(row)
+
+        body = QtWidgets.QHBoxLayout()
+        left = QtWidgets.QVBoxLayout()
+        self.listProfiles = QtWidgets.QListWidget()
+        left.addWidget(self.listProfiles, 1)
+        btns = QtWidgets.QHBoxLayout()
+        btnNew = QtWidgets.QPushButton("Новый")
+        btnDelete = QtWidgets.QPushButton("Удалить")
+        btns.addWidget(btnNew)
+        btns.addWidget(btnDelete)
+        left.addLayout(btns)
+        body.addLayout(left, 1)
+        right = QtWidgets.QVBoxLayout()
+        self.editor = QtWidgets.QPlainTextEdit()
+        self.editor.setPlaceholderText("Одна команда на строку")
+        right.addWidget(self.editor, 1)
+        btnSave = QtWidgets.QPushButton("Сохранить профиль")
+        right.addWidget(btnSave)
+        body.addLayout(right, 2)
+        layout.addLayout(body, 1)
+
+        self.planLabel = QtWidgets.QLabel()
+        self.planLabel.setWordWrap(True)
+        layout.addWidget(self.planLabel)
+        row = QtWidgets.QHBoxLayout()
+        self.chkFull = QtWidgets.QCheckBox("Применить полностью")
+        self.btnApply = QtWidgets.QPushButton("Применить")
+        row.addWidget(self.chkFull)
+        row.addStretch()
+        row.addWidget(self.btnApply)
+        layout.addLayout(row)
+        self.statusLabel = QtWidgets.QLabel()
+        layout.addWidget(self.statusLabel)
         self.setMinimumSize(300, 200)
 
+        self.listProfiles.currentTextChanged.connect(self._showProfile)
+        self.editor.textChanged.connect(self._updatePlan)
+        self.receiverEdit.textChanged.connect(self._updatePlan)
+        self.chkFull.toggled.connect(self._updatePlan)
+        btnNew.clicked.connect(self._newProfile)
+        btnDelete.clicked.connect(self._deleteProfile)
+        btnSave.clicked.connect(self._saveProfile)
+        btnForget.clicked.connect(self._forgetReceiver)
+        self.btnApply.clicked.connect(self._apply)
+        self.batchFinished.connect(self._on_batch_finished)
+
+        self.listProfiles.addItems(self.profiles.names())
+        if self.listProfiles.count():
+            self.listProfiles.setCurrentRow(0)
+        self._updatePlan()
+
+    def setIngest(self, ingest):
+        self.ingest = ingest
+        if not self.receiverEdit.text():
+            self.receiverEdit.setText(getattr(ingest.ser, "port", "") or "")
+        self._updatePlan()
+
+    # ---------------- ملفات التعريف ---------------- #
+    def _persist(self, fn, *args):
+        """كتابة على القرص من slot: الخطأ يظهر فى الحالة بدل إسقاط البرنامج."""
+        try:
+            fn(*args)
+        except OSError as e:
+            self.statusLabel.setText(f"Ошибка сохранения: {e}")
+            return False
+        return True
+
+    def _commands(self):
+        return [c.strip() for c in self.editor.toPlainText().splitlines() if c.strip()]
+
+    def _showProfile(self, name):
+        self.editor.setPlainText("\n".join(self.profiles.get(name)))
+
+    def _newProfile(self):
+        name, ok = QtWidgets.QInputDialog.getText(self, "Новый профиль", "Название:")
+        name = name.strip()
+        if not ok or not name:
+            return
+        if not self.listProfiles.findItems(name, QtCore.Qt.MatchExactly):
+            self.listProfiles.addItem(name)
+        self._persist(self.profiles.put, name, self._commands())
+        self.listProfiles.setCurrentItem(self.listProfiles.findItems(name, QtCore.Qt.MatchExactly)[0])
+
+    def _saveProfile(self):
+        item = self.listProfiles.currentItem()
+        if item and self._persist(self.profiles.put, item.text(), self._commands()):
+            self.statusLabel.setText(f"Профиль «{item.text()}» сохранён")
+
+    def _deleteProfile(self):
+        item = self.listProfiles.currentItem()
+        if item:
+            self._persist(self.profiles.delete, item.text())
+            self.listProfiles.takeItem(self.listProfiles.row(item))
+
+    def _forgetReceiver(self):
+        self._persist(self.state.forget, self.receiverEdit.text().strip())
+        self._updatePlan()
+
+    # ---------------- التطبيق ---------------- #
+    def _updatePlan(self):
+        receiver = self.receiverEdit.text().strip()
+        self._plan = plan_profile(self.state, receiver, self._commands(), self.chkFull.isChecked())
+        if not self._plan:
+            self.planLabel.setText("Изменений нет: приёмник уже в этом профиле")
+        else:
+            shown = ", ".join(self._plan[:6]) + (" …" if len(self._plan) > 6 else "")
+            self.planLabel.setText(f"Будет отправлено {len(self._plan)} команд: {shown}")
+        self.btnApply.setEnabled(bool(self._plan) and self.ingest is not None)
+
+    def _apply(self):
+        receiver = self.receiverEdit.text().strip()
+        if not self.ingest or not receiver or not self._plan:
+            return
+        self.btnApply.setEnabled(False)
+        self.statusLabel.setText("Применение…")
+        # الخطة فرقٌ محسوب من ReceiverState، فلا نتركه يُختصر ثانيةً بتأكيدات الجلسة
+        fut = self.ingest.commands.submit_batch(self._plan, window=self.window,
+                                                skip_confirmed=False)
+        fut.add_done_callback(lambda f, r=receiver: self.batchFinished.emit(f, r))
+
+    @QtCore.pyqtSlot(object, str)
+    def _on_batch_finished(self, fut, receiver):
+        if fut.cancelled() or fut.exception() is not None:
+            self.statusLabel.setText(f"Ошибка: {fut.exception() if not fut.cancelled() else 'отменено'}")
+        else:
+            report = fut.result()
+            failed = [e[0] for e in report.entries if e[1] == 'failed']
+            text = f"Применено {report.count('ok')} за {report.total:.1f} с"
+            if failed:
+                text += f"; ошибки: {', '.join(failed)}"
+            # بلا saveconfig مؤكَّد تضيع الإعدادات عند إطفاء المستقبِل، فلا تُسجَّل
+            # وتبقى كلها فى الفرق التالى
+            saved = any(command_key(e[0]) == "saveconfig" and e[1] == 'ok'
+                        for e in report.entries)
+            if not saved:
+                text += "; saveconfig не подтверждён, состояние не записано"
+            self.statusLabel.setText(text)
+            # الحالة تُسجَّل للأوامر المؤكَّدة بـ ACK فقط؛ الباقى يبقى فى الفرق التالى
+            if saved:
+                self._persist(self.state.record, receiver,
+                              [e[0] for e in report.entries if e[1] == 'ok'])
+        self._updatePlan()
+
 class MessageConfigurationPage(QtWidgets.QWidget):
+    """
+    مخطِّط عرض النطاق: حمل الرسائل المفعّلة فى ملف تعريف (أو قائمة أوامر)
+    على كل منفذ مقابل سعة الـ baud، مع تحذير قبل التحميل الزائد واقتراح
+    أصغر baud أو معدّلات أبطأ تناسب.
+    """
+    PORTS = ("COM1", "COM2", "COM3")
+    DEFAULT_SATS = {"GPS": 12, "GLO": 8, "GAL": 8, "BDS": 12, "QZSS": 2, "SBAS": 2}
+
     def __init__(self, parent=None):
         super().__init__(parent)
+        cfg = loadConfiguration(resource_path("config.ini"))
+        self.profiles = ProfileStore(
+            user_data_path(cfg.get("Profiles", "File", fallback="profiles.json")))
+        self.ingest = None
+
         layout = QtWidgets.QVBoxLayout(self)
-        lbl = QtWidgets.QLabel("Страница конфигурации сообщений", self)
-        lbl.setAlignment(QtCore.Qt.AlignCenter)
-        layout.addWidget(lbl)
+        row = QtWidgets.QHBoxLayout()
+        row.addWidget(QtWidgets.QLabel("Профиль:"))
+        self.comboProfile = QtWidgets.QComboBox()
+        row.addWidget(self.comboProfile, 1)
+        layout.addLayout(row)
+        self.editor = QtWidgets.QPlainTextEdit()
+        self.editor.setPlaceholderText("Команды вывода, например: GPGSV 1, RTCM1074 COM2 1")
+        self.editor.setMaximumHeight(120)
+        layout.addWidget(self.editor)
+
+        # سرعة كل منفذ + عدد الأقمار لكل نظام
+        grid = QtWidgets.QGridLayout()
+        self.baudCombos = {}
+        for col, port in enumerate(self.PORTS):
+            combo = QtWidgets.QComboBox()
+            combo.addItems([str(b) for b in BAUD_RATES])
+            combo.setCurrentText("115200")
+            grid.addWidget(QtWidgets.QLabel(port), 0, 2 * col)
+            grid.addWidget(combo, 0, 2 * col + 1)
+            self.baudCombos[port] = combo
+        self.baudCombos["COM1"].setCurrentText(cfg.get("SerialSettings", "Baudrate", fallback="115200"))
+        self.satSpins = {}
+        for col, (system, n) in enumerate(self.DEFAULT_SATS.items()):
+            spin = QtWidgets.QSpinBox()
+            spin.setRange(0, 64)
+            spin.setValue(n)
+            grid.addWidget(QtWidgets.QLabel(system), 1 + col // 3, 2 * (col % 3))
+            grid.addWidget(spin, 1 + col // 3, 2 * (col % 3) + 1)
+            self.satSpins[system] = spin
+        layout.addLayout(grid)
+        self.btnLive = QtWidgets.QPushButton("Спутники и размеры из потока")
+        self.btnLive.setEnabled(False)
+        layout.addWidget(self.btnLive)
+
+        self.table = QtWidgets.QTableWidget(0, 5)
+        self.table.setHorizontalHeaderLabels(["Порт", "Сообщение", "Гц", "Байт", "Байт/с"])
+        self.table.horizontalHeader().setStretchLastSection(True)
+        self.table.verticalHeader().setVisible(False)
+        self.table.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        layout.addWidget(self.table, 1)
+        self.summary = QtWidgets.QLabel()
+        self.summary.setWordWrap(True)
+        self.summary.setTextFormat(QtCore.Qt.RichText)
+        layout.addWidget(self.summary)
         self.setMinimumSize(300, 200)
 
+        self._measured = {}
+        self.comboProfile.currentTextChanged.connect(self._showProfile)
+        self.editor.textChanged.connect(self._recompute)
+        for combo in self.baudCombos.values():
+            combo.currentTextChanged.connect(self._recompute)
+        for spin in self.satSpins.values():
+            spin.valueChanged.connect(self._recompute)
+        self.btnLive.clicked.connect(self._fromLive)
+        self._reloadProfiles()
+
+    def setIngest(self, ingest):
+        self.ingest = ingest
+        self.btnLive.setEnabled(True)
+
+    def showEvent(self, event):
+        # ملفات التعريف قد تكون تغيّرت فى صفحة الإعداد
+        self._reloadProfiles()
+        super().showEvent(event)
+
+    def _reloadProfiles(self):
+        current = self.comboProfile.currentText()
+        self.profiles = ProfileStore(self.profiles.path)
+        self.comboProfile.blockSignals(True)
+        self.comboProfile.clear()
+        self.comboProfile.addItems(self.profiles.names())
+        self.comboProfile.blockSignals(False)
+        if current in self.profiles.profiles:
+            self.comboProfile.setCurrentText(current)
+        self._showProfile(self.comboProfile.currentText())
+
+    def _showProfile(self, name):
+        cmds = self.profiles.get(name)
+        for port, baud in port_bauds(cmds).items():
+            if port in self.baudCombos:
+                self.baudCombos[port].setCurrentText(str(baud))
+        self.editor.setPlainText("\n".join(cmds))
+
+    def _fromLive(self):
+        """أعداد الأقمار من لقطة المحرّك، وأحجام NMEA المقيسة من التيار."""
+        if not self.ingest:
+            return
+        counts = satellites_by_system(self.ingest.sats.snapshot().table)
+        for system, spin in self.satSpins.items():
+            spin.blockSignals(True)
+            spin.setValue(counts.get(system, 0))
+            spin.blockSignals(False)
+        self._measured = self.ingest.measured_sizes()
+        self._recompute()
+
+    def _recompute(self):
+        cmds = [c.strip() for c in self.editor.toPlainText().splitlines() if c.strip()]
+        sats = {system: spin.value() for system, spin in self.satSpins.items()}
+        ports = plan_bandwidth(cmds, sats, self._measured)
+        rows = [e for port in sorted(ports) for e in sorted(ports[port], key=lambda e: -e.load)]
+        self.table.setRowCount(len(rows))
+        for r, e in enumerate(rows):
+            size = f"{e.size:.0f}" + (" (изм.)" if e.measured else "")
+            for c, text in enumerate((e.port, e.msg, f"{e.rate:g}", size, f"{e.load:.0f}")):
+                self.table.setItem(r, c, QtWidgets.QTableWidgetItem(text))
+
+        lines = []
+        for port in sorted(ports):
+            entries = ports[port]
+            load = sum(e.load for e in entries)
+            baud = int(self.baudCombos[port].currentText()) if port in self.baudCombos else 115200
+            cap = baud_capacity(baud)
+            share = load / cap
+            text = f"<b>{port}</b>: {load:.0f} из {cap:.0f} Б/с ({share:.0%}) при {baud}"
+            if share > BANDWIDTH_HEADROOM:
+                overload = share > 1
+                text += " — перегрузка" if overload else " — близко к пределу"
+                hints = []
+                need = suggest_baud(load)
+                if need:
+                    hints.append(f"минимальная скорость {need}")
+                slower = suggest_periods(entries, baud)
+                if slower:
+                    hints.append("или реже: " + ", ".join(slower.values()))
+                if hints:
+                    text += ": " + "; ".join(hints)
+                color = "#c00000" if overload else "#c07000"
+                text = f"<span style='color:{color}'>{text}</span>"
+            lines.append(text)
+        self.summary.setText("<br>".join(lines) or "Нет включённых сообщений")
+
 class SerialPortConfigPage(QtWidgets.QWidget):
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -1357,6 +4990,12 @@ class SettingsDialog(QtWidgets.QDialog):
         self.listItems.setCurrentRow(0)
         self.stack.setCurrentIndex(0)
 
+    def setIngest(self, ingest):
+        for i in range(self.stack.count()):
+            page = self.stack.widget(i)
+            if hasattr(page, "setIngest"):
+                page.setIngest(ingest)
+
 ##############################################
 # SplashScreen: شاشة البداية (الإقلاع)
 ##############################################
@@ -1475,6 +5114,7 @@ class CustomMdiSubWindow(QtWidgets.QMdiSubWindow):
         self.layout.addWidget(self.titleBar)
         self.layout.addWidget(contentWidget)
         self.setWidget(self.mainWidget)
+        self.contentWidget = contentWidget
         self.oldPos = None
         self.titleBar.mousePressEvent = self.titleBarMousePress
         self.titleBar.mouseMoveEvent = self.titleBarMouseMove
@@ -1590,6 +5230,8 @@ class CustomMdiSubWindow(QtWidgets.QMdiSubWindow):
 # MainWindow: النافذة الرئيسية مع شريط رأس مخصص
 ##############################################
 class MainWindow(QtWidgets.QMainWindow):
+    baudDetected = QtCore.pyqtSignal(object, object, str)   # ser أو None، baud، port
+
     def __init__(self):
         super().__init__()
         self.subwindows = {}          # {PageClass: QMdiSubWindow}
@@ -1601,6 +5243,14 @@ class MainWindow(QtWidgets.QMainWindow):
         self.sidebarWidthExpanded  = 130
         self.oldPos = None
         self.currentSerial = None
+        self.ingest = None            # IngestEngine للاتصال الحالى
+        self.recorder = None          # SessionRecorder أثناء التسجيل
+        self.capture = None           # RawCaptureWriter (البايتات الخام)
+        self.config = loadConfiguration(resource_path("config.ini"))
+        RenderScheduler.instance().configure(
+            frame_ms=self.config.getint("Render", "FrameMs", fallback=16),
+            budget=self.config.getfloat("Render", "Budget", fallback=0.5),
+        )
         self.initUI()
 
     def populateSerialPorts(self):
@@ -1608,6 +5258,9 @@ class MainWindow(QtWidgets.QMainWindow):
         self.comboPorts.clear()
         ports = [p.device for p in serial.tools.list_ports.comports()]
         self.comboPorts.addItems(ports)
+        # مصدر افتراضى: إعادة تشغيل تسجيل بدلاً من جهاز حقيقى
+        self.comboPorts.addItem(REPLAY_PORT)
+        self.comboPorts.addItem(SIM_PORT)
 
 
     def initUI(self):
@@ -1709,7 +5362,7 @@ class MainWindow(QtWidgets.QMainWindow):
         # StatusBar
         self.statusbar = QtWidgets.QStatusBar(); self.setStatusBar(self.statusbar)
         self.comboPorts = QtWidgets.QComboBox()
-        self.comboBaud  = QtWidgets.QComboBox(); self.comboBaud.addItems(["9600","115200"])
+        self.comboBaud  = QtWidgets.QComboBox(); self.comboBaud.addItems(["9600","115200", AUTO_BAUD])
         self.btnConnect = QtWidgets.QPushButton("Подключиться")
         self.statusbar.addPermanentWidget(QtWidgets.QLabel("Порт:"))
         self.statusbar.addPermanentWidget(self.comboPorts)
@@ -1721,6 +5374,136 @@ class MainWindow(QtWidgets.QMainWindow):
         self.arrangeBtn.clicked.connect(self.arrangeWindows)
         self.populateSerialPorts()      # ← بدلاً من ترقيم ثابت
         self.btnConnect.clicked.connect(self.connectPort)
+        self.baudDetected.connect(self._on_baud_detected)
+
+        # معدّل الجمل المستلمة (من محرّك الإدخال)
+        self.lblRate = QtWidgets.QLabel("")
+        self.statusbar.addPermanentWidget(self.lblRate)
+        self.btnRecord = QtWidgets.QPushButton("● Запись")
+        self.btnRecord.clicked.connect(self.toggleRecording)
+        self.statusbar.addPermanentWidget(self.btnRecord)
+        self.rateTimer = QtCore.QTimer(self)
+        self.rateTimer.timeout.connect(self._update_rate)
+        self.rateTimer.start(1000)
+
+        # فحص رؤية الصفحات بعد هدوء أحداث النوافذ (تحريك/تصغير/تغطية)
+        self.visTimer = QtCore.QTimer(self)
+        self.visTimer.setSingleShot(True)
+        self.visTimer.setInterval(150)
+        self.visTimer.timeout.connect(self._checkPageVisibility)
+        self.mdiArea.subWindowActivated.connect(lambda _=None: self.visTimer.start())
+
+    # ---------------- التسجيل ---------------- #
+    def toggleRecording(self):
+        if self.recorder:
+            self._stop_recording()
+            self.statusbar.showMessage("Запись остановлена", 5000)
+            return
+        if not self.ingest:
+            self.statusbar.showMessage("Нет соединения", 5000)
+            return
+        cfg = self.config
+        folder   = user_data_path(cfg.get("Logging", "Directory", fallback="logs"))
+        max_mb   = cfg.getfloat("Logging", "MaxMegabytes", fallback=50)
+        rot_min  = cfg.getfloat("Logging", "RotateMinutes", fallback=60)
+        try:
+            os.makedirs(folder, exist_ok=True)   # مجلد غير قابل للإنشاء يظهر هنا لا فى الخيط
+            self.recorder = SessionRecorder(
+                self.ingest, os.path.join(folder, "session.csv"),
+                max_bytes=int(max_mb * 1024 * 1024) or None,
+                rotate_seconds=rot_min * 60 or None,
+            )
+            if cfg.getboolean("Logging", "RawCapture", fallback=True):
+                stamp = time.strftime("%Y%m%d_%H%M%S")
+                self.capture = RawCaptureWriter(
+                    os.path.join(folder, f"session_{stamp}.gnr"),
+                    compress=cfg.getboolean("Logging", "Compress", fallback=True),
+                )
+        except OSError as e:
+            self._stop_recording()
+            self.statusbar.showMessage(f"Ошибка записи: {e}", 5000)
+            return
+        if self.capture:
+            self.ingest.add_tap(self.capture.write)
+        self.btnRecord.setText("■ Стоп")
+        self.statusbar.showMessage(f"Запись в {folder}", 5000)
+
+    def _stop_recording(self):
+        if self.recorder:
+            self.recorder.stop()
+            self.recorder = None
+        if self.capture:
+            if self.ingest:
+                self.ingest.remove_tap(self.capture.write)
+            self.capture.close()
+            self.capture = None
+        self.btnRecord.setText("● Запись")
+
+    # ---------------- رؤية الصفحات ---------------- #
+    VISIBILITY_EVENTS = (QtCore.QEvent.Move, QtCore.QEvent.Resize, QtCore.QEvent.Show,
+                         QtCore.QEvent.Hide, QtCore.QEvent.WindowStateChange)
+
+    def _watchSubWindow(self, sub):
+        sub.installEventFilter(self)
+        sub.destroyed.connect(lambda _=None: self.visTimer.start())
+        self.visTimer.start()
+
+    def eventFilter(self, obj, event):
+        if isinstance(obj, QtWidgets.QMdiSubWindow) and event.type() in self.VISIBILITY_EVENTS:
+            self.visTimer.start()                 # تجميع: فحص واحد بعد هدوء الأحداث
+        return super().eventFilter(obj, event)
+
+    def changeEvent(self, event):
+        if event.type() == QtCore.QEvent.WindowStateChange:
+            self.visTimer.start()
+        super().changeEvent(event)
+
+    def _checkPageVisibility(self):
+        """
+        يُبلغ كل صفحة هل هى ظاهرة فعلاً: ليست مصغّرة، والنافذة الرئيسية
+        ليست مصغّرة، وجزء منها داخل منطقة العرض وغير مغطّى بنوافذ فوقها.
+        """
+        hidden = self.isMinimized() or not self.isVisible()
+        viewport = QtGui.QRegion(self.mdiArea.viewport().rect())
+        covered = QtGui.QRegion()
+        # من الأعلى إلى الأسفل فى ترتيب التكديس
+        for sub in reversed(self.mdiArea.subWindowList(QtWidgets.QMdiArea.StackingOrder)):
+            visible = False
+            if sub.isVisible() and not sub.isMinimized():
+                area = QtGui.QRegion(sub.geometry())
+                visible = not hidden and not area.intersected(viewport).subtracted(covered).isEmpty()
+                covered = covered.united(area)
+            page = getattr(sub, "contentWidget", None)
+            if hasattr(page, "setPageVisible"):
+                page.setPageVisible(visible)
+
+    def closeEvent(self, event):
+        """أوقف التسجيل والقراءة قبل الخروج حتى تُفرَّغ الملفات."""
+        self._stop_recording()
+        if self.ingest:
+            self.ingest.stop()
+        closeLogs()
+        super().closeEvent(event)
+
+    def _update_rate(self):
+        if not self.ingest:
+            self.lblRate.setText("")
+            return
+        framer = self.ingest.framer
+        _, bad, truncated = framer.totals()
+        text = f"NMEA: {self.ingest.rate:.0f}/с"
+        if bad or truncated:
+            text += f"  CRC✗ {bad}  обрыв {truncated}"
+        self.lblRate.setText(text)
+        # تفصيل لكل نوع جملة: صالحة / checksum خاطئ / مقطوعة، ثم أحمال الرسم
+        sched = RenderScheduler.instance()
+        self.lblRate.setToolTip("\n".join(
+            [f"{kind}: {v} / {b} / {t}"
+             for kind, (v, b, t) in sorted(framer.stats().items())]
+            + [f"Отрисовка: {sched.load * 100:.0f}% (бюджет {sched.budget * 100:.0f}%)"]
+            + [f"  {name}: {interval:.0f} мс, {cost:.1f} мс"
+               for name, interval, cost in sched.stats()]
+        ))
 
     def mousePressEventHeader(self, e):
         if e.button()==QtCore.Qt.LeftButton: self.oldPos = e.globalPos()
@@ -1751,13 +5534,14 @@ class MainWindow(QtWidgets.QMainWindow):
 
         # 2) لم تُفتح بعد أو أغلقت → أنشئها
         pageWidget = pageClass()
-        if self.currentSerial and hasattr(pageWidget, "setSerial"):
-            pageWidget.setSerial(self.currentSerial)
+        if self.ingest and hasattr(pageWidget, "setIngest"):
+            pageWidget.setIngest(self.ingest)
 
         sub = CustomMdiSubWindow(pageWidget, title=pageClass.__name__)
         sub.setAttribute(QtCore.Qt.WA_DeleteOnClose)
         self.mdiArea.addSubWindow(sub)
         self.subwindows[pageClass] = sub
+        self._watchSubWindow(sub)
 
         # عندما يُدمّر الـ sub أزل المفتاح حتى يمكن فتحه لاحقاً
         sub.destroyed.connect(lambda _, c=pageClass: self.subwindows.pop(c, None))
@@ -1800,6 +5584,8 @@ class MainWindow(QtWidgets.QMainWindow):
 
     def showSettingsDialog(self):
         dlg = SettingsDialog(self)
+        if self.ingest:
+            dlg.setIngest(self.ingest)
         center = QtWidgets.QApplication.desktop().availableGeometry().center()
         dlg.move(center - dlg.rect().center()); dlg.exec_()
 
@@ -1855,12 +5641,13 @@ class MainWindow(QtWidgets.QMainWindow):
 
         # إنشاء نافذة جديدة
         widget = cls()
-        if self.currentSerial and hasattr(widget, "setSerial"):
-            widget.setSerial(self.currentSerial)
+        if self.ingest and hasattr(widget, "setIngest"):
+            widget.setIngest(self.ingest)
 
         sub = CustomMdiSubWindow(widget, title=name)
         sub.setAttribute(QtCore.Qt.WA_DeleteOnClose)
         self.mdiArea.addSubWindow(sub)
+        self._watchSubWindow(sub)
         sub.setGeometry(x, y, w, h)
         sub.show()
 
@@ -1875,14 +5662,54 @@ class MainWindow(QtWidgets.QMainWindow):
             for btn,_ in self.buttons: btn.setExpanded(False)
         self.isCollapsed = not self.isCollapsed
 
+    def _pages(self):
+        """الصفحات الفعلية داخل النوافذ (sub.widget() هو الحاوية مع شريط العنوان)."""
+        for sub in self.mdiArea.subWindowList():
+            page = getattr(sub, "contentWidget", None)
+            if page is not None:
+                yield page
+
+    def _openReplay(self):
+        """يختار ملف تسجيل وسرعة التشغيل ويعيد ReplaySerial أو None."""
+        path, _ = QtWidgets.QFileDialog.getOpenFileName(
+            self, "Файл записи", "",
+            "Записи GNSS (*.gnr *.nmea *.txt *.log);;Все файлы (*)")
+        if not path:
+            return None
+        speed = self._askReplaySpeed()
+        if speed is None:
+            return None
+        try:
+            return ReplaySerial.from_file(path, speed)
+        except OSError as e:
+            self.statusbar.showMessage(f"Ошибка открытия файла: {e}", 5000)
+            return None
+
+    def _openSimulator(self):
+        """يختار سيناريو المولّد الاصطناعى ويعيد ReplaySerial يغذّيه."""
+        preset, ok = QtWidgets.QInputDialog.getItem(
+            self, "Симулятор", "Сценарий:", list(SIM_PRESETS), 0, False)
+        if not ok:
+            return None
+        speed = self._askReplaySpeed()
+        if speed is None:
+            return None
+        sim = NmeaSimulator(**SIM_PRESETS[preset])
+        return ReplaySerial(sim.stream, speed, port=f"sim {sim.sats}×{sim.rate_hz} Гц")
+
+    def _askReplaySpeed(self):
+        speed, ok = QtWidgets.QInputDialog.getItem(
+            self, "Воспроизведение", "Скорость:", list(REPLAY_SPEEDS), 0, False)
+        return REPLAY_SPEEDS[speed] if ok else None
+
     def connectPort(self):
         # -- إذا كان المستخدم متصلاً حالياً → فصل الاتصال بأمان --
         if self.currentSerial:
-            # 1) أوقف خيوط القراءة في الصفحات المفتوحة التي تستخدم _running
-            for sub in self.mdiArea.subWindowList():
-                page = sub.widget()
-                if hasattr(page, "_running"):
-                    page._running = False
+            # 1) أوقف التسجيل ثم خيط القراءة الوحيد؛ إغلاق الاشتراكات يُنهى خيوط الصفحات
+            self._stop_recording()
+            if self.ingest:
+                self.ingest.stop()
+                self.ingest = None
 
             # 2) أغلق المقبض بعد توقف الخيوط
             closeConnection(self.currentSerial)
@@ -1895,23 +5722,181 @@ class MainWindow(QtWidgets.QMainWindow):
 
         # -- غير متصل → حاول إنشاء الاتصال --
         port = self.comboPorts.currentText()
-        baud = int(self.comboBaud.currentText())
+        if port in (REPLAY_PORT, SIM_PORT):
+            ser = self._openReplay() if port == REPLAY_PORT else self._openSimulator()
+            if not ser:
+                return
+            port, baud = ser.port, f"{ser.speed:g}×" if ser.speed else "макс."
+        elif self.comboBaud.currentText() == AUTO_BAUD:
+            self._detectBaud(port)
+            return
+        else:
+            baud = int(self.comboBaud.currentText())
+            ser = openConnection(port, baud)
+        self._attachSerial(ser, port, baud)
+
+    def _detectBaud(self, port):
+        """AUTO: الاكتشاف فى خيط جانبى؛ النتيجة تعود عبر baudDetected."""
+        try:
+            last = self.config.getint("SerialSettings", "Baudrate", fallback=0) or None
+        except ValueError:               # مثلاً Baudrate=AUTO
+            last = None
+        self.btnConnect.setEnabled(False)
+        self.statusbar.showMessage(f"Определение скорости на {port}…")
+
+        def work():
+            ser, baud, _ = detect_baud(port, last)
+            self.baudDetected.emit(ser, baud, port)
+        Thread(target=work, daemon=True).start()
+
+    @QtCore.pyqtSlot(object, object, str)
+    def _on_baud_detected(self, ser, baud, port):
+        self.btnConnect.setEnabled(True)
+        if ser is None:
+            self.statusbar.showMessage(f"Не удалось определить скорость на {port}", 5000)
+            return
+        # السرعة المكتشفة تُجرَّب أولاً فى المرة القادمة (ملف المستخدم، لا config.ini)
+        settings = {"Port": port, "Baudrate": str(baud)}
+        if not self.config.has_section("SerialSettings"):
+            self.config.add_section("SerialSettings")
+        for key, value in settings.items():
+            self.config.set("SerialSettings", key, value)
+        try:
+            saveUserSettings("SerialSettings", settings)
+        except OSError as e:
+            print("Ошибка сохранения настроек:", e)
+        self._attachSerial(ser, port, f"{baud} (AUTO)")
 
-        ser = openConnection(port, baud)
+    def _attachSerial(self, ser, port, baud):
         if not ser:
             self.statusbar.showMessage("Ошибка подключения", 5000)
             return
 
         # -- نجح الاتصال --
         self.currentSerial = ser
+        self.ingest = IngestEngine(ser)      # القارئ الوحيد للمنفذ
+        self.ingest.start()
         self.statusbar.showMessage(f"Подключено на {port} @ {baud}", 5000)
         self.btnConnect.setText("Отключиться")
 
-        #  مرّر المقبض لكل الصفحات المفتوحة
-        for sub in self.mdiArea.subWindowList():
-            page = sub.widget()
-            if hasattr(page, "setSerial"):
-                page.setSerial(ser)
+        #  اشترك كل الصفحات المفتوحة فى محرّك الإدخال
+        for page in self._pages():
+            if hasattr(page, "setIngest"):
+                page.setIngest(self.ingest)
+
+##############################################
+# BENCHMARK MODULE
+##############################################
+# قياس المسار الساخن على مجموعة NMEA ثابتة (مولّدة ببذرة ثابتة، أو ملف):
+#   python improved_ui.py --bench [--corpus FILE] [--out bench.json] [--repeat N]
+# النتيجة JSON (ns/عملية، عمليات/ث لكل قياس) لمقارنة التشغيلات.
+
+BENCH_SEED = 42
+
+
+def bench_corpus(seed=BENCH_SEED, seconds=600):
+    """المجموعة الافتراضية: 10 دقائق، 40 قمراً، 1 Гц، مسار متحرك."""
+    sim = NmeaSimulator(seed=seed, sats=40, rate_hz=1, moving=True)
+    return b"".join(data for _, data in sim.stream(seconds))
+
+
+def _bench(fn, args_list, repeat):
+    """أفضل زمن من repeat تمريرات (الأقل تأثّراً بالضجيج)؛ None بلا مدخلات."""
+    if not args_list:
+        return None
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter_ns()
+        for args in args_list:
+            fn(*args)
+        best = min(best, time.perf_counter_ns() - t0)
+    n = len(args_list)
+    return {"n": n, "ns_per_op": best / n, "ops_per_s": n * 1e9 / best}
+
+
+def _bench_pipeline(corpus, chunk_bytes=4096):
+    """بايتات خام → IngestEngine.feed → update_location_info؛ يعيد عدد الأسطر."""
+    engine = IngestEngine(None)
+    sub = engine.subscribe(kinds=("GGA", "GSA"), maxlen=1 << 20)
+    info = {}
+    for i in range(0, len(corpus), chunk_bytes):
+        engine.feed(corpus[i:i + chunk_bytes], 0.0)
+        for s in sub.drain():
+            update_location_info(info, s)
+    return engine.framer.sentences
+
+
+def run_benchmarks(corpus, repeat=5):
+    lines = [l.strip() for l in corpus.decode('ascii', 'ignore').splitlines() if l.strip()]
+    by_kind = {}
+    for line in lines:
+        by_kind.setdefault(sentence_kind(line)[1], []).append((line,))
+    coords = []
+    for (line,) in by_kind.get("GGA", []):
+        parts = line.split(',')
+        if len(parts) >= 6:                  # ملف خارجى قد يحوى GGA مقطوعة
+            coords += [(parts[2], parts[3]), (parts[4], parts[5])]
+    gsv = (parse_sentence(line) for (line,) in by_kind.get("GSV", []))
+    prns = [(sat.prn,) for msg in gsv if msg is not None
+            for sat in msg.sats if sat.prn is not None]
+
+    results = {}
+    for kind, legacy in (("GGA", parseGGA), ("GSA", parseGSA),
+                         ("GSV", parseGSV), ("RMC", parseRMC)):
+        results[f"parse{kind}"] = _bench(legacy, by_kind.get(kind, []), repeat)
+        results[f"parse_sentence[{kind}]"] = _bench(parse_sentence, by_kind.get(kind, []), repeat)
+    results["classify_prn"] = _bench(classify_prn, prns, repeat)
+    results["Поток_данных._to_decimal"] = _bench(Поток_данных._to_decimal, coords, repeat)
+    results["nmea_to_decimal"] = _bench(nmea_to_decimal, coords, repeat)
+
+    best, n = float('inf'), 0
+    for _ in range(repeat):
+        t0 = time.perf_counter_ns()
+        n = _bench_pipeline(corpus)
+        best = min(best, time.perf_counter_ns() - t0)
+    if n:
+        results["pipeline_bytes_to_locationDetailed"] = {
+            "n": n, "ns_per_op": best / n, "ops_per_s": n * 1e9 / best,
+            "mb_per_s": len(corpus) / best * 1e3,
+        }
+    # قياسات بلا جمل من نوعها فى المجموعة لا تظهر فى التقرير
+    return {name: r for name, r in results.items() if r is not None}
+
+
+def bench_main(argv):
+    import argparse
+    import hashlib
+    import platform
+    ap = argparse.ArgumentParser(prog="improved_ui.py --bench")
+    ap.add_argument("--corpus", help="ملف NMEA بدلاً من المجموعة المولّدة")
+    ap.add_argument("--out", default="bench_results.json")
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args(argv)
+
+    if args.corpus:
+        with open(args.corpus, 'rb') as f:
+            corpus = f.read()
+    else:
+        corpus = bench_corpus()
+    report = {
+        "version": VERSION,
+        "timestamp": datetime.now().isoformat(timespec='seconds'),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "corpus": {
+            "source": args.corpus or f"NmeaSimulator(seed={BENCH_SEED})",
+            "bytes": len(corpus),
+            "sha1": hashlib.sha1(corpus).hexdigest(),
+        },
+        "repeat": args.repeat,
+        "results": run_benchmarks(corpus, args.repeat),
+    }
+    with open(args.out, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    for name, r in report["results"].items():
+        print(f"{name:40s} {r['ns_per_op']:10.0f} ns  {r['ops_per_s']:12.0f}/с")
+    print(f"Результаты сохранены в {args.out}")
+
 
 ##############################################
 # التطبيق الرئيسي
@@ -1998,6 +5983,14 @@ Start-Process -FilePath "{current_exe}"
 
 
 def main():
+    # مولّد NMEA على طرفية زائفة بدون واجهة (للاختبار مع منفذ حقيقى)
+    if "--sim-pty" in sys.argv:
+        i = sys.argv.index("--sim-pty")
+        return sim_pty_main(sys.argv[i + 1:])
+    if "--bench" in sys.argv:
+        i = sys.argv.index("--bench")
+        return bench_main(sys.argv[i + 1:])
+
     # 1) أنشئ الـ QApplication مرة واحدة
     app = QApplication(sys.argv)
 
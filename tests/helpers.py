@@ -0,0 +1,60 @@
+"""
+أدوات مشتركة للاختبارات: استيراد improved_ui من جذر المستودع، وبناء
+جمل NMEA بـ checksum صحيح، ومنفذ وهمى يردّ بـ ACK على كل أمر.
+"""
+import os
+import sys
+import time
+import unittest
+from threading import Thread
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+try:
+    import improved_ui as ui
+except ImportError as e:           # PyQt5 / QtWebEngine / pyserial غير مثبّتة
+    raise unittest.SkipTest(f"improved_ui недоступен: {e}")
+
+
+def nmea(body):
+    """'GPGGA,...' → '$GPGGA,...*hh' (بدون CR/LF)."""
+    return f"${body}*{ui.nmea_checksum(body.encode('ascii')):02X}"
+
+
+def nmea_bytes(*bodies):
+    return b"".join(nmea(b).encode('ascii') + b"\r\n" for b in bodies)
+
+
+class FakeAckPort:
+    """
+    منفذ يردّ على كل أمر بـ '$command,<cmd>,response: OK' بعد delay عبر
+    IngestEngine.feed، كما يفعل المستقبِل. fail = أوامر يُردّ عليها بخطأ.
+    """
+    is_open = True
+
+    def __init__(self, delay=0.01, fail=()):
+        self.ingest = None
+        self.delay = delay
+        self.fail = {c.lower() for c in fail}
+        self.writes = []
+
+    def write(self, data):
+        cmd = data.decode('ascii').strip()
+        self.writes.append(cmd)
+        resp = "PARSING FAILD" if cmd.lower() in self.fail else "OK"
+        line = nmea(f"command,{cmd},response: {resp}").encode('ascii') + b"\r\n"
+
+        def answer():
+            time.sleep(self.delay)
+            self.ingest.feed(line, time.time())
+        Thread(target=answer, daemon=True).start()
+        return len(data)
+
+
+def ack_engine(**port_args):
+    """(IngestEngine، FakeAckPort) مع كاتب أوامر يعمل؛ المستدعى يوقفه."""
+    port = FakeAckPort(**port_args)
+    ingest = ui.IngestEngine(port)
+    port.ingest = ingest
+    ingest.commands.timeout = 0.5
+    ingest.commands.start()
+    return ingest, port
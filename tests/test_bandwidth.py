@@ -0,0 +1,77 @@
+"""تقدير حمل رسائل الإخراج على المنافذ واقتراح baud/معدّلات تناسبها."""
+import unittest
+
+from helpers import ui, nmea
+
+
+class ParseOutputCommandTest(unittest.TestCase):
+    def test_commands(self):
+        cases = {
+            'GPGSV 1': ('GSV', 'COM1', 1.0),
+            'RTCM1074 COM2 1': ('RTCM1074', 'COM2', 1.0),
+            'gpgga com3 0.2': ('GGA', 'COM3', 0.2),
+            'saveconfig': None,
+            'config com2 9600': None,
+            'GPGGA fast': None,
+        }
+        for cmd, parsed in cases.items():
+            with self.subTest(cmd=cmd):
+                self.assertEqual(ui.parse_output_command(cmd), parsed)
+
+
+class PlanBandwidthTest(unittest.TestCase):
+    SATS = {"GPS": 10, "GLO": 6}
+
+    def test_last_command_wins_and_disabled_excluded(self):
+        ports = ui.plan_bandwidth(['GPGGA 1', 'GPGGA 0.1', 'GPRMC 1', 'GPRMC 0',
+                                   'RTCM1074 COM2 1'], self.SATS)
+        self.assertEqual(sorted(ports), ['COM1', 'COM2'])
+        self.assertEqual([(e.cmd, e.rate) for e in ports['COM1']], [('GPGGA 0.1', 10.0)])
+        self.assertEqual([e.msg for e in ports['COM2']], ['RTCM1074'])
+
+    def test_measured_sizes_and_satellite_counts(self):
+        gga = ui.plan_bandwidth(['GPGGA 1'], self.SATS, measured={'GGA': 100})['COM1'][0]
+        self.assertEqual((gga.size, gga.measured), (100, True))
+        # GSV: جملة لكل أربعة أقمار فى كل نظام (3 + 2)
+        gsv = ui.plan_bandwidth(['GPGSV 1'], self.SATS)['COM1'][0]
+        self.assertEqual(gsv.size, ui.NMEA_SENTENCE_BYTES['GSV'] * 5)
+        few = ui.plan_bandwidth(['RTCM1074 1'], {"GPS": 4})['COM1'][0]
+        many = ui.plan_bandwidth(['RTCM1074 1'], {"GPS": 12})['COM1'][0]
+        self.assertGreater(many.size, few.size)
+
+    def test_suggest_baud(self):
+        self.assertEqual(ui.suggest_baud(0), 9600)
+        self.assertEqual(ui.suggest_baud(768), 9600)
+        self.assertEqual(ui.suggest_baud(769), 19200)
+        self.assertIsNone(ui.suggest_baud(1e6))
+
+    def test_suggest_periods_fits_budget(self):
+        cmds = ['GPGGA 0.1', 'GPGSV 0.1', 'GPRMC 0.1', 'GPGSA 0.1']
+        entries = ui.plan_bandwidth(cmds, self.SATS)['COM1']
+        budget = ui.baud_capacity(9600) * ui.BANDWIDTH_HEADROOM
+        self.assertGreater(sum(e.load for e in entries), budget)
+
+        changes = ui.suggest_periods(entries, 9600)
+        self.assertTrue(changes)
+        new_cmds = [changes.get(c, c) for c in cmds]
+        load = sum(e.load for e in ui.plan_bandwidth(new_cmds, self.SATS)['COM1'])
+        self.assertLessEqual(load, budget)
+
+        self.assertEqual(ui.suggest_periods(entries, 921600), {})
+        heavy = ui.plan_bandwidth(['GPGSV 0.1'], {"GPS": 400})['COM1']
+        self.assertIsNone(ui.suggest_periods(heavy, 9600))
+
+
+class SatellitesBySystemTest(unittest.TestCase):
+    def test_gngsv_counted_by_prn(self):
+        store = ui.SatelliteStore()
+        for body in ("GNGSV,2,1,06,01,40,083,45,70,30,120,44,302,20,200,40,210,50,10,33",
+                     "GNGSV,2,2,06,05,10,10,30,193,60,60,41"):
+            store.add_gsv(ui.parse_sentence(nmea(body)), 1.0)
+        counts = ui.satellites_by_system(store.snapshot().table)
+        self.assertEqual({k: v for k, v in counts.items() if v},
+                         {"GPS": 2, "GLO": 1, "GAL": 1, "BDS": 1, "QZSS": 1})
+
+
+if __name__ == '__main__':
+    unittest.main()
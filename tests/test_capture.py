@@ -0,0 +1,58 @@
+"""التسجيل الخام (.gnr) وفهرسه: القراءة كاملةً والقفز إلى أى لحظة."""
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+from helpers import ui
+
+
+class CaptureTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.folder, True)
+
+    def capture(self, reads_at, compress=True, **kw):
+        """يكتب قراءة لكل إزاحة (ثوانٍ من البداية) ويُعيد (القارئ، القراءات)."""
+        path = os.path.join(self.folder, "t.gnr")
+        w = ui.RawCaptureWriter(path, compress=compress, **kw)
+        reads = [(w.start + dt, b"r%d" % i) for i, dt in enumerate(reads_at)]
+        for ts, data in reads:
+            w.write(ts, data)
+        w.close()
+        r = ui.RawCaptureReader(path)
+        self.addCleanup(r.close)
+        return r, reads
+
+    def test_roundtrip(self):
+        for compress in (True, False):
+            with self.subTest(compress=compress):
+                r, reads = self.capture([0.1 * i + 0.05 for i in range(60)], compress)
+                got = list(r.reads())
+                self.assertEqual([d for _, d in got], [d for _, d in reads])
+                for (ts, _), (want, _) in zip(got, reads):
+                    self.assertAlmostEqual(ts, want, delta=1e-6)
+
+    def test_seek_returns_every_later_read(self):
+        # كتل أطول من خطوة الفهرس: القفز يجب ألا يتخطّى الكتلة التى تغطّى اللحظة
+        r, reads = self.capture([0.1 * i + 0.05 for i in range(60)], block_seconds=1.5)
+        for t in (0.5, 1, 2, 3.3, 5.9):
+            with self.subTest(t=t):
+                got = [d for _, d in r.reads(r.start + t)]
+                self.assertEqual(got, [d for ts, d in reads if ts >= r.start + t])
+
+    def test_seek_to_exact_read_timestamp(self):
+        rng = random.Random(3)
+        offsets, t = [], 0.0
+        while t < 30:
+            t += rng.uniform(0.01, 1.5)
+            offsets.append(t)
+        r, reads = self.capture(offsets)
+        for ts, data in reads:
+            with self.subTest(data=data):
+                self.assertEqual(next(iter(r.reads(ts)))[1], data)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,126 @@
+"""مفاتيح الأوامر، خطة تطبيق الملفات، وكاتب الأوامر أمام منفذ يردّ بـ ACK."""
+import os
+import shutil
+import tempfile
+import unittest
+
+from helpers import ui, ack_engine
+
+
+class CommandKeyTest(unittest.TestCase):
+    def test_keys(self):
+        cases = {
+            'GPGGA 1': 'gpgga',
+            'RTCM1074 COM2 1': 'rtcm1074 com2',
+            'config com2 9600': 'config com2',
+            'MODE BASE TIME 120 1': 'mode',
+            'unlog gpgga': 'gpgga',
+            'UNLOG COM1 GPGGA': 'gpgga com1',
+            'log com1 gpgga ontime 1': 'gpgga com1',
+            'saveconfig': 'saveconfig',
+        }
+        for cmd, key in cases.items():
+            with self.subTest(cmd=cmd):
+                self.assertEqual(ui.command_key(cmd), key)
+
+
+class PlanProfileTest(unittest.TestCase):
+    def setUp(self):
+        folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, folder, True)
+        self.path = os.path.join(folder, "receivers.json")
+        self.state = ui.ReceiverState(self.path)
+
+    def test_unlogs_are_distinct_settings(self):
+        cmds = ['unlog gpgga', 'unlog gpgsv', 'unlog gprmc']
+        self.assertEqual(ui.plan_profile(self.state, "r", cmds), cmds + ["saveconfig"])
+
+    def test_only_difference_is_sent(self):
+        cmds = ['GPGGA 1', 'GPGSV 1', 'GPGGA 0.5', 'saveconfig']
+        # لكل مفتاح يُعتدّ بآخر أمر، و saveconfig يُضاف مرّة واحدة فى النهاية
+        self.assertEqual(ui.plan_profile(self.state, "r", cmds),
+                         ['GPGGA 0.5', 'GPGSV 1', 'saveconfig'])
+        self.state.record("r", cmds)
+
+        reloaded = ui.ReceiverState(self.path)
+        self.assertEqual(reloaded.applied("r"), {'gpgga': 'gpgga 0.5', 'gpgsv': 'gpgsv 1'})
+        self.assertEqual(ui.plan_profile(reloaded, "r", cmds), [])
+        self.assertEqual(ui.plan_profile(reloaded, "r", ['GPGSV 2']), ['GPGSV 2', 'saveconfig'])
+        self.assertEqual(ui.plan_profile(reloaded, "other", ['GPGSV 1']), ['GPGSV 1', 'saveconfig'])
+
+    def test_full_resends_everything(self):
+        cmds = ['GPGGA 1', 'GPGSV 1', 'saveconfig']
+        self.state.record("r", cmds)
+        self.assertEqual(ui.plan_profile(self.state, "r", cmds, full=True),
+                         ['GPGGA 1', 'GPGSV 1', 'saveconfig'])
+
+    def test_forget(self):
+        self.state.record("r", ['GPGGA 1'])
+        self.state.forget("r")
+        self.assertEqual(ui.plan_profile(self.state, "r", ['GPGGA 1']), ['GPGGA 1', 'saveconfig'])
+
+
+class CommandEngineTest(unittest.TestCase):
+    def engine(self, **port_args):
+        ingest, port = ack_engine(**port_args)
+        self.addCleanup(ingest.stop)
+        return ingest.commands, port
+
+    def test_batch_and_skip_confirmed(self):
+        engine, port = self.engine()
+        cmds = ['GPGGA 1', 'GPGSV 1', 'GPRMC 1', 'saveconfig']
+        report = engine.submit_batch(cmds).result(timeout=5)
+        self.assertEqual([e[1] for e in report.entries], ['ok'] * 4)
+        self.assertEqual(port.writes, cmds)
+
+        # إعادة التطبيق لا ترسل إلا الأفعال (saveconfig لا يُعدّ مؤكَّداً)
+        report = engine.submit_batch(cmds).result(timeout=5)
+        self.assertEqual([e[1] for e in report.entries], ['skipped'] * 3 + ['ok'])
+        self.assertEqual(port.writes, cmds + ['saveconfig'])
+
+        report = engine.submit_batch(cmds, skip_confirmed=False).result(timeout=5)
+        self.assertEqual(report.count('ok'), 4)
+
+    def test_freset_clears_confirmed(self):
+        engine, _ = self.engine()
+        engine.submit_batch(['GPGGA 1']).result(timeout=5)
+        self.assertTrue(engine.is_confirmed('gpgga 1'))
+        engine.submit('freset').result(timeout=5)
+        self.assertEqual(engine.confirmed, {})
+
+    def test_failure_does_not_stop_batch(self):
+        engine, port = self.engine(fail=['GPGSV 1'])
+        cmds = ['GPGGA 1', 'GPGSV 1', 'GPRMC 1']
+        report = engine.submit_batch(cmds, retries=0).result(timeout=5)
+        self.assertEqual([e[1] for e in report.entries], ['ok', 'failed', 'ok'])
+        self.assertIn("PARSING FAILD", report.entries[1][4])
+        self.assertFalse(report.ok)
+        self.assertFalse(engine.is_confirmed('GPGSV 1'))
+
+    def test_timeout_retries_then_fails(self):
+        engine, port = self.engine(delay=2.0)
+        report = engine.submit_batch(['GPGGA 1'], timeout=0.1, retries=2).result(timeout=5)
+        cmd, status, _, attempts, _ = report.entries[0]
+        self.assertEqual((status, attempts), ('failed', 3))
+        self.assertEqual(port.writes, ['GPGGA 1'] * 3)
+
+    def test_sent_watchers(self):
+        engine, _ = self.engine()
+        first, second = [], []
+        engine.watch_sent(lambda cmd, n: first.append((cmd, n)))
+        watcher = lambda cmd, n: second.append((cmd, n))
+        engine.watch_sent(watcher)
+        engine.submit('GPGGA 1').result(timeout=5)
+        engine.unwatch_sent(watcher)
+        engine.submit('GPGSV 1').result(timeout=5)
+        self.assertEqual(first, [('GPGGA 1', 1), ('GPGSV 1', 1)])
+        self.assertEqual(second, [('GPGGA 1', 1)])
+
+    def test_submit_without_connection_fails(self):
+        engine = ui.IngestEngine(None).commands
+        with self.assertRaises(ui.CommandError):
+            engine.submit('GPGGA 1').result(timeout=1)
+
+
+if __name__ == '__main__':
+    unittest.main()
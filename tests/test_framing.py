@@ -0,0 +1,116 @@
+"""NmeaFramer، فكّ السجلات المتجه، والمحلّلات القديمة على نفس المجموعة."""
+import collections
+import time
+import unittest
+
+from helpers import ui, nmea, nmea_bytes
+
+GGA = "GPGGA,120000.00,5545.0720,N,03737.1040,E,1,12,0.8,150.0,M,14.0,M,,"
+RMC = "GPRMC,120000.00,A,5545.0720,N,03737.1040,E,0.0,0.0,010125,,,A"
+
+
+def faulty_corpus(seconds=300):
+    sim = ui.NmeaSimulator(seed=3, sats=20, truncate=0.03, bad_checksum=0.03)
+    data = b"".join(d for _, d in sim.stream(seconds))
+    return sim, data
+
+
+class FramerTest(unittest.TestCase):
+    def test_valid_and_bad_checksum(self):
+        fr = ui.NmeaFramer()
+        bad = nmea(GGA)[:-2] + "00"
+        out = fr.feed(nmea_bytes(GGA) + bad.encode() + b"\r\n")
+        self.assertEqual(out, [nmea(GGA).encode()])
+        self.assertEqual(fr.stats()['GGA'], (1, 1, 0))
+
+    def test_sentence_split_across_reads(self):
+        fr = ui.NmeaFramer()
+        data = nmea_bytes(GGA, RMC)
+        out = []
+        for i in range(0, len(data), 7):
+            out += fr.feed(data[i:i + 7])
+        self.assertEqual(out, [nmea(GGA).encode(), nmea(RMC).encode()])
+
+    def test_resync_on_last_dollar(self):
+        # جملة مبتورة بلا LF تلتصق بالتالية: تُعدّ مقطوعة والتالية تمرّ
+        fr = ui.NmeaFramer()
+        out = fr.feed(b"$GPRMC,1200" + b"$GPGSA,A,3" + nmea_bytes(GGA))
+        self.assertEqual(out, [nmea(GGA).encode()])
+        stats = fr.stats()
+        self.assertEqual(stats['GGA'], (1, 0, 0))
+        self.assertEqual(stats['RMC'], (0, 0, 1))
+        self.assertEqual(stats['GSA'], (0, 0, 1))
+
+    def test_faulty_corpus_truncations_counted(self):
+        sim, data = faulty_corpus()
+        fr = ui.NmeaFramer()
+        fr.feed(data)
+        valid, bad, truncated = fr.totals()
+        self.assertEqual(truncated, sim.injected["truncated"])
+        # checksum خاطئ فى سطر مبتور يُعدّ مقطوعاً لا تالفاً
+        self.assertLessEqual(bad, sim.injected["bad_checksum"])
+        self.assertGreater(valid, 0)
+
+
+class BatchDecodeTest(unittest.TestCase):
+    def test_matches_framer_and_legacy_parsers(self):
+        _, data = faulty_corpus()
+        lines = [l.decode() for l in ui.NmeaFramer().feed(data)]
+        by_kind = collections.defaultdict(list)
+        for line in lines:
+            by_kind[line[3:6]].append(line)
+
+        arrays = ui.decode_nmea_log(data, chunk_bytes=4096)
+        for kind, legacy in (("GGA", ui.parseGGA), ("GSA", ui.parseGSA), ("RMC", ui.parseRMC)):
+            with self.subTest(kind=kind):
+                self.assertEqual(len(arrays[kind]), len(by_kind[kind]))
+                self.assertTrue(all(legacy(l) is not None for l in by_kind[kind]))
+        sats = sum(len(ui.parse_sentence(l).sats) for l in by_kind["GSV"])
+        self.assertEqual(len(arrays["GSV"]), sats)
+
+    def test_chunk_size_does_not_change_result(self):
+        _, data = faulty_corpus(60)
+        small = ui.decode_nmea_log(data, chunk_bytes=997)
+        large = ui.decode_nmea_log(data)
+        for kind in large:
+            with self.subTest(kind=kind):
+                self.assertEqual(small[kind].tobytes(), large[kind].tobytes())
+
+    def test_resync_on_last_dollar(self):
+        arrays = ui.decode_nmea_log(b"$GPRMC,1200" + nmea_bytes(GGA), kinds=("GGA", "RMC"))
+        self.assertEqual(len(arrays["GGA"]), 1)
+        self.assertEqual(len(arrays["RMC"]), 0)
+
+
+class ScriptedSerial:
+    """قراءات محدّدة مسبقاً ثم صمت؛ يكفى probe_baud."""
+    in_waiting = 0
+
+    def __init__(self, chunks):
+        self.chunks = list(chunks)
+
+    def read(self, n=1):
+        if self.chunks:
+            return self.chunks.pop(0)
+        time.sleep(0.01)
+        return b""
+
+
+class ProbeBaudTest(unittest.TestCase):
+    def test_partial_first_line_is_ignored(self):
+        data = nmea_bytes(GGA, RMC, GGA, RMC)
+        for cut in (5, 30, len(nmea(GGA)) + 1):
+            with self.subTest(cut=cut):
+                valid, bad, nbytes = ui.probe_baud(ScriptedSerial([data[cut:]]), window=0.3)
+                self.assertEqual(bad, 0)
+                self.assertGreaterEqual(valid, 3 if cut < len(nmea(GGA)) else 2)
+                self.assertEqual(nbytes, len(data) - cut)
+
+    def test_garbage_is_rejected(self):
+        noise = bytes(range(256)) * 4
+        valid, bad, _ = ui.probe_baud(ScriptedSerial([noise]), window=0.3)
+        self.assertEqual(ui.baud_score(valid, bad), 0.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+"""مخزن الأقمار: تجميع سلاسل GSV، الإشارات المتعدّدة، والانتهاء."""
+import unittest
+
+from helpers import ui, nmea
+
+
+def gsv(store, body, now):
+    store.add_gsv(ui.parse_sentence(nmea(body)), now)
+
+
+class SatelliteStoreTest(unittest.TestCase):
+    L1 = "GPGSV,1,1,02,01,40,083,45,02,30,120,44,1"
+    L5 = "GPGSV,1,1,02,01,40,083,30,02,30,120,29,8"
+
+    def snr(self, store):
+        table = store.snapshot().table
+        return dict(zip(table.prn.tolist(), table.snr.tolist()))
+
+    def test_series_assembled_before_publish(self):
+        store = ui.SatelliteStore()
+        gsv(store, "GPGSV,2,1,05,01,40,083,45,02,30,120,44,03,20,200,40,04,10,300,35", 1.0)
+        self.assertEqual(store.version, 0)
+        gsv(store, "GPGSV,2,2,05,05,60,060,41", 1.0)
+        self.assertEqual(store.version, 1)
+        self.assertEqual(len(store.snapshot().table), 5)
+
+    def test_signals_do_not_split_series(self):
+        # سلسلة L1 وسلسلة L5 متداخلتان: لكل منهما تجميعها الخاص
+        store = ui.SatelliteStore()
+        gsv(store, "GPGSV,2,1,05,01,40,083,45,02,30,120,44,03,20,200,40,04,10,300,35,1", 1.0)
+        gsv(store, "GPGSV,1,1,01,01,40,083,30,8", 1.0)
+        gsv(store, "GPGSV,2,2,05,05,60,060,41,1", 1.0)
+        self.assertEqual(sorted(self.snr(store)), [1, 2, 3, 4, 5])
+
+    def test_primary_signal_snr_is_kept(self):
+        store = ui.SatelliteStore(expiry=5.0)
+        for now in range(5):
+            gsv(store, self.L1, float(now))
+            gsv(store, self.L5, float(now) + 0.5)
+        # الإشارة الثانية لا تغيّر شيئاً مرئياً: لقطة واحدة فقط
+        self.assertEqual(store.version, 1)
+        self.assertEqual(self.snr(store), {1: 45, 2: 44})
+
+        # L1 اختفت أكثر من مهلة الانتهاء: L5 تتولّى الـ SNR
+        for now in range(5, 12):
+            gsv(store, self.L5, float(now))
+        self.assertEqual(self.snr(store), {1: 30, 2: 29})
+
+    def test_expiry_removes_satellites(self):
+        store = ui.SatelliteStore(expiry=5.0)
+        gsv(store, "GPGSV,1,1,02,01,40,083,45,02,30,120,44", 0.0)
+        gsv(store, "GPGSV,1,1,01,01,40,083,45", 4.0)
+        store.expire(5.0)
+        self.assertEqual(sorted(self.snr(store)), [1, 2])
+        version = store.version
+        store.expire(5.5)
+        self.assertEqual(sorted(self.snr(store)), [1])
+        self.assertEqual(store.version, version + 1)
+
+    def test_watchers(self):
+        store = ui.SatelliteStore()
+        calls = []
+        fn = lambda: calls.append(store.version)
+        store.watch(fn)
+        gsv(store, self.L1, 0.0)
+        store.unwatch(fn)
+        gsv(store, "GPGSV,1,1,01,03,40,083,45", 0.0)
+        self.assertEqual(calls, [1])
+
+
+if __name__ == '__main__':
+    unittest.main()